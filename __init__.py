@@ -1,8 +1,9 @@
 """MIYA HRV Fresh Air System Integration."""
-from .helpers.common_imports import logging, ConfigEntry, HomeAssistant, _LOGGER
+from .helpers.common_imports import logging, ConfigEntry, HomeAssistant, Store, _LOGGER
 
-from .const import DOMAIN, PLATFORMS
-from .helpers.ha_utils import MiyaHRVManager
+from .const import DOMAIN, PLATFORMS, STORAGE_VERSION, STORAGE_KEY, CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR, DEFAULT_PORT, RELOAD_KEYS
+from .helpers.ha_utils import MiyaHRVManager, generate_device_id
+from .services import async_setup_services, async_unload_services
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -16,15 +17,36 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # 设置平台
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     
-    # 注册清理回调
-    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    # 注册服务
+    async_setup_services(hass)
     
+    # 选项变更在运行中生效，连接参数变化时才重新加载
+    entry.async_on_unload(entry.add_update_listener(async_update_entry))
+    
+    return True
+
+
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """迁移旧版配置条目."""
+    if entry.version == 1:
+        # v2: 同一网关可挂多台设备，唯一ID加入设备地址
+        unique_id = generate_device_id(
+            entry.data["host"],
+            entry.data.get("port", DEFAULT_PORT),
+            entry.data.get(CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR),
+        )
+        hass.config_entries.async_update_entry(entry, unique_id=unique_id, version=2)
+        _LOGGER.info(f"配置条目已迁移到版本2: {unique_id}")
     return True
 
 
-async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """重新加载MIYA HRV配置条目."""
-    await hass.config_entries.async_reload(entry.entry_id)
+async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """配置条目更新：host、port 或设备地址变化时重新加载，其余选项直接作用于运行中的管理器."""
+    manager: MiyaHRVManager = hass.data[DOMAIN][entry.entry_id]
+    if manager.connection != tuple(entry.data.get(key) for key in RELOAD_KEYS):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    await manager.async_update_options(entry)
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -32,9 +54,16 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     
     if unload_ok:
-        device_data = hass.data[DOMAIN].pop(entry.entry_id)
-        if 'manager' in device_data:
-            await device_data['manager'].cleanup()
+        manager = hass.data[DOMAIN].pop(entry.entry_id)
+        await manager.cleanup()
+        if not hass.data[DOMAIN]:
+            async_unload_services(hass)
         _LOGGER.info("✅ 设备连接已断开")
     
     return unload_ok
+
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """删除MIYA HRV配置条目时清理持久化状态."""
+    await Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry.entry_id}").async_remove()
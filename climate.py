@@ -1,9 +1,13 @@
 """MIYA HRV Climate 平台."""
+import voluptuous as vol
+
+from homeassistant.helpers import entity_platform
+
 from .helpers.common_imports import (
     logging, Any, List, Optional,
     ClimateEntity, ClimateEntityFeature, HVACMode,
-    ConfigEntry, ATTR_TEMPERATURE, CONF_NAME, UnitOfTemperature,
-    HomeAssistant, AddEntitiesCallback, ConfigType, DiscoveryInfoType,
+    RestoreEntity, ConfigEntry, ATTR_TEMPERATURE, CONF_NAME, UnitOfTemperature,
+    HomeAssistant, callback, AddEntitiesCallback, ConfigType, DiscoveryInfoType,
     _LOGGER
 )
 
@@ -14,12 +18,28 @@ from .const import (
 )
 
 # 导入辅助函数
-from .helpers.ha_utils import get_device_status, send_device_command, get_commands, generate_entity_id
-
-# 支持的模式
-SUPPORTED_FAN_MODES = ["low", "medium", "high"]
+from .helpers.ha_utils import MiyaHRVManager, generate_entity_id
+from .entity import MiyaHRVEntity
+from .helpers.protocal import FAN_LEVELS
+
+# 支持的模式: 风扇模式 level_n 对应设备风速档位 n
+SUPPORTED_FAN_MODES = [f"level_{level}" for level in FAN_LEVELS]
+# 旧版风扇模式名 -> 档位，保留供已有自动化使用；旧版命令模板多写了一档，
+# low/medium/high 实际运行在 2/3/4 档，别名保持设备的实际档位不变
+LEGACY_FAN_MODES = {"low": "level_2", "medium": "level_3", "high": "level_4"}
 SUPPORTED_HVAC_MODES = [HVACMode.OFF, HVACMode.AUTO, HVACMode.FAN_ONLY]
 
+# HVAC 模式 -> (电源, 运行模式)；仅风扇即设备的手动模式
+HVAC_MODE_STATES = {
+    HVACMode.OFF: (False, None),
+    HVACMode.AUTO: (True, "auto"),
+    HVACMode.FAN_ONLY: (True, "manual"),
+}
+
+SERVICE_SET_VENTILATION = "set_ventilation"
+ATTR_HVAC_MODE = "hvac_mode"
+ATTR_FAN_MODE = "fan_mode"
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -27,43 +47,46 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """设置MIYA HRV Climate平台."""
-    device_data = hass.data[DOMAIN][config_entry.entry_id]
-    device = device_data['device']
+    manager: MiyaHRVManager = hass.data[DOMAIN][config_entry.entry_id]
     
     # 创建Climate实体
     climate_entity = MiyaHRVClimate(
-        device=device,
+        manager=manager,
         name=DEVICE_NAME,
         unique_id=generate_entity_id(config_entry.entry_id, ENTITY_TYPE_CLIMATE),
-        hass=hass,
-        entry_id=config_entry.entry_id,
     )
     
-    # 注册实体到管理器
-    device_data = hass.data[DOMAIN][config_entry.entry_id]
-    if 'manager' in device_data:
-        device_data['manager'].register_entity(climate_entity.unique_id, climate_entity)
-    else:
-        # 兼容旧版本
-        device_data['entities'][climate_entity.unique_id] = climate_entity
-    
     async_add_entities([climate_entity])
+    
+    # 电源、运行模式和风速一次写入（一帧控制帧）
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_SET_VENTILATION,
+        {
+            vol.Optional(ATTR_HVAC_MODE): vol.In([str(mode) for mode in SUPPORTED_HVAC_MODES]),
+            vol.Optional(ATTR_FAN_MODE): vol.In(SUPPORTED_FAN_MODES + list(LEGACY_FAN_MODES)),
+        },
+        "async_set_ventilation",
+    )
 
 
-class MiyaHRVClimate(ClimateEntity):
+class MiyaHRVClimate(MiyaHRVEntity, ClimateEntity, RestoreEntity):
     """MIYA HRV Climate实体."""
 
-    def __init__(self, device, name: str, unique_id: str, hass=None, entry_id=None):
+    # 显示用属性可由状态推导，不写入 recorder
+    _unrecorded_attributes = frozenset({"hvac_mode_display", "fan_mode_display"})
+
+    def __init__(self, manager: MiyaHRVManager, name: str, unique_id: str):
         """初始化Climate实体."""
-        self._device = device
+        super().__init__(manager)
         self._unique_id = unique_id
-        self._hass = hass
-        self._entry_id = entry_id
+        self._attributes: dict[str, Any] = {}
         
         # 状态变量 - 使用官方模式
         self._hvac_mode = HVACMode.OFF
-        self._fan_mode = "medium"
-        self._current_status = {}  # 存储当前状态数据
+        self._fan_mode = "level_2"
+        # 管理器的共享状态缓冲区（只读引用，不复制）
+        self._status = manager.status
         
         
         # 支持的属性 (新风系统不需要温度控制)
@@ -72,6 +95,8 @@ class MiyaHRVClimate(ClimateEntity):
         )
         
         self._attr_hvac_modes = SUPPORTED_HVAC_MODES
+        # 旧版模式名须列出，否则 HA 拒绝旧自动化的 set_fan_mode 调用
+        # 旧版模式名只作为输入接受，不列出（状态总是报告 level_N）
         self._attr_fan_modes = SUPPORTED_FAN_MODES
         # 新风系统不需要温度控制
         self._attr_temperature_unit = UnitOfTemperature.CELSIUS
@@ -88,9 +113,11 @@ class MiyaHRVClimate(ClimateEntity):
     @property
     def hvac_mode(self) -> HVACMode:
         """返回当前HVAC模式."""
-        # 优先使用本地状态数据，如果没有则从全局获取
-        status = self._current_status if self._current_status else get_device_status(self._hass, self._entry_id)
-        mode = status.get('mode', 'off')
+        # 暂存待补发的命令优先（乐观显示），其次为设备状态
+        mode = self._manager.pending_status().get('mode') or self._status.get('mode')
+        if mode is None:
+            # 尚无设备状态时使用恢复的状态
+            return self._hvac_mode
         
         # 映射到 HA 的 HVAC 模式
         mode_map = {
@@ -103,34 +130,34 @@ class MiyaHRVClimate(ClimateEntity):
     
     @property
     def hvac_mode_display(self) -> str:
-        """返回HVAC模式的显示名称."""
-        return str(self._hvac_mode)
+        """返回HVAC模式的显示名称（与 hvac_mode 一致）."""
+        return str(self.hvac_mode)
     
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
-        """返回额外的状态属性."""
-        return {
-            "hvac_mode_display": self.hvac_mode_display,
-            "fan_mode_display": "LOW" if self._fan_mode == "low" else "MEDIUM" if self._fan_mode == "medium" else "HIGH"
-        }
+        """返回额外的状态属性（状态不变时返回同一字典）."""
+        hvac_mode_display = self.hvac_mode_display
+        fan_mode_display = self.fan_mode.replace("_", " ").upper()
+        attributes = self._attributes
+        if (attributes.get("hvac_mode_display") != hvac_mode_display
+                or attributes.get("fan_mode_display") != fan_mode_display):
+            self._attributes = attributes = {
+                "hvac_mode_display": hvac_mode_display,
+                "fan_mode_display": fan_mode_display,
+            }
+        return attributes
 
     @property
     def fan_mode(self) -> str:
         """返回当前风扇模式."""
-        # 优先使用本地状态数据，如果没有则从全局获取
-        status = self._current_status if self._current_status else get_device_status(self._hass, self._entry_id)
-        fan_mode = status.get('fan_mode', 'level_2')
-        
-        # 映射到 HA 的风扇模式
-        fan_map = {
-            "level_1": "low",
-            "level_2": "medium",
-            "level_3": "high",
-            "level_4": "high",
-            "level_5": "high"
-        }
-        
-        return fan_map.get(fan_mode, "medium")
+        fan_mode = self._manager.pending_status().get('fan_mode') or self._status.get('fan_mode')
+        if fan_mode is None:
+            # 尚无设备状态时使用恢复的状态
+            return self._fan_mode
+        if fan_mode not in SUPPORTED_FAN_MODES:
+            # 进风和排风档位不一致时沿用上次设置的档位
+            return self._fan_mode
+        return fan_mode
 
     @property
     def current_temperature(self) -> Optional[float]:
@@ -143,65 +170,55 @@ class MiyaHRVClimate(ClimateEntity):
         return None
 
     async def async_set_hvac_mode(self, hvac_mode: HVACMode) -> None:
-        """设置HVAC模式."""
-        if hvac_mode not in SUPPORTED_HVAC_MODES:
-            _LOGGER.error(f"不支持的模式: {hvac_mode}")
-            return
-        
-        # 直接使用英文命令键
-        command_map = {
-            HVACMode.OFF: "power_off",
-            HVACMode.AUTO: "power_auto",
-            HVACMode.FAN_ONLY: "power_auto"  # 手动模式暂时使用自动模式
-        }
-        
-        command_name = command_map.get(hvac_mode)
-        if command_name:
-            success = await send_device_command(self._hass, self._entry_id, command_name)
-            if success:
-                self._hvac_mode = hvac_mode
-                # 记录日志
-                _LOGGER.info(f"设置模式: {hvac_mode}")
-                self.async_write_ha_state()
-        else:
-            _LOGGER.error(f"未找到模式 {hvac_mode} 对应的命令")
+        """设置HVAC模式（电源和自动/手动在同一帧写入，风速保持不变）."""
+        await self.async_set_ventilation(hvac_mode=hvac_mode)
+
+    async def async_handle_set_fan_mode_service(self, fan_mode: str) -> None:
+        """climate.set_fan_mode 服务：HA 按 fan_modes 校验前先把旧版模式名换成对应档位."""
+        await super().async_handle_set_fan_mode_service(LEGACY_FAN_MODES.get(fan_mode, fan_mode))
 
     async def async_set_fan_mode(self, fan_mode: str) -> None:
-        """设置风扇模式."""
+        """设置风扇模式（只写入风速字段）."""
+        await self.async_set_ventilation(fan_mode=fan_mode)
+
+    async def async_set_ventilation(self, hvac_mode: Optional[str] = None, fan_mode: Optional[str] = None) -> None:
+        """把HVAC模式和风速组合编码为一帧控制帧，一次总线写入到达目标状态."""
+        power = mode = fan_level = None
+        if hvac_mode is not None:
+            if hvac_mode not in SUPPORTED_HVAC_MODES:
+                _LOGGER.error(f"不支持的模式: {hvac_mode}")
+                return
+            hvac_mode = HVACMode(hvac_mode)
+            power, mode = HVAC_MODE_STATES[hvac_mode]
+        if fan_mode is not None:
+            fan_mode = LEGACY_FAN_MODES.get(fan_mode, fan_mode)
+            if fan_mode not in SUPPORTED_FAN_MODES:
+                _LOGGER.error(f"不支持的风扇模式: {fan_mode}")
+                return
+            fan_level = FAN_LEVELS[SUPPORTED_FAN_MODES.index(fan_mode)]
+        
+        success = await self._manager.send_state(power=power, mode=mode, fan_level=fan_level)
+        if not success:
+            return
+        if hvac_mode is not None:
+            self._hvac_mode = hvac_mode
+            _LOGGER.info(f"设置模式: {hvac_mode}")
+        if fan_mode is not None:
+            self._fan_mode = fan_mode
+            _LOGGER.info(f"设置风扇模式: {fan_mode.upper()}")
+        self.async_write_ha_state()
+
+
+
+    async def async_added_to_hass(self) -> None:
+        """实体添加到Home Assistant时恢复上次状态（存储中没有状态帧时的兜底）."""
+        await super().async_added_to_hass()
+        last_state = await self.async_get_last_state()
+        if last_state is None:
+            return
+        if last_state.state in SUPPORTED_HVAC_MODES:
+            self._hvac_mode = HVACMode(last_state.state)
+        fan_mode = last_state.attributes.get("fan_mode")
+        fan_mode = LEGACY_FAN_MODES.get(fan_mode, fan_mode)
         if fan_mode in SUPPORTED_FAN_MODES:
-            # 直接使用英文命令键
-            command_map = {
-                "low": "fan_mode_level_1",
-                "medium": "fan_mode_level_2",
-                "high": "fan_mode_level_3"
-            }
-            
-            command_name = command_map.get(fan_mode)
-            if command_name:
-                success = await send_device_command(self._hass, self._entry_id, command_name)
-                if success:
-                    self._fan_mode = fan_mode
-                    # 记录日志
-                    mode_name = "LOW" if fan_mode == "low" else "MEDIUM" if fan_mode == "medium" else "HIGH"
-                    _LOGGER.info(f"设置风扇模式: {mode_name}")
-                    self.async_write_ha_state()
-            else:
-                _LOGGER.error(f"未找到风扇模式 {fan_mode} 对应的命令")
-        else:
-            _LOGGER.error(f"不支持的风扇模式: {fan_mode}")
-
-
-
-    def update_status(self, status_data: dict):
-        """更新实体状态数据."""
-        self._current_status = status_data
-        # 检查实体是否已经完全初始化
-        if hasattr(self, 'hass') and self.hass is not None:
-            self.async_write_ha_state()
-            _LOGGER.debug(f"📊 Climate 状态已更新: {status_data}")
-        else:
-            _LOGGER.debug(f"📊 Climate 实体尚未完全初始化，仅更新本地状态")
-
-
-    async def async_will_remove_from_hass(self) -> None:
-        """实体从Home Assistant移除时调用."""
+            self._fan_mode = fan_mode
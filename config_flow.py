@@ -2,21 +2,42 @@
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.data_entry_flow import FlowResult
+from homeassistant.core import callback
+from homeassistant.data_entry_flow import AbortFlow, FlowResult
+import homeassistant.helpers.config_validation as cv
 
 from .helpers.common_imports import logging, CONF_HOST, CONF_PORT, _LOGGER
-from .const import DOMAIN, DEFAULT_PORT, CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR
+from .helpers.discovery import discover_addresses
+from .helpers.gateway import gateway_key
+from .const import (
+    DOMAIN, DATA_GATEWAYS, DEFAULT_PORT, CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR, CONF_DISCOVER, CONF_DEVICES,
+    CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL, CONF_COMMAND_EXPIRY, DEFAULT_COMMAND_EXPIRY,
+    CONF_POLL_INTERVAL, DEFAULT_POLL_INTERVAL, CONF_BAUD_RATE, DEFAULT_BAUD_RATE, BAUD_RATES,
+    CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL, CONF_LOG_LEVEL, DEFAULT_LOG_LEVEL, LOG_LEVELS,
+)
 
 
-def generate_device_id(host: str, port: int) -> str:
-    """生成设备唯一标识符."""
-    return f"{host}:{port}"
+def generate_device_id(host: str, port: int, device_addr: str = DEFAULT_DEVICE_ADDR) -> str:
+    """生成设备唯一标识符（同一网关可挂多台设备，包含设备地址）."""
+    return f"{host}:{port}:{int(device_addr, 16):02X}"
 
 
 class MiyaHRVConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """处理MIYA HRV配置流程."""
 
-    VERSION = 1
+    VERSION = 2
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> "MiyaHRVOptionsFlow":
+        """返回选项流程."""
+        return MiyaHRVOptionsFlow()
+
+    def __init__(self):
+        """初始化配置流程."""
+        self._host = None
+        self._port = DEFAULT_PORT
+        self._discovered = []
 
     async def async_step_user(self, user_input=None) -> FlowResult:
         """处理用户输入."""
@@ -28,30 +49,50 @@ class MiyaHRVConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 host = user_input[CONF_HOST]
                 port = user_input.get(CONF_PORT, DEFAULT_PORT)
                 device_addr = user_input.get(CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR)
-                
-                # 创建唯一ID
-                await self.async_set_unique_id(generate_device_id(host, port))
-                self._abort_if_unique_id_configured()
-                
-                # 测试连接
-                try:
-                    from .helpers.tcp_485_lib import create_client
-                except ImportError:
-                    try:
-                        from helpers.tcp_485_lib import create_client
-                    except ImportError:
-                        from .helpers.tcp_485_lib.tcp_client_lib import create_client
-                client = create_client(host, port, "hex")
-                if await client.connect():
-                    await client.disconnect()
-                    
-                    return self.async_create_entry(
-                        title=f"MIYA HRV ({host}:{port})",
-                        data=user_input,
-                    )
+                # 网关只接受一个连接：已配置该网关上的设备时借用现有连接
+                gateway = self.hass.data.get(DATA_GATEWAYS, {}).get(gateway_key(host, port))
+
+                if user_input.get(CONF_DISCOVER, True):
+                    # 扫描总线上的设备地址
+                    addresses = await discover_addresses(host, port, gateway=gateway)
+                    if addresses is None:
+                        errors["base"] = "cannot_connect"
+                    else:
+                        configured = {entry.unique_id for entry in self._async_current_entries()}
+                        self._discovered = [
+                            addr for addr in addresses
+                            if generate_device_id(host, port, f"{addr:02X}") not in configured
+                        ]
+                        if self._discovered:
+                            self._host, self._port = host, port
+                            return await self.async_step_select()
+                        errors["base"] = "already_configured" if addresses else "no_devices_found"
                 else:
+                    # 创建唯一ID
+                    await self.async_set_unique_id(generate_device_id(host, port, device_addr))
+                    self._abort_if_unique_id_configured()
+
+                    # 测试连接（已有网关连接时不另建连接）
+                    if gateway is not None:
+                        connected = gateway.connected
+                    else:
+                        try:
+                            from .helpers.tcp_485_lib import create_client
+                        except ImportError:
+                            try:
+                                from helpers.tcp_485_lib import create_client
+                            except ImportError:
+                                from .helpers.tcp_485_lib.tcp_client_lib import create_client
+                        client = create_client(host, port, "hex")
+                        connected = await client.connect()
+                        if connected:
+                            await client.disconnect()
+                    if connected:
+                        return self._create_device_entry(host, port, device_addr)
                     errors["base"] = "cannot_connect"
-                    
+
+            except AbortFlow:
+                raise
             except Exception as ex:
                 _LOGGER.error(f"配置错误: {ex}")
                 errors["base"] = "unknown"
@@ -62,8 +103,101 @@ class MiyaHRVConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 {
                     vol.Required(CONF_HOST): str,
                     vol.Optional(CONF_PORT, default=DEFAULT_PORT): int,
+                    vol.Optional(CONF_DISCOVER, default=True): bool,
                     vol.Optional(CONF_DEVICE_ADDR, default=DEFAULT_DEVICE_ADDR): str,
                 }
             ),
             errors=errors,
-        ) 
\ No newline at end of file
+        )
+
+    async def async_step_select(self, user_input=None) -> FlowResult:
+        """选择扫描到的设备，每台设备创建一个配置条目."""
+        errors = {}
+
+        if user_input is not None:
+            selected = sorted(user_input.get(CONF_DEVICES, []))
+            if selected:
+                first, *rest = selected
+                # 其余设备通过导入流程各自创建条目
+                for device_addr in rest:
+                    self.hass.async_create_task(
+                        self.hass.config_entries.flow.async_init(
+                            DOMAIN,
+                            context={"source": config_entries.SOURCE_IMPORT},
+                            data={CONF_HOST: self._host, CONF_PORT: self._port, CONF_DEVICE_ADDR: device_addr},
+                        )
+                    )
+                await self.async_set_unique_id(generate_device_id(self._host, self._port, first))
+                self._abort_if_unique_id_configured()
+                return self._create_device_entry(self._host, self._port, first)
+            errors["base"] = "no_devices_selected"
+
+        options = {f"{addr:02X}": f"0x{addr:02X}" for addr in self._discovered}
+        return self.async_show_form(
+            step_id="select",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_DEVICES, default=list(options)): cv.multi_select(options),
+                }
+            ),
+            description_placeholders={"gateway": f"{self._host}:{self._port}", "count": str(len(options))},
+            errors=errors,
+        )
+
+    async def async_step_import(self, import_data) -> FlowResult:
+        """由地址扫描批量创建的设备条目."""
+        host = import_data[CONF_HOST]
+        port = import_data.get(CONF_PORT, DEFAULT_PORT)
+        device_addr = import_data.get(CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR)
+        await self.async_set_unique_id(generate_device_id(host, port, device_addr))
+        self._abort_if_unique_id_configured()
+        return self._create_device_entry(host, port, device_addr)
+
+    def _create_device_entry(self, host: str, port: int, device_addr: str) -> FlowResult:
+        """创建单台设备的配置条目."""
+        return self.async_create_entry(
+            title=f"MIYA HRV ({host}:{port} #{device_addr})",
+            data={CONF_HOST: host, CONF_PORT: port, CONF_DEVICE_ADDR: device_addr},
+        )
+
+
+class MiyaHRVOptionsFlow(config_entries.OptionsFlow):
+    """处理MIYA HRV选项."""
+
+    async def async_step_init(self, user_input=None) -> FlowResult:
+        """设置选项."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_POLL_INTERVAL,
+                        default=options.get(CONF_POLL_INTERVAL, DEFAULT_POLL_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=5, max=3600)),
+                    vol.Optional(
+                        CONF_BAUD_RATE,
+                        default=options.get(CONF_BAUD_RATE, DEFAULT_BAUD_RATE),
+                    ): vol.All(vol.Coerce(int), vol.In(BAUD_RATES)),
+                    vol.Optional(
+                        CONF_MIN_PUBLISH_INTERVAL,
+                        default=options.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=300)),
+                    vol.Optional(
+                        CONF_COMMAND_EXPIRY,
+                        default=options.get(CONF_COMMAND_EXPIRY, DEFAULT_COMMAND_EXPIRY),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+                    vol.Optional(
+                        CONF_KEEPALIVE_INTERVAL,
+                        default=options.get(CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+                    vol.Optional(
+                        CONF_LOG_LEVEL,
+                        default=options.get(CONF_LOG_LEVEL, DEFAULT_LOG_LEVEL),
+                    ): vol.In(LOG_LEVELS),
+                }
+            ),
+        )
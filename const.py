@@ -6,7 +6,7 @@ DOMAIN = "miya_hrv"
 DEFAULT_PORT = 38
 
 # 平台
-PLATFORMS = [Platform.CLIMATE, Platform.SWITCH]
+PLATFORMS = [Platform.CLIMATE, Platform.SWITCH, Platform.SENSOR]
 
 # 设备信息
 DEVICE_NAME = "MIYA HRV Fresh Air System"
@@ -17,6 +17,7 @@ ENTITY_ID_PREFIX = "miya"
 # 实体类型标识符
 ENTITY_TYPE_CLIMATE = "climate"
 ENTITY_TYPE_SWITCH = "switch"
+ENTITY_TYPE_SENSOR = "sensor"
 
 
 
@@ -30,6 +31,58 @@ DEFAULT_PORT = 38
 DEFAULT_HOST = "192.168.1.100"
 DEFAULT_DEVICE_ADDR = "01"
 
+# 地址发现
+CONF_DISCOVER = "discover"
+CONF_DEVICES = "devices"
+
+# hass.data 中共享网关连接注册表的键
+DATA_GATEWAYS = f"{DOMAIN}_gateways"
+
+# 状态持久化
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.status"
+STATUS_SAVE_DELAY = 10  # 秒，状态帧落盘的防抖间隔
+RUNTIME_SAVE_DELAY = 300  # 秒，仅运行时长变化时的落盘间隔
+
+# 运行时长与滤网
+FILTER_LIFE_HOURS = 4380  # 滤网额定使用时长（开机小时数，约半年连续运行）
+
+# 幂等命令抑制
+COMMAND_DEDUP_TTL = 30  # 秒，设备状态在此时间内确认过才用于判断命令是否多余
+
+# 状态轮询与在线判断
+CONF_POLL_INTERVAL = "poll_interval"
+DEFAULT_POLL_INTERVAL = 30  # 秒，定时查询设备状态的间隔
+UNAVAILABLE_MISSED_POLLS = 2  # 连续无应答的请求数达到此值时判定设备离线（一次请求及其重发只计一次）
+# 应答超时后的重发次数（超时和重发间隔由网关的往返时延估计得出）
+POLL_RETRIES = 1
+CONTROL_RETRIES = 1
+
+# 总线占用预算
+CONF_BAUD_RATE = "baud_rate"
+DEFAULT_BAUD_RATE = 9600
+BAUD_RATES = [2400, 4800, 9600, 19200, 38400, 57600, 115200]
+
+# 断线命令暂存
+CONF_COMMAND_EXPIRY = "command_expiry"
+DEFAULT_COMMAND_EXPIRY = 300  # 秒，网关断开期间暂存的命令超过此时间不再补发
+
+# 实体状态发布
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
+DEFAULT_MIN_PUBLISH_INTERVAL = 0  # 秒，0 表示状态变化立即发布
+
+# 网关连接保活
+CONF_KEEPALIVE_INTERVAL = "keepalive_interval"
+DEFAULT_KEEPALIVE_INTERVAL = 30  # 秒，0 表示不发送保活包
+
+# 集成日志级别（default 沿用 Home Assistant 的 logger 配置）
+CONF_LOG_LEVEL = "log_level"
+DEFAULT_LOG_LEVEL = "default"
+LOG_LEVELS = ["default", "warning", "info", "debug"]
+
+# 修改后需要重新加载配置条目的连接参数（其余选项在运行中直接生效）
+RELOAD_KEYS = (CONF_HOST, CONF_PORT, CONF_DEVICE_ADDR)
+
 # 验证
 MIN_TEMP = 16.0
 MAX_TEMP = 30.0
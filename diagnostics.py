@@ -0,0 +1,49 @@
+"""MIYA HRV 诊断信息."""
+from homeassistant.components.diagnostics import async_redact_data
+
+from .helpers.common_imports import time, Any, ConfigEntry, HomeAssistant, CONF_HOST
+from .const import DOMAIN
+from .helpers.ha_utils import MiyaHRVManager
+from .helpers.protocal import status_decode_cache
+
+TO_REDACT = {CONF_HOST}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """返回配置条目的诊断信息：设备状态、在线判断和网关往返时延估计."""
+    diagnostics: dict[str, Any] = {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+    }
+    manager: MiyaHRVManager = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if manager is None:
+        return diagnostics
+
+    now = time.monotonic()
+    diagnostics["device"] = {
+        "address": f"{manager.address:02X}",
+        "available": manager.available,
+        "status_stale": manager.status_stale,
+        "status_age_s": round(now - manager.status_time, 1) if manager.status_time else None,
+        "status": manager.status.as_dict() if manager.status.valid else None,
+        "poll_interval_s": manager.poll_interval,
+        "suppressed_writes": manager.suppressed_writes,
+        "pending_fields": len(manager._pending),
+        "breaker": manager.breaker.as_dict(now),
+    }
+
+    # 进程内所有设备共用的状态解析缓存
+    diagnostics["decode_cache"] = status_decode_cache.as_dict()
+
+    gateway = manager.gateway
+    if gateway is not None:
+        diagnostics["gateway"] = {
+            "connected": gateway.connected,
+            "units": sorted(f"{address:02X}" for address in gateway.managers),
+            "rtt": gateway.rtt.as_dict(),
+            "min_poll_interval_s": round(gateway.min_poll_interval, 3),
+            "bus": gateway.bus.as_dict(len(gateway.managers)),
+        }
+    return diagnostics
@@ -0,0 +1,76 @@
+"""MIYA HRV 实体基类."""
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_call_later
+
+from .helpers.common_imports import time, Optional, Callable, callback
+from .helpers.ha_utils import MiyaHRVManager
+
+
+class MiyaHRVEntity(Entity):
+    """订阅管理器状态变化的实体基类.
+
+    设置了最小发布间隔时，间隔内的多次状态变化合并为一次写入，
+    写入时直接读取共享状态缓冲区，因此发布的总是最新值。
+    """
+
+    _attr_should_poll = False
+
+    def __init__(self, manager: MiyaHRVManager):
+        """初始化实体."""
+        self._manager = manager
+        self._remove_listener: Optional[Callable[[], None]] = None
+        self._cancel_publish: Optional[Callable[[], None]] = None
+        self._last_publish = 0.0
+        self._published_available = True
+
+    @property
+    def available(self) -> bool:
+        """设备在线时可用：连续无应答或熔断时不可用；网关断开时在暂存命令有效期内仍可用，命令进入暂存队列."""
+        return self._manager.available
+
+    @property
+    def assumed_state(self) -> bool:
+        """状态来自重启前的存储、尚未被设备确认时为True."""
+        return self._manager.status_stale
+
+    @callback
+    def _handle_status_update(self) -> None:
+        """共享状态缓冲区已更新，按最小发布间隔写入实体状态."""
+        if self._cancel_publish is not None:
+            # 已有待发布的写入，届时读取最新状态
+            return
+        interval = self._manager.min_publish_interval
+        if self._manager.available != self._published_available:
+            # 可用性变化不受最小发布间隔限制
+            interval = 0
+        wait = self._last_publish + interval - time.monotonic() if interval else 0
+        if wait <= 0:
+            self._publish()
+        else:
+            self._cancel_publish = async_call_later(self.hass, wait, self._publish_later)
+
+    @callback
+    def _publish_later(self, _now) -> None:
+        """最小发布间隔到期，写入合并后的最新状态."""
+        self._cancel_publish = None
+        self._publish()
+
+    @callback
+    def _publish(self) -> None:
+        self._last_publish = time.monotonic()
+        self._published_available = self._manager.available
+        self.async_write_ha_state()
+
+    async def async_added_to_hass(self) -> None:
+        """实体添加到Home Assistant时订阅管理器."""
+        await super().async_added_to_hass()
+        self._remove_listener = self._manager.async_add_listener(self._handle_status_update)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """实体从Home Assistant移除时取消订阅和待发布的写入."""
+        if self._remove_listener:
+            self._remove_listener()
+            self._remove_listener = None
+        if self._cancel_publish:
+            self._cancel_publish()
+            self._cancel_publish = None
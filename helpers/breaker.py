@@ -0,0 +1,83 @@
+'''
+单台设备的熔断器
+总线上某台设备断电或故障时，发往它的查询和命令会一直占用总线时间并等待超时，拖慢同一网关上的其它设备。
+
+- 闭合 (closed): 正常收发；连续无应答达到阈值即断开
+- 断开 (open): 不再轮询和发送命令，只按探测间隔偶尔发一次状态查询
+- 半开 (half_open): 探测查询已发出、等待结果，期间不放行其它请求；
+  收到应答即闭合，仍无应答则重新断开并加倍探测间隔
+
+'''
+from typing import Any, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 探测间隔(秒)：首次断开后的间隔，连续探测失败逐次加倍到上限
+BREAKER_PROBE_DELAY = 30.0
+BREAKER_PROBE_DELAY_MAX = 900.0
+
+
+class CircuitBreaker:
+    """一个设备地址的熔断器（时间均为 time.monotonic）"""
+
+    __slots__ = ('threshold', 'state', 'failures', 'trips', 'probe_delay', 'next_probe')
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.state = CLOSED
+        # 闭合状态下连续无应答的请求数
+        self.failures = 0
+        self.trips = 0
+        self.probe_delay = BREAKER_PROBE_DELAY
+        self.next_probe = 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CLOSED
+
+    def allow_poll(self, now: float) -> bool:
+        """是否放行一次轮询；断开状态下探测时间已到时转为半开，放行这一次探测"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.next_probe:
+            self.state = HALF_OPEN
+            return True
+        return False
+
+    def record_success(self) -> bool:
+        """收到设备的帧；返回是否由断开/半开恢复为闭合"""
+        self.failures = 0
+        if self.state == CLOSED:
+            return False
+        self.state = CLOSED
+        self.probe_delay = BREAKER_PROBE_DELAY
+        return True
+
+    def record_failure(self, now: float) -> bool:
+        """请求无应答；返回是否由闭合转为断开"""
+        if self.state == CLOSED:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            self.state = OPEN
+            self.trips += 1
+            self.next_probe = now + self.probe_delay
+            return True
+        if self.state == HALF_OPEN:
+            # 探测失败：重新断开，加倍探测间隔
+            self.probe_delay = min(self.probe_delay * 2, BREAKER_PROBE_DELAY_MAX)
+            self.state = OPEN
+            self.next_probe = now + self.probe_delay
+        return False
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        """当前状态，用于诊断信息"""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'probe_delay_s': self.probe_delay,
+            'next_probe_in_s': round(max(0.0, self.next_probe - now), 1) if self.state == OPEN else None,
+        }
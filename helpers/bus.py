@@ -0,0 +1,108 @@
+'''
+总线占用预算
+按配置的波特率把一条网关总线上收发的字节数换算为线路占用时间，估计总线利用率，
+并据此限制轮询：轮询间隔不短于预算允许的值，利用率达到目标时推迟轮询。
+用户命令不受限制，只计入利用率。
+
+利用率按时间常数 BUS_WINDOW 指数衰减累计，每次收发 O(1) 更新；
+同时按设备地址分别累计，得出每台设备占用总线的份额（各设备份额之和即其总线利用率，不含广播）。
+
+'''
+import math
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# 每字节线路位数（8N1: 起始位 + 8 数据位 + 停止位）
+BITS_PER_BYTE = 10
+# 每帧额外占用的帧间静默和收发切换时间（字符时间）
+TURNAROUND_CHARS = 3.5
+# 利用率统计的时间常数(秒)
+BUS_WINDOW = 60.0
+# 轮询允许占用的总线利用率上限
+BUS_UTILISATION_TARGET = 0.5
+# 一次轮询在总线上的字节数：查询帧 + 状态帧
+POLL_EXCHANGE_FRAMES = (20, 20)
+
+
+class BusBudget:
+    """一条485总线的占用统计和轮询预算"""
+
+    __slots__ = ('baud_rate', 'target', 'tx_bytes', 'rx_bytes', 'tx_frames', 'rx_frames',
+                 'deferred_polls', '_busy', '_time', '_units')
+
+    def __init__(self, baud_rate: int, target: float = BUS_UTILISATION_TARGET):
+        self.baud_rate = baud_rate
+        self.target = target
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+        self.tx_frames = 0
+        self.rx_frames = 0
+        self.deferred_polls = 0
+        # 指数衰减累计的线路占用时间(秒)及其更新时间 (time.monotonic)
+        self._busy = 0.0
+        self._time = time.monotonic()
+        # 设备地址 -> (衰减累计的占用时间, 更新时间)
+        self._units: Dict[int, Tuple[float, float]] = {}
+
+    def frame_time(self, length: int) -> float:
+        """一帧在总线上占用的时间(秒)"""
+        return (length + TURNAROUND_CHARS) * BITS_PER_BYTE / self.baud_rate
+
+    def _decayed(self, now: float) -> float:
+        return self._busy * math.exp(-(now - self._time) / BUS_WINDOW) if now > self._time else self._busy
+
+    def record(self, length: int, received: bool = False, now: Optional[float] = None,
+               address: Optional[int] = None):
+        """记录一帧收发；给出设备地址时同时计入该设备的份额"""
+        if now is None:
+            now = time.monotonic()
+        busy = self.frame_time(length)
+        self._busy = self._decayed(now) + busy
+        self._time = now
+        if address is not None:
+            self._units[address] = (self._unit_decayed(address, now) + busy, now)
+        if received:
+            self.rx_bytes += length
+            self.rx_frames += 1
+        else:
+            self.tx_bytes += length
+            self.tx_frames += 1
+
+    def utilisation(self, now: Optional[float] = None) -> float:
+        """最近约 BUS_WINDOW 秒的总线利用率 (0~1)"""
+        if now is None:
+            now = time.monotonic()
+        return min(1.0, self._decayed(now) / BUS_WINDOW)
+
+    def _unit_decayed(self, address: int, now: float) -> float:
+        busy, updated = self._units.get(address, (0.0, now))
+        return busy * math.exp(-(now - updated) / BUS_WINDOW) if now > updated else busy
+
+    def unit_utilisation(self, address: int, now: Optional[float] = None) -> float:
+        """最近约 BUS_WINDOW 秒某台设备的收发占用总线的份额 (0~1)"""
+        if now is None:
+            now = time.monotonic()
+        return min(1.0, self._unit_decayed(address, now) / BUS_WINDOW)
+
+    def over_budget(self, now: Optional[float] = None) -> bool:
+        """利用率已达到目标，轮询应推迟"""
+        return self.utilisation(now) >= self.target
+
+    def min_poll_interval(self, units: int) -> float:
+        """所有设备各轮询一次的总线占用不超过目标利用率时的最小轮询间隔(秒)"""
+        exchange = sum(self.frame_time(length) for length in POLL_EXCHANGE_FRAMES)
+        return units * exchange / self.target
+
+    def as_dict(self, units: int = 0) -> Dict[str, Any]:
+        """当前统计，用于诊断信息"""
+        return {
+            'baud_rate': self.baud_rate,
+            'target': self.target,
+            'utilisation': round(self.utilisation(), 4),
+            'min_poll_interval_s': round(self.min_poll_interval(units), 3),
+            'tx_bytes': self.tx_bytes,
+            'rx_bytes': self.rx_bytes,
+            'tx_frames': self.tx_frames,
+            'rx_frames': self.rx_frames,
+            'deferred_polls': self.deferred_polls,
+        }
@@ -0,0 +1,284 @@
+'''
+抓包离线分析
+将抓包记录零拷贝映射为NumPy结构化数组，按列向量化解析状态字段，
+统计各地址更新频率、各风速档位时长、旁通/辅热占空比、CRC失败率和帧间隔。
+
+'''
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy 只在离线分析时需要
+    np = None
+
+try:
+    from .protocal import STATUS_BYTE_OFFSETS
+    from .tcp_485_lib.capture import CaptureReader, HEADER_SIZE, RECORD_SIZE, MAX_RECORD_DATA, DIRECTION_RX
+except ImportError:
+    from protocal import STATUS_BYTE_OFFSETS
+    from tcp_485_lib.capture import CaptureReader, HEADER_SIZE, RECORD_SIZE, MAX_RECORD_DATA, DIRECTION_RX
+
+STATUS_FRAME_HEADER = 0xC7
+STATUS_FRAME_LENGTH = 20
+FAN_LEVELS = 5
+STATE_ON = 0x02
+
+# 帧间隔直方图边界(秒)，各分片直方图可直接相加合并
+GAP_BUCKETS = [0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0, float("inf")]
+
+
+def _require_numpy():
+    """检查numpy是否可用"""
+    if np is None:
+        raise ImportError("抓包分析需要安装 numpy")
+
+
+def capture_dtype():
+    """抓包记录对应的结构化数据类型（与 RECORD_STRUCT 布局一致）"""
+    _require_numpy()
+    dtype = np.dtype([
+        ('timestamp', '<f8'),
+        ('direction', 'u1'),
+        ('length', 'u1'),
+        ('data', 'u1', (MAX_RECORD_DATA,)),
+    ])
+    assert dtype.itemsize == RECORD_SIZE
+    return dtype
+
+
+def load_records(reader: CaptureReader, start: int = 0, stop: Optional[int] = None):
+    """
+    将抓包记录映射为结构化数组（零拷贝视图，使用期间reader须保持打开）
+    """
+    _require_numpy()
+    count = len(reader)
+    stop = count if stop is None else min(stop, count)
+    if start >= stop:
+        return np.zeros(0, dtype=capture_dtype())
+    return np.frombuffer(
+        reader.buffer, dtype=capture_dtype(), count=stop - start,
+        offset=HEADER_SIZE + start * RECORD_SIZE,
+    )
+
+
+def _crc16_table():
+    """CCITT CRC16查表（与 crc_miya.crc16_ccitt 等价）"""
+    table = np.zeros(256, dtype=np.uint32)
+    for value in range(256):
+        crc = value << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+        table[value] = crc
+    return table
+
+
+def crc_ok_columns(data):
+    """
+    按列计算每帧CRC并与帧尾比较，返回布尔数组
+    """
+    table = _crc16_table()
+    crc = np.zeros(len(data), dtype=np.uint32)
+    for column in range(18):
+        crc = ((crc << 8) & 0xFFFF) ^ table[((crc >> 8) ^ data[:, column]) & 0xFF]
+    expected = (data[:, 18].astype(np.uint32) << 8) | data[:, 19]
+    return crc == expected
+
+
+def decode_status_columns(records) -> Dict[str, Any]:
+    """
+    从记录中挑出接收方向的20字节状态帧，按 STATUS_BYTE_OFFSETS 解析为列
+    """
+    _require_numpy()
+    rx = records[records['direction'] == DIRECTION_RX]
+    data = rx['data']
+    is_status = (rx['length'] == STATUS_FRAME_LENGTH) & (data[:, 0] == STATUS_FRAME_HEADER)
+    rx_timestamps = rx['timestamp']
+
+    status = rx[is_status]
+    data = status['data']
+    crc_ok = crc_ok_columns(data)
+    columns = {name: data[:, offset] for name, offset in STATUS_BYTE_OFFSETS.items()}
+
+    # 进风/排风一致时为有效档位，否则记为0（未知）
+    fan_level = np.where(columns['in_speed'] == columns['out_speed'], columns['in_speed'], 0)
+    fan_level[fan_level > FAN_LEVELS] = 0
+
+    columns.update({
+        'timestamp': status['timestamp'],
+        'crc_ok': crc_ok,
+        'fan_level': fan_level,
+        'rx_timestamp': rx_timestamps,
+        'rx_frames': len(rx),
+        'status_frames': len(status),
+    })
+    return columns
+
+
+def analyze_records(records, max_interval: float = 300.0) -> Dict[str, Any]:
+    """
+    向量化统计一段记录，返回可合并的部分聚合结果
+
+    每帧状态持续到同一地址的下一帧，单段时长上限为 max_interval 秒
+    """
+    columns = decode_status_columns(records)
+    valid = columns['crc_ok']
+    addresses = columns['device_address'][valid]
+    timestamps = columns['timestamp'][valid]
+    fan_level = columns['fan_level'][valid]
+    bypass_on = columns['bypass'][valid] == STATE_ON
+    heat_on = columns['auxiliary_heat'][valid] == STATE_ON
+
+    # 按 (地址, 时间) 排序后计算同一地址相邻帧之间的时长
+    order = np.lexsort((timestamps, addresses))
+    addresses = addresses[order]
+    timestamps = timestamps[order]
+    fan_level = fan_level[order]
+    bypass_on = bypass_on[order]
+    heat_on = heat_on[order]
+
+    durations = np.zeros(len(timestamps))
+    if len(timestamps) > 1:
+        same_address = addresses[1:] == addresses[:-1]
+        durations[:-1] = np.where(same_address, np.minimum(np.diff(timestamps), max_interval), 0.0)
+
+    address_ids = addresses.astype(np.intp)
+    frames = np.bincount(address_ids, minlength=256)
+    observed = np.bincount(address_ids, weights=durations, minlength=256)
+    bypass_seconds = np.bincount(address_ids, weights=durations * bypass_on, minlength=256)
+    heat_seconds = np.bincount(address_ids, weights=durations * heat_on, minlength=256)
+    level_seconds = np.bincount(
+        address_ids * (FAN_LEVELS + 1) + fan_level, weights=durations, minlength=256 * (FAN_LEVELS + 1)
+    ).reshape(256, FAN_LEVELS + 1)
+
+    first_ts = np.full(256, np.inf)
+    last_ts = np.full(256, -np.inf)
+    np.minimum.at(first_ts, address_ids, timestamps)
+    np.maximum.at(last_ts, address_ids, timestamps)
+
+    rx_timestamps = np.sort(columns['rx_timestamp'])
+    gaps = np.diff(rx_timestamps)
+    gap_histogram = np.histogram(gaps, bins=GAP_BUCKETS)[0] if len(gaps) else np.zeros(len(GAP_BUCKETS) - 1, dtype=np.int64)
+
+    return {
+        'rx_frames': columns['rx_frames'],
+        'status_frames': columns['status_frames'],
+        'crc_failures': int(np.count_nonzero(~columns['crc_ok'])),
+        'frames': frames,
+        'observed_seconds': observed,
+        'bypass_seconds': bypass_seconds,
+        'aux_heat_seconds': heat_seconds,
+        'level_seconds': level_seconds,
+        'first_ts': first_ts,
+        'last_ts': last_ts,
+        'gap_count': len(gaps),
+        'gap_sum': float(gaps.sum()) if len(gaps) else 0.0,
+        'gap_max': float(gaps.max()) if len(gaps) else 0.0,
+        'gap_histogram': gap_histogram,
+    }
+
+
+def merge_partials(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并多个分片的部分聚合结果（分片边界处的一段时长不计入）"""
+    merged = dict(partials[0])
+    for part in partials[1:]:
+        for key in ('rx_frames', 'status_frames', 'crc_failures', 'gap_count', 'gap_sum',
+                    'frames', 'observed_seconds', 'bypass_seconds', 'aux_heat_seconds',
+                    'level_seconds', 'gap_histogram'):
+            merged[key] = merged[key] + part[key]
+        merged['first_ts'] = np.minimum(merged['first_ts'], part['first_ts'])
+        merged['last_ts'] = np.maximum(merged['last_ts'], part['last_ts'])
+        merged['gap_max'] = max(merged['gap_max'], part['gap_max'])
+    return merged
+
+
+def summarize(partial: Dict[str, Any]) -> Dict[str, Any]:
+    """将聚合结果整理为按地址的统计报告"""
+    per_address = {}
+    for address in np.flatnonzero(partial['frames']):
+        frames = int(partial['frames'][address])
+        span = float(partial['last_ts'][address] - partial['first_ts'][address])
+        observed = float(partial['observed_seconds'][address])
+        levels = partial['level_seconds'][address]
+        per_address[f"0x{address:02X}"] = {
+            'frames': frames,
+            'updates_per_minute': frames * 60.0 / span if span > 0 else 0.0,
+            'fan_level_seconds': {
+                ('unknown' if level == 0 else f"level_{level}"): float(levels[level])
+                for level in range(FAN_LEVELS + 1) if levels[level]
+            },
+            'bypass_duty': float(partial['bypass_seconds'][address]) / observed if observed else 0.0,
+            'aux_heat_duty': float(partial['aux_heat_seconds'][address]) / observed if observed else 0.0,
+        }
+
+    status_frames = partial['status_frames']
+    gap_count = partial['gap_count']
+    return {
+        'rx_frames': int(partial['rx_frames']),
+        'status_frames': int(status_frames),
+        'crc_failure_rate': partial['crc_failures'] / status_frames if status_frames else 0.0,
+        'inter_frame_gap': {
+            'mean': partial['gap_sum'] / gap_count if gap_count else 0.0,
+            'max': partial['gap_max'],
+            'histogram': {
+                (f"<{GAP_BUCKETS[i + 1]}s" if i + 2 < len(GAP_BUCKETS) else f">={GAP_BUCKETS[i]}s"): int(count)
+                for i, count in enumerate(partial['gap_histogram'])
+            },
+        },
+        'addresses': per_address,
+    }
+
+
+def _analyze_slice(path: str, start: int, stop: int, max_interval: float) -> Dict[str, Any]:
+    """进程池工作函数：各自mmap同一文件并分析一段记录"""
+    with CaptureReader(path) as reader:
+        records = load_records(reader, start, stop)
+        result = analyze_records(records, max_interval)
+        del records
+    return result
+
+
+def analyze_capture(path: str,
+                    workers: Optional[int] = None,
+                    chunk_records: int = 2_000_000,
+                    max_interval: float = 300.0) -> Dict[str, Any]:
+    """
+    分析整个抓包文件
+
+    Args:
+        path: 抓包文件路径
+        workers: 进程池大小，None或1时在当前进程内分析
+        chunk_records: 每个分片的记录数（仅多进程时使用）
+        max_interval: 单段状态时长上限(秒)
+    """
+    _require_numpy()
+    with CaptureReader(path) as reader:
+        count = len(reader)
+        if not workers or workers <= 1 or count <= chunk_records:
+            records = load_records(reader)
+            partial = analyze_records(records, max_interval)
+            del records
+            return summarize(partial)
+
+    ranges = [(start, min(start + chunk_records, count)) for start in range(0, count, chunk_records)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(
+            _analyze_slice,
+            [path] * len(ranges), [r[0] for r in ranges], [r[1] for r in ranges],
+            [max_interval] * len(ranges),
+        ))
+    return summarize(merge_partials(partials))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MIYA HRV 抓包离线分析")
+    parser.add_argument("path", help="抓包文件路径")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="进程池大小")
+    parser.add_argument("--chunk", type=int, default=2_000_000, help="每个分片的记录数")
+    args = parser.parse_args()
+
+    print(json.dumps(analyze_capture(args.path, args.workers, args.chunk), indent=2, ensure_ascii=False))
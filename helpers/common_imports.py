@@ -8,19 +8,25 @@
 # 标准库导入
 import logging
 import asyncio
-from typing import Any, List, Optional, Dict, Union
+import time
+from typing import Any, Callable, List, Optional, Dict, Iterable, Union
 
 # Home Assistant 核心导入
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall, callback, ServiceResponse, SupportsResponse
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
     CONF_HOST, 
     CONF_PORT, 
     CONF_NAME,
     ATTR_TEMPERATURE,
-    UnitOfTemperature
+    PERCENTAGE,
+    UnitOfTemperature,
+    UnitOfTime
 )
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
 # Home Assistant 组件导入
@@ -30,6 +36,11 @@ from homeassistant.components.climate import (
     HVACMode,
 )
 from homeassistant.components.switch import SwitchEntity
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
 
 # 创建日志记录器
 _LOGGER = logging.getLogger(__name__) 
\ No newline at end of file
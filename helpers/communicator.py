@@ -8,25 +8,47 @@
 from .common_imports import asyncio, logging, _LOGGER
 
 try:
-    from .tcp_485_lib import create_client
+    from .tcp_485_lib import create_client, CaptureWriter
+    from .protocal import FRAME_LENGTHS, status_collapse_key
 except ImportError:
-    from tcp_485_lib import create_client
+    from tcp_485_lib import create_client, CaptureWriter
+    from protocal import FRAME_LENGTHS, status_collapse_key
 
 class TCP_485_Device:
     """MIYA HRV设备类."""
     
-    def __init__(self, host: str, port: int):
-        """初始化设备."""
+    __slots__ = ('host', 'port', 'client', 'keepalive_interval', 'task_factory', 'capture', 'arrival_callback')
+    
+    def __init__(self, host: str, port: int, task_factory=None):
+        """初始化设备（task_factory 创建客户端的后台任务，由宿主管理任务归属）."""
         self.host = host
         self.port = port
         self.client = None
+        self.task_factory = task_factory
+        # TCP保活间隔(秒)，0 表示不保活
+        self.keepalive_interval = 30.0
+        # 抓包写入器由设备持有，挂接到每次新建的客户端，重连不中断抓包
+        self.capture = None
+        # 每帧到达时的回调 (帧, loop.time())，设置到每次新建的客户端
+        self.arrival_callback = None
         
     async def connect(self):
         """Connect to the device."""
         try:
             print(f"🔌 正在连接到设备 {self.host}:{self.port}...")
-            self.client = create_client(self.host, self.port, "hex")
-            if await self.client.connect():
+            client = self.client = create_client(self.host, self.port, "bytes",
+                                        tcp_keepalive=self.keepalive_interval > 0,
+                                        keepalive_interval=self.keepalive_interval or 30.0,
+                                        frame_lengths=FRAME_LENGTHS, collapse_key=status_collapse_key,
+                                        task_factory=self.task_factory)
+            client.attach_capture(self.capture)
+            client.arrival_callback = self.arrival_callback
+            if await client.connect():
+                if self.client is not client:
+                    # 连接期间已被 disconnect() 摘除：关闭刚建立的连接及其后台任务（不关闭抓包）
+                    client.attach_capture(None)
+                    await client.disconnect()
+                    return False
                 _LOGGER.info(f"✅ 成功连接到MIYA HRV设备 {self.host}:{self.port}")
                 return True
             else:
@@ -37,14 +59,26 @@ class TCP_485_Device:
             return False
     
     async def disconnect(self):
-        """断开设备连接."""
-        if self.client:
-            await self.client.disconnect()
-            self.client = None
+        """断开设备连接（先摘除客户端，正在进行的 connect() 完成后据此自行关闭）."""
+        client, self.client = self.client, None
+        if client:
+            # 抓包不随连接断开停止，由 stop_capture 关闭
+            client.attach_capture(None)
+            await client.disconnect()
             _LOGGER.info(f"已断开设备连接 {self.host}:{self.port}")
         else:
             print(" 设备未连接，无需断开")
     
+    def set_keepalive(self, interval: float):
+        """设置TCP保活间隔（0 关闭），已连接时立即作用于客户端."""
+        if interval == self.keepalive_interval:
+            return
+        self.keepalive_interval = interval
+        if self.client:
+            if interval > 0:
+                self.client.set_keepalive_interval(interval)
+            self.client.enable_tcp_keepalive(interval > 0)
+
     async def send_command(self, command: str):
         """Send command to the device."""
         if self.client:
@@ -57,6 +91,39 @@ class TCP_485_Device:
         else:
             _LOGGER.warning("设备未连接，无法发送命令")
 
+    async def send_bytes(self, data: bytes) -> bool:
+        """发送原始帧，返回是否写入成功."""
+        if not self.client:
+            _LOGGER.warning("设备未连接，无法发送命令")
+            return False
+        return await self.client.send_bytes(data)
+
+    async def send_many(self, frames) -> bool:
+        """批量发送多帧（一次写入、一次drain），返回是否写入成功."""
+        if not self.client:
+            _LOGGER.warning("设备未连接，无法发送命令")
+            return False
+        return await self.client.send_many(frames)
+
+    async def start_capture(self, path: str):
+        """开始抓包，记录收发的总线数据（跨重连持续写入同一文件，直到 stop_capture）."""
+        if self.capture:
+            _LOGGER.warning(f"抓包已在进行中: {self.capture.path}")
+            return
+        capture = CaptureWriter(path)
+        await capture.async_start()
+        self.capture = capture
+        if self.client:
+            self.client.attach_capture(capture)
+
+    async def stop_capture(self):
+        """停止抓包，在执行器中等待剩余记录写完."""
+        capture, self.capture = self.capture, None
+        if capture:
+            if self.client:
+                self.client.attach_capture(None)
+            await asyncio.get_running_loop().run_in_executor(None, capture.close)
+
     async def listen_for_data(self):
         """监听设备数据 - 异步迭代器."""
         if not self.client:
@@ -32,14 +32,23 @@ command_set_dict = {
         "sleep_mode_on": "C7 12 00 02 00 00 00 00 00 02 00 00 00 00 00 00 00 00",
         "sleep_mode_off": "C7 12 00 02 00 00 00 00 00 01 00 00 00 00 00 00 00 00",
     
-        # fan_mode_level_1  
-        "fan_mode_level_1": "C7 12 00 02 00 00 02 02 00 00 00 00 00 00 00 00 00 00",
+        # manual mode (power on + manual, fan speed unchanged)
+        "power_manual": "C7 12 00 02 00 02 00 00 00 00 02 00 00 00 00 00 00 00",
+    
+        # fan_mode_level_1 (fan speed byte = level)
+        "fan_mode_level_1": "C7 12 00 02 00 00 01 01 00 00 00 00 00 00 00 00 00 00",
 
         # fan_mode_level_2
-        "fan_mode_level_2": "C7 12 00 02 00 00 03 03 00 00 00 00 00 00 00 00 00 00",
+        "fan_mode_level_2": "C7 12 00 02 00 00 02 02 00 00 00 00 00 00 00 00 00 00",
 
         # fan_mode_level_3
-        "fan_mode_level_3": "C7 12 00 02 00 00 04 04 00 00 00 00 00 00 00 00 00 00",
+        "fan_mode_level_3": "C7 12 00 02 00 00 03 03 00 00 00 00 00 00 00 00 00 00",
+
+        # fan_mode_level_4
+        "fan_mode_level_4": "C7 12 00 02 00 00 04 04 00 00 00 00 00 00 00 00 00 00",
+
+        # fan_mode_level_5
+        "fan_mode_level_5": "C7 12 00 02 00 00 05 05 00 00 00 00 00 00 00 00 00 00",
         
         # Device status query command
         "设备状态查询": "C7 12 00 01 00 00 00 00 00 00 00 00 00 00 00 00 00 00",
@@ -82,11 +91,11 @@ status_meanings_dict = {
             
             # fan_speed
             'fan_speed': {
-                0x01: 'Level_0',
-                0x02: 'Level_1',
-                0x03: 'Level_2',
-                0x04: 'Level_3',
-                0x05: 'Level_4'
+                0x01: 'Level_1',
+                0x02: 'Level_2',
+                0x03: 'Level_3',
+                0x04: 'Level_4',
+                0x05: 'Level_5'
             },
             
             # sleep_mode
@@ -0,0 +1,157 @@
+'''
+地址发现
+先发送广播地址查询，再逐个地址发送状态查询，在限定时间内收集总线上所有应答的设备地址。
+
+485 总线是半双工的，同时发出的多帧查询会使应答互相冲突：每次只查询一个地址，
+收到该地址的应答或等待一个应答超时（按实测往返时延估计）后再查询下一个。
+
+网关只接受一个 TCP 连接：已有网关连接（集成已配置该网关上的设备）时在该连接上扫描，
+没有时才建立临时连接。
+
+'''
+import asyncio
+import logging
+from typing import Iterable, List, Optional, Set
+
+try:
+    from .tcp_485_lib import create_client
+    from .protocal import FRAME_LENGTHS, address_query_frame, status_query_frame, parse_address_response
+    from .rtt import RttEstimator
+except ImportError:
+    from tcp_485_lib import create_client
+    from protocal import FRAME_LENGTHS, address_query_frame, status_query_frame, parse_address_response
+    from rtt import RttEstimator
+
+_LOGGER = logging.getLogger(__name__)
+
+# 默认扫描的地址范围 (0x01 ~ 0x20)
+DISCOVERY_ADDRESSES = range(0x01, 0x21)
+# 整个扫描的时间上限(秒)
+DISCOVERY_TIMEOUT = 15.0
+# 尚无往返时延样本时每个地址等待应答的时间(秒)
+DISCOVERY_PROBE_TIMEOUT = 0.3
+# 广播地址查询后等待应答的时间(秒)
+DISCOVERY_SETTLE = 0.5
+
+
+async def discover_addresses(host: str,
+                             port: int,
+                             addresses: Iterable[int] = DISCOVERY_ADDRESSES,
+                             timeout: float = DISCOVERY_TIMEOUT,
+                             probe_timeout: float = DISCOVERY_PROBE_TIMEOUT,
+                             settle: float = DISCOVERY_SETTLE,
+                             gateway=None) -> Optional[List[int]]:
+    """
+    扫描网关总线上的设备地址
+
+    Args:
+        host: 网关地址
+        port: 网关端口
+        addresses: 逐个查询的地址范围
+        timeout: 扫描时间上限(秒)，超时返回已发现的地址
+        probe_timeout: 尚无往返时延样本时每个地址等待应答的时间(秒)
+        settle: 广播地址查询后等待应答的时间(秒)
+        gateway: 已建立的网关连接（MiyaGateway），给出时在其连接上扫描，不另建连接
+
+    Returns:
+        已发现的地址列表（升序），无法连接网关时返回None
+    """
+    loop = asyncio.get_running_loop()
+    found: Set[int] = set()
+    replied = asyncio.Event()
+    probing: Optional[int] = None
+
+    def collect(frame: bytes):
+        address = parse_address_response(frame)
+        if not address:
+            return
+        if address == probing:
+            replied.set()
+        if address not in found:
+            found.add(address)
+            _LOGGER.info(f"发现设备地址: 0x{address:02X}")
+
+    if gateway is not None:
+        if not gateway.connected:
+            return None
+        # 已挂接的设备无需查询，不打扰其轮询
+        found.update(gateway.managers)
+        rtt = gateway.rtt
+        remove_tap = gateway.add_frame_tap(collect)
+
+        async def send(frame: bytes) -> bool:
+            if not await gateway.device.send_bytes(frame):
+                return False
+            gateway.bus.record(len(frame))
+            return True
+    else:
+        rtt = RttEstimator()
+        client = create_client(host, port, "bytes", tcp_keepalive=False, frame_lengths=FRAME_LENGTHS)
+        # 只用回调收集应答，不需要迭代器队列
+        client.enable_iterator(False)
+
+        async def on_frame(frame: bytes):
+            collect(frame)
+
+        client.set_data_callback(on_frame)
+        send = client.send_bytes
+
+    async def probe(address: int):
+        nonlocal probing
+        probing = address
+        replied.clear()
+        if gateway is not None:
+            # 由网关按应答更新往返时延估计
+            gateway.expect_reply(address)
+        sent = loop.time()
+        if not await send(status_query_frame(address)):
+            if gateway is not None:
+                gateway.cancel_reply(address)
+            return
+        try:
+            await asyncio.wait_for(replied.wait(), rtt.rto if rtt.samples else probe_timeout)
+        except asyncio.TimeoutError:
+            # 空地址无应答是正常的，不作为超时退避
+            if gateway is not None:
+                gateway.cancel_reply(address)
+        else:
+            if gateway is None:
+                rtt.sample(loop.time() - sent)
+
+    async def sweep():
+        # 广播地址查询的应答先收完，再逐个地址查询，总线上同时只有一个请求
+        await send(address_query_frame())
+        await asyncio.sleep(settle)
+        for address in addresses:
+            if address not in found:
+                await probe(address)
+
+    if gateway is None and not await client.connect(timeout=timeout):
+        return None
+    try:
+        await asyncio.wait_for(sweep(), timeout=timeout)
+    except asyncio.TimeoutError:
+        _LOGGER.warning(f"地址扫描超时 ({timeout}s)，返回已发现的 {len(found)} 个地址")
+    finally:
+        if gateway is not None:
+            remove_tap()
+        else:
+            await client.disconnect()
+
+    return sorted(found)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MIYA HRV 总线地址扫描")
+    parser.add_argument("host", help="网关地址")
+    parser.add_argument("--port", type=int, default=38, help="网关端口 (默认38)")
+    parser.add_argument("--timeout", type=float, default=DISCOVERY_TIMEOUT, help="扫描时间上限(秒)")
+    args = parser.parse_args()
+
+    result = asyncio.run(discover_addresses(args.host, args.port, timeout=args.timeout))
+    if result is None:
+        print("无法连接网关")
+    else:
+        print(" ".join(f"{addr:02X}" for addr in result) or "未发现设备")
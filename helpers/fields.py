@@ -0,0 +1,142 @@
+'''
+协议字段表
+用一张声明式的表描述状态/控制帧中每个功能字段的字节偏移、取值和含义，
+导入时由表生成并编译专用的解码、编码函数（展开为逐字段的直接索引，没有逐字段循环和分支查找）。
+
+其它型号的新风机只需另写一张字段表、生成各自的编解码器，运行时没有额外开销。
+
+'''
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+ON_OFF = {0x01: 'off', 0x02: 'on'}
+
+
+class Field:
+    """字段表中的一个功能字段
+
+    Args:
+        key: 状态键（与 MiyaCommandAnalyzer.get_status_data 的键一致）
+        offsets: 字段所在的字节偏移；多个偏移（如进风/排风）取值一致时才有效
+        values: 线上取值 -> 含义
+        unknown: 取值不在表中时的含义
+        gate: (偏移, {线上取值: 含义或None})，先看门控字节: 对应含义时直接取该含义，
+              对应 None 时再解析本字段，不在表中时状态中没有此键（如关机时运行模式为 off）
+        decoded: 是否出现在解码的状态记录中（只用于编码的字段为 False）
+    """
+
+    __slots__ = ('key', 'offsets', 'values', 'unknown', 'gate', 'decoded')
+
+    def __init__(self,
+                 key: str,
+                 offsets: Sequence[int],
+                 values: Mapping[int, str],
+                 unknown: Optional[str] = 'Unknown Status',
+                 gate: Optional[Tuple[int, Mapping[int, Optional[str]]]] = None,
+                 decoded: bool = True):
+        self.key = key
+        self.offsets = tuple(offsets)
+        self.values = dict(values)
+        self.unknown = unknown
+        self.gate = gate
+        self.decoded = decoded
+
+
+# MIYA HRV 状态/控制帧字段表（状态记录的键顺序即表中顺序）
+MIYA_HRV_FIELDS = (
+    Field('power', (5,), ON_OFF, decoded=False),
+    Field('negative_ion', (8,), ON_OFF),
+    Field('sleep_mode', (9,), ON_OFF),
+    Field('UV_sterilization', (11,), ON_OFF),
+    Field('inner_cycle', (12,), ON_OFF, unknown='Unknown Mode'),
+    Field('auxiliary_heat', (13,), ON_OFF),
+    Field('bypass', (14,), ON_OFF),
+    Field('fan_mode', (6, 7), {level: f'level_{level}' for level in range(1, 6)}, unknown='unknown'),
+    Field('mode', (10,), {0x01: 'auto', 0x02: 'manual'}, gate=(5, {0x01: 'off', 0x02: None})),
+)
+
+
+class FieldCodec:
+    """由字段表生成的编解码器
+
+    decode(data) -> 状态记录字典；encode(**含义) -> {字节偏移: 线上取值}（未给出的字段不写入）
+    """
+
+    __slots__ = ('name', 'fields', 'offsets', 'decode', '_encode', 'decode_source', 'encode_source')
+
+    def __init__(self, fields: Sequence[Field], name: str = "miya_hrv"):
+        self.name = name
+        self.fields = tuple(fields)
+        # 状态键 -> 字节偏移
+        self.offsets: Dict[str, Tuple[int, ...]] = {field.key: field.offsets for field in self.fields}
+        namespace: Dict[str, Any] = {}
+        self.decode_source = self._decoder_source(namespace)
+        self.encode_source = self._encoder_source(namespace)
+        exec(compile(self.decode_source + self.encode_source, f"<fields:{name}>", "exec"), namespace)
+        self.decode = namespace['decode']
+        self._encode = namespace['encode']
+
+    def _decoder_source(self, namespace: Dict[str, Any]) -> str:
+        entries, gated = [], []
+        for index, field in enumerate(self.fields):
+            if not field.decoded:
+                continue
+            table = f"_d{index}"
+            namespace[table] = field.values
+            first = field.offsets[0]
+            if field.gate is not None:
+                gated.append((index, field, table))
+                continue
+            lookup = f"{table}.get(data[{first}], {field.unknown!r})"
+            if len(field.offsets) > 1:
+                same = " == ".join(f"data[{offset}]" for offset in field.offsets)
+                lookup = f"({lookup} if {same} else {field.unknown!r})"
+            entries.append(f"        {field.key!r}: {lookup},")
+
+        lines = ["def decode(data):", "    result = {", *entries, "    }"]
+        for index, field, table in gated:
+            gate_offset, gate_values = field.gate
+            keyword = "if"
+            for wire, meaning in gate_values.items():
+                lines.append(f"    {keyword} data[{gate_offset}] == {wire}:")
+                if meaning is not None:
+                    lines.append(f"        result[{field.key!r}] = {meaning!r}")
+                else:
+                    lines.append(f"        value = {table}.get(data[{field.offsets[0]}])")
+                    lines.append("        if value is not None:")
+                    lines.append(f"            result[{field.key!r}] = value")
+                keyword = "elif"
+        lines.append("    return result")
+        return "\n".join(lines) + "\n\n"
+
+    def _encoder_source(self, namespace: Dict[str, Any]) -> str:
+        params = ", ".join(f"{field.key}=None" for field in self.fields)
+        lines = [f"def encode({params}):", "    fields = {}"]
+        for index, field in enumerate(self.fields):
+            table = f"_e{index}"
+            namespace[table] = {meaning: wire for wire, meaning in field.values.items()}
+            targets = " = ".join(f"fields[{offset}]" for offset in field.offsets)
+            lines.append(f"    if {field.key} is not None:")
+            indent = "        "
+            if field.gate is not None:
+                # 门控含义（如 off）只写门控字节，其余含义只写本字段
+                gate_offset, gate_values = field.gate
+                gate_table = f"_g{index}"
+                namespace[gate_table] = {meaning: wire for wire, meaning in gate_values.items() if meaning is not None}
+                lines.append(f"        if {field.key} in {gate_table}:")
+                lines.append(f"            fields[{gate_offset}] = {gate_table}[{field.key}]")
+                lines.append("        else:")
+                indent = "            "
+            lines.append(f"{indent}{targets} = {table}[{field.key}]")
+        lines.append("    return fields")
+        return "\n".join(lines) + "\n"
+
+    def encode(self, **values: str) -> Dict[int, int]:
+        """把字段含义编码为 {字节偏移: 线上取值}"""
+        try:
+            return self._encode(**values)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"无效的字段或取值: {values}") from e
+
+
+# 导入时生成一次
+MIYA_HRV_CODEC = FieldCodec(MIYA_HRV_FIELDS)
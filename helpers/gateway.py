@@ -0,0 +1,299 @@
+'''
+网关连接共享
+同一网关(host:port)总线上的多台设备共用一条TCP连接，
+接收到的帧按设备地址分发给对应的管理器。
+
+'''
+from .common_imports import asyncio, logging, Optional, Dict, Iterable, Callable, HomeAssistant, _LOGGER
+
+from .communicator import TCP_485_Device
+from .tcp_485_lib import DataConverter
+from .protocal import status_query_frame
+from .rtt import RttEstimator
+from .bus import BusBudget
+from ..const import DATA_GATEWAYS, POLL_RETRIES, DEFAULT_BAUD_RATE
+# 连接断开后重新连接的等待时间(秒)，逐次加倍到上限
+RECONNECT_DELAY = 2.0
+RECONNECT_DELAY_MAX = 60.0
+
+
+def gateway_key(host: str, port: int) -> str:
+    """网关在注册表中的键."""
+    return f"{host}:{port}"
+
+
+def async_get_gateway(hass: HomeAssistant, host: str, port: int) -> "MiyaGateway":
+    """获取（不存在时创建）网关连接."""
+    gateways = hass.data.setdefault(DATA_GATEWAYS, {})
+    key = gateway_key(host, port)
+    gateway = gateways.get(key)
+    if gateway is None:
+        gateway = gateways[key] = MiyaGateway(hass, host, port)
+    return gateway
+
+
+class MiyaGateway:
+    """一个485-TCP网关及挂在其总线上的设备."""
+
+    __slots__ = ('hass', 'host', 'port', 'device', 'managers', 'rtt', 'bus', '_listen_task', '_acks', '_sent', '_taps', '_closing')
+
+    def __init__(self, hass: HomeAssistant, host: str, port: int):
+        """初始化网关."""
+        self.hass = hass
+        self.host = host
+        self.port = port
+        # 连接的接收、保活和重连任务与监听任务一样由网关持有，最后一台设备摘除时统一取消
+        self.device = TCP_485_Device(host, port, task_factory=self._create_task)
+        # 设备地址 -> 管理器
+        self.managers: Dict[int, object] = {}
+        self._listen_task: Optional[asyncio.Task] = None
+        # 最后一台设备已摘除、正在关闭：监听循环不再(重新)连接
+        self._closing = False
+        # 等待应答的地址 -> Future（批量控制的应答跟踪）
+        self._acks: Dict[int, asyncio.Future] = {}
+        # 往返时延估计，决定应答超时、重发间隔和最小轮询间隔
+        self.rtt = RttEstimator()
+        # 总线占用统计，按波特率限制轮询
+        self.bus = BusBudget(DEFAULT_BAUD_RATE)
+        # 等待应答的地址 -> 发送时间（loop.time()，重发过的请求为 None，不作为时延样本）
+        self._sent: Dict[int, Optional[float]] = {}
+        # 旁听收到的全部帧的回调（地址扫描借用本连接）
+        self._taps: list = []
+        # 在接收路径（入队前）按到达时间采样往返时延，不计排队和前面帧的处理时间
+        self.device.arrival_callback = self._on_arrival
+
+    @property
+    def connected(self) -> bool:
+        """网关连接是否可用."""
+        return bool(self.device.client and self.device.client.connected)
+
+    @property
+    def min_poll_interval(self) -> float:
+        """最小轮询间隔(秒)：总线上每台设备的查询及其重发都能在 RTO 内等到应答，且轮询占用不超过总线预算."""
+        units = len(self.managers)
+        return max(units * (1 + POLL_RETRIES) * self.rtt.rto, self.bus.min_poll_interval(units))
+
+    def _create_task(self, coro, name: str) -> asyncio.Task:
+        """创建网关连接的后台任务（不阻塞 HA 启动，停止时由 HA 取消）."""
+        return self.hass.async_create_background_task(coro, name)
+
+    def update_settings(self):
+        """按挂接设备的选项更新网关设置（运行中生效）.
+
+        同一总线上的设备配置不一致时按最低波特率估计占用；
+        任一设备启用保活即保活，取最短的保活间隔。
+        """
+        if not self.managers:
+            return
+        managers = self.managers.values()
+        self.bus.baud_rate = min(manager.baud_rate for manager in managers)
+        self.device.set_keepalive(min(
+            (manager.keepalive_interval for manager in managers if manager.keepalive_interval > 0), default=0
+        ))
+
+    def expect_reply(self, address: int, retransmit: bool = False):
+        """记录发往某地址、需要应答的请求；重发或与未应答请求重叠时不作为时延样本."""
+        if retransmit or address in self._sent:
+            self._sent[address] = None
+        else:
+            self._sent[address] = asyncio.get_running_loop().time()
+
+    def cancel_reply(self, address: int):
+        """请求未能发出，不再等待应答."""
+        self._sent.pop(address, None)
+
+    def reply_timeout(self, address: int):
+        """等待应答超时：RTO 退避."""
+        self._sent.pop(address, None)
+        self.rtt.backoff()
+
+    def _on_arrival(self, data: bytes, arrived: float):
+        """帧到达（尚未排队）：等待应答的地址收到帧即取样往返时延."""
+        if len(data) < 3 or data[0] != 0xC7:
+            return
+        sent = self._sent.pop(data[2], None)
+        if sent is not None:
+            self.rtt.sample(arrived - sent)
+
+    def add_frame_tap(self, tap: Callable[[bytes], None]) -> Callable[[], None]:
+        """旁听本连接收到的每一帧（含未配置地址和非状态帧），返回取消函数."""
+        self._taps.append(tap)
+        return lambda: self._taps.remove(tap) if tap in self._taps else None
+
+    async def attach(self, manager):
+        """挂接一台设备的管理器，首台设备挂接时建立连接."""
+        self.managers[manager.address] = manager
+        self.update_settings()
+        if self._listen_task is None or self._listen_task.done():
+            self._listen_task = self._create_task(
+                self._connect_and_listen(), f"miya_hrv gateway {self.host}:{self.port}"
+            )
+        elif self.connected:
+            await manager.on_connected()
+        else:
+            # 网关正在重连，设备在连接恢复并应答前不可用
+            manager.on_disconnected()
+
+    async def detach(self, manager):
+        """摘除一台设备的管理器，最后一台摘除时断开连接."""
+        if self.managers.get(manager.address) is manager:
+            del self.managers[manager.address]
+        if self.managers:
+            self.update_settings()
+            return
+
+        self.hass.data.get(DATA_GATEWAYS, {}).pop(gateway_key(self.host, self.port), None)
+        # 先标记关闭，监听循环不再重新连接（正在进行的连接完成后由设备关闭）；
+        # 再断开连接并等待客户端的全部后台任务结束（监听循环随连接断开退出），关闭抓包，最后取消监听任务。
+        # 顺序不能反：连接仍在时监听循环的 wait_for 可能吞掉取消，detach 会一直等待
+        self._closing = True
+        await self.device.disconnect()
+        await self.device.stop_capture()
+        task, self._listen_task = self._listen_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._sent.clear()
+
+    async def _connect_and_listen(self):
+        """连接网关并持续监听数据，按地址分发；连接断开后重新连接."""
+        delay = RECONNECT_DELAY
+        while not self._closing:
+            try:
+                # 客户端自身的重连可能已恢复连接，否则重新建立
+                if not self.connected:
+                    if self.device.client is not None:
+                        await self.device.disconnect()
+                    if not await self.device.connect():
+                        if self._closing:
+                            return
+                        self._set_disconnected()
+                        _LOGGER.error(f"无法连接到设备 {self.host}:{self.port}，{delay:.0f}秒后重试")
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                        continue
+                _LOGGER.info(f"✅ 成功连接到设备 {self.host}:{self.port}")
+                delay = RECONNECT_DELAY
+
+                # 补发断线期间的命令并查询所有已挂接设备的状态
+                for manager in list(self.managers.values()):
+                    await manager.on_connected()
+
+                async for data in self.device.listen_for_data():
+                    await self.dispatch(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _LOGGER.error(f"设备监听任务出错: {e}")
+            if self._closing:
+                return
+            _LOGGER.warning(f"⚠️ 与设备 {self.host}:{self.port} 的连接已断开")
+            self._set_disconnected()
+            await asyncio.sleep(delay)
+
+    def _set_disconnected(self):
+        """连接断开或连接失败：所有挂接设备立即不可用."""
+        for manager in list(self.managers.values()):
+            manager.on_disconnected()
+
+    async def dispatch(self, data: bytes):
+        """将一帧数据交给对应地址的管理器."""
+        self.bus.record(len(data), received=True, address=data[2] if len(data) >= 3 and data[0] == 0xC7 else None)
+        for tap in self._taps:
+            tap(data)
+        if len(data) < 3 or data[0] != 0xC7:
+            return
+        ack = self._acks.pop(data[2], None)
+        if ack is not None and not ack.done():
+            ack.set_result(data)
+        manager = self.managers.get(data[2])
+        if manager is not None:
+            await manager.handle_frame(data)
+        elif _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"忽略未配置地址的帧: {DataConverter.tcp_to_hex(data)}")
+
+    async def send_group(self,
+                         frames: Dict[int, bytes],
+                         window: int = 1,
+                         timeout: Optional[float] = None) -> Dict[int, bool]:
+        """逐地址连续发送帧并跟踪应答
+
+        不经过实体和服务调用，按滑动窗口在本网关连接上连续发送：
+        窗口内最多 window 帧等待应答，收到应答或超时后立即发送下一帧。
+
+        Args:
+            frames: 设备地址 -> 帧
+            window: 同时等待应答的最大帧数（半双工总线建议为1）
+            timeout: 每帧等待应答的超时(秒)，None 时使用往返时延估计的 RTO
+
+        Returns:
+            设备地址 -> 是否收到应答
+        """
+        loop = asyncio.get_running_loop()
+        if timeout is None:
+            timeout = self.rtt.rto
+        pending = list(frames.items())
+        pending.reverse()
+        in_flight: Dict[int, tuple] = {}
+        results: Dict[int, bool] = {}
+
+        while pending or in_flight:
+            # 窗口内空出的位置一次性补满，合并为一次写入
+            batch = []
+            while pending and len(in_flight) + len(batch) < max(1, window):
+                batch.append(pending.pop())
+            if batch:
+                futures = {}
+                for address, _ in batch:
+                    futures[address] = self._acks[address] = loop.create_future()
+                    self.expect_reply(address)
+                sent = await self.device.send_many([frame for _, frame in batch])
+                if sent:
+                    for address, frame in batch:
+                        self.bus.record(len(frame), address=address)
+                deadline = loop.time() + timeout
+                for address, future in futures.items():
+                    if sent:
+                        in_flight[address] = (future, deadline)
+                    else:
+                        self._acks.pop(address, None)
+                        self.cancel_reply(address)
+                        results[address] = False
+
+            if not in_flight:
+                continue
+            wait_time = max(0.0, min(deadline for _, deadline in in_flight.values()) - loop.time())
+            await asyncio.wait([future for future, _ in in_flight.values()],
+                               timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+
+            now = loop.time()
+            for address, (future, deadline) in list(in_flight.items()):
+                if future.done():
+                    results[address] = True
+                elif now >= deadline:
+                    future.cancel()
+                    if self._acks.get(address) is future:
+                        del self._acks[address]
+                    self.reply_timeout(address)
+                    results[address] = False
+                else:
+                    continue
+                del in_flight[address]
+
+        return results
+
+    async def broadcast(self,
+                        frame: bytes,
+                        addresses: Iterable[int],
+                        window: int = 1,
+                        timeout: Optional[float] = None) -> Dict[int, bool]:
+        """发送地址0广播控制帧（设备不应答），再逐地址查询状态作为应答确认."""
+        if not await self.device.send_bytes(frame):
+            return {address: False for address in addresses}
+        self.bus.record(len(frame))
+        return await self.send_group(
+            {address: status_query_frame(address) for address in addresses}, window, timeout
+        )
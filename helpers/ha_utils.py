@@ -2,140 +2,58 @@
 Home Assistant 工具模块
 ====================
 
-为 HA 组件提供设备状态获取和命令发送的辅助函数。
+每个配置条目一个设备管理器（协调器），实体直接持有其引用、订阅状态变化。
 """
 
-from .common_imports import asyncio, logging, Optional, Dict, Any, HomeAssistant, ConfigEntry, CONF_HOST, CONF_PORT, _LOGGER
+from datetime import timedelta
+from functools import partial
 
-from .communicator import TCP_485_Device
-from .protocal import MiyaCommandAnalyzer, cmd_calculate
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+from .common_imports import asyncio, logging, time, Optional, Dict, Any, Callable, HomeAssistant, callback, ConfigEntry, CONF_HOST, CONF_PORT, Store, _LOGGER
+
+from .gateway import async_get_gateway
+from .fields import MIYA_HRV_CODEC
+from .protocal import MiyaCommandAnalyzer, DeviceStatus, STATUS_FRAME_TYPES, cmd_calculate, command_fields, state_frame, fields_frame, status_query_frame
+from .tcp_485_lib import DataConverter
 from .config_input import command_set_dict
-from ..const import CONF_DEVICE_ADDR
+from .runtime import RuntimeCounters
+from .breaker import CircuitBreaker
+from ..const import DOMAIN, CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR, STORAGE_VERSION, STORAGE_KEY, STATUS_SAVE_DELAY, RUNTIME_SAVE_DELAY, COMMAND_DEDUP_TTL, CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL, CONF_COMMAND_EXPIRY, DEFAULT_COMMAND_EXPIRY, CONF_POLL_INTERVAL, DEFAULT_POLL_INTERVAL, UNAVAILABLE_MISSED_POLLS, POLL_RETRIES, CONTROL_RETRIES, CONF_BAUD_RATE, DEFAULT_BAUD_RATE, CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL, CONF_LOG_LEVEL, DEFAULT_LOG_LEVEL, RELOAD_KEYS
 
-def get_device_status(hass, entry_id: str) -> Dict[str, Any]:
-    """获取设备状态数据."""
-    try:
-        if entry_id in hass.data.get('miya_hrv', {}):
-            device_data = hass.data['miya_hrv'][entry_id]
-            # 优先使用管理器获取状态
-            if 'manager' in device_data:
-                status = device_data['manager'].get_status()
-            else:
-                # 兼容旧版本
-                status = device_data.get('status', {})
-            _LOGGER.debug(f"获取到设备状态: {status}")
-            return status
-        _LOGGER.warning(f"未找到 entry_id: {entry_id} 的状态数据")
-        return {}
-    except Exception as e:
-        _LOGGER.error(f"获取设备状态失败: {e}")
-        return {}
+# 状态键 -> 决定其取值的字节偏移（含门控字节，如运行模式受电源字节控制）
+PENDING_FIELD_OFFSETS = tuple(
+    (field.key, frozenset(field.offsets + ((field.gate[0],) if field.gate else ())))
+    for field in MIYA_HRV_CODEC.fields if field.decoded
+)
 
-def get_device_instance(hass, entry_id: str):
-    """获取设备实例."""
-    try:
-        if entry_id in hass.data.get('miya_hrv', {}):
-            return hass.data['miya_hrv'][entry_id].get('device')
-        return None
-    except Exception as e:
-        _LOGGER.error(f"获取设备实例失败: {e}")
-        return None
+# 集成的根日志记录器（custom_components.miya_hrv），选项中的日志级别设置在它上面
+_INTEGRATION_LOGGER = logging.getLogger(__name__.rpartition(".helpers")[0])
+# 首次按选项覆盖前的日志级别，所有条目恢复 default 时还原
+_log_level_base: Optional[int] = None
 
-def get_commands(hass, entry_id: str) -> Dict[str, Any]:
-    """获取命令映射，优先使用计算后的命令，否则返回空字典."""
-    if hass and entry_id:
-        try:
-            # 尝试从Home Assistant数据中获取计算后的命令
-            domain_data = hass.data.get('miya_hrv', {})
-            entry_data = domain_data.get(entry_id, {})
-            calculated_commands = entry_data.get('commands', {})
-            
-            if calculated_commands and 'command_fixed' in calculated_commands:
-                # 将计算后的命令映射到标准格式
-                fixed_commands = calculated_commands['command_fixed']
-                
-                # 创建命令映射
-                commands = {}
-                
-                # 映射风扇模式
-                if 'power_off' in fixed_commands:
-                    commands['power_off'] = fixed_commands['power_off']
-                if 'power_auto' in fixed_commands:
-                    commands['power_auto'] = fixed_commands['power_auto']
-                
-                # 映射内循环命令
-                if 'inner_cycle_on' in fixed_commands:
-                    commands['inner_cycle_on'] = fixed_commands['inner_cycle_on']
-                if 'inner_cycle_off' in fixed_commands:
-                    commands['inner_cycle_off'] = fixed_commands['inner_cycle_off']
-                
-                # 映射辅助加热命令
-                if 'auxiliary_heat_on' in fixed_commands:
-                    commands['auxiliary_heat_on'] = fixed_commands['auxiliary_heat_on']
-                if 'auxiliary_heat_off' in fixed_commands:
-                    commands['auxiliary_heat_off'] = fixed_commands['auxiliary_heat_off']
-                
-                # 映射UV杀菌命令
-                if 'uv_sterilization_on' in fixed_commands:
-                    commands['uv_sterilization_on'] = fixed_commands['uv_sterilization_on']
-                if 'uv_sterilization_off' in fixed_commands:
-                    commands['uv_sterilization_off'] = fixed_commands['uv_sterilization_off']
-                
-                # 映射旁通命令
-                if 'bypass_on' in fixed_commands:
-                    commands['bypass_on'] = fixed_commands['bypass_on']
-                if 'bypass_off' in fixed_commands:
-                    commands['bypass_off'] = fixed_commands['bypass_off']
-                
-                # 映射负离子命令
-                if 'negative_ion_on' in fixed_commands:
-                    commands['negative_ion_on'] = fixed_commands['negative_ion_on']
-                if 'negative_ion_off' in fixed_commands:
-                    commands['negative_ion_off'] = fixed_commands['negative_ion_off']
-                
-                # 映射睡眠模式命令
-                if 'sleep_mode_on' in fixed_commands:
-                    commands['sleep_mode_on'] = fixed_commands['sleep_mode_on']
-                if 'sleep_mode_off' in fixed_commands:
-                    commands['sleep_mode_off'] = fixed_commands['sleep_mode_off']
-                
-                # 添加其他命令
-                for key, value in fixed_commands.items():
-                    if key not in commands:
-                        commands[key] = value
-                
-                return commands
-                
-        except Exception as e:
-            _LOGGER.error(f"获取计算后的命令失败: {e}")
-    
-    # 如果没有计算后的命令，返回空字典
-    return {}
 
-async def send_device_command(hass, entry_id: str, command_name: str) -> bool:
-    """发送设备命令."""
-    try:
-        device = get_device_instance(hass, entry_id)
-        commands = get_commands(hass, entry_id)
-        
-        if not device or not commands:
-            _LOGGER.error("设备或命令不可用")
-            return False
-        
-        # 直接使用传入的命令键，不再需要映射
-        command = commands.get(command_name)
-        if command:
-            await device.send_command(command)
-            _LOGGER.info(f"📡 发送命令: {command_name} -> {command}")
-            return True
-        else:
-            _LOGGER.error(f"❌ 未找到命令: {command_name}")
-            _LOGGER.debug(f"📋 可用命令: {list(commands.keys())}")
-            return False
-            
-    except Exception as e:
-        _LOGGER.error(f"❌ 发送命令失败: {e}")
-        return False
+def apply_log_level(hass: HomeAssistant):
+    """按所有已加载条目中最详细的日志级别设置集成日志；均为 default 时还原原有级别."""
+    global _log_level_base
+    levels = [
+        logging.getLevelName(manager.log_level.upper())
+        for manager in hass.data.get(DOMAIN, {}).values()
+        if manager.log_level != DEFAULT_LOG_LEVEL
+    ]
+    if levels:
+        if _log_level_base is None:
+            _log_level_base = _INTEGRATION_LOGGER.level
+        _INTEGRATION_LOGGER.setLevel(min(levels))
+    elif _log_level_base is not None:
+        _INTEGRATION_LOGGER.setLevel(_log_level_base)
+        _log_level_base = None
+
+
+def get_device_manager(hass, entry_id: str) -> Optional["MiyaHRVManager"]:
+    """获取配置条目的设备管理器（协调器）."""
+    return hass.data.get(DOMAIN, {}).get(entry_id)
 
 def get_fan_mode(status: Dict[str, Any]) -> str:
     """从状态数据中获取风扇模式."""
@@ -194,35 +112,94 @@ def generate_entity_id(entry_id: str, entity_type: str, function_id: str = None)
     else:
         return f"miya_{prefix}_{entity_type}"
 
-def generate_device_id(host: str, port: int) -> str:
+def generate_device_id(host: str, port: int, device_addr: str = DEFAULT_DEVICE_ADDR) -> str:
     """生成设备唯一标识符。
     
+    同一网关总线上可挂多台设备，因此标识符包含设备地址。
+    
     Args:
         host: 设备主机地址
         port: 设备端口
+        device_addr: 设备地址(十六进制字符串)
     
     Returns:
         设备唯一标识符
     """
-    return f"{host}:{port}"
+    return f"{host}:{port}:{int(device_addr, 16):02X}"
 
 class MiyaHRVManager:
-    """MIYA HRV 组件管理器."""
+    """MIYA HRV 设备管理器 - 每个配置条目一个，作为实体的数据协调器.
+
+    状态保存在共享缓冲区 status 中，每次变化只通知一次已订阅的监听器，
+    实体在回调中直接从缓冲区读取字段。
+    """
+    
+    __slots__ = ('hass', 'entry_id', 'entry', 'address', 'calculated_commands', 'status', 'status_time', 'gateway',
+                 'device', 'analyzer', 'status_stale', 'command_dedup_ttl', 'suppressed_writes', 'min_publish_interval',
+                 'command_expiry', '_pending', 'keepalive_interval', 'log_level', 'connection',
+                 'available', 'poll_interval', 'baud_rate', '_last_seen', '_last_poll', 'breaker', '_cancel_poll', '_cancel_reply_check', '_cancel_outage',
+                 'runtime', '_command_fields', '_listeners', '_store', '_save_pending')
     
     def __init__(self, hass: HomeAssistant, entry_id: str):
         """初始化管理器."""
         self.hass = hass
         self.entry_id = entry_id
+        self.entry: Optional[ConfigEntry] = None
+        self.address = int(DEFAULT_DEVICE_ADDR, 16)
         self.calculated_commands = None
-        self.device_status = {}
+        # 设备状态共享缓冲区（实体直接读取，不再各自复制）
+        self.status = DeviceStatus()
+        self.gateway = None
         self.device = None
         self.analyzer = None
-        self.entities = {}
+        # 状态变化监听器（实体订阅）
+        self._listeners: Dict[object, Callable[[], None]] = {}
+        # 状态来自存储、尚未被设备实时数据确认
+        self.status_stale = False
+        # 最近一次收到设备状态帧的时间 (time.monotonic)
+        self.status_time = 0.0
+        # 幂等命令抑制: 状态在此时间(秒)内确认过且已满足命令时不再发送
+        self.command_dedup_ttl = COMMAND_DEDUP_TTL
+        self.suppressed_writes = 0
+        # 实体最小发布间隔(秒)，间隔内的状态变化合并为一次写入
+        self.min_publish_interval = DEFAULT_MIN_PUBLISH_INTERVAL
+        # 设备是否在线: 由是否收到该地址的帧判断（不只看网关连接）
+        self.available = True
+        self.poll_interval = DEFAULT_POLL_INTERVAL
+        # 总线波特率，用于估计总线占用
+        self.baud_rate = DEFAULT_BAUD_RATE
+        # 最近一次收到该地址任意帧的时间 (time.monotonic)
+        self._last_seen = 0.0
+        self._last_poll = 0.0
+        # 熔断器: 连续无应答的请求（重发用尽才计一次）达到阈值后停止轮询和命令，只偶尔探测
+        self.breaker = CircuitBreaker(UNAVAILABLE_MISSED_POLLS)
+        self._cancel_poll: Optional[Callable[[], None]] = None
+        self._cancel_reply_check: Optional[Callable[[], None]] = None
+        # 网关断开后的宽限期定时器：期间实体保持可用，命令进入暂存队列
+        self._cancel_outage: Optional[Callable[[], None]] = None
+        # 网关断开期间暂存的命令字段: 字节偏移 -> (值, 暂存时间)，同一字段后写覆盖先写
+        self._pending: Dict[int, tuple] = {}
+        self.command_expiry = DEFAULT_COMMAND_EXPIRY
+        # 网关保活间隔(秒)和集成日志级别（可在运行中修改）
+        self.keepalive_interval = DEFAULT_KEEPALIVE_INTERVAL
+        self.log_level = DEFAULT_LOG_LEVEL
+        # 设置时的连接参数 (host, port, 设备地址)，变化时才需要重新加载条目
+        self.connection: tuple = ()
+        # 命令名 -> 命令写入的 (字节偏移, 值)
+        self._command_fields: Dict[str, tuple] = {}
+        # 运行时长累计（随状态帧增量更新，与状态帧一起落盘）
+        self.runtime = RuntimeCounters()
+        self._store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry_id}")
+        self._save_pending = False
     
     def calculate_commands(self, device_addr: str = "01"):
         """计算设备命令，包含CRC校验."""
         try:
             self.calculated_commands = cmd_calculate(command_set_dict, device_addr)
+            self._command_fields = {
+                name: command_fields(DataConverter.hex_to_tcp(command))
+                for name, command in self.calculated_commands['command_fixed'].items()
+            }
             _LOGGER.info("命令计算完成")
             return self.calculated_commands
         except Exception as e:
@@ -231,116 +208,455 @@ class MiyaHRVManager:
     
     async def setup(self, entry: ConfigEntry):
         """设置组件."""
-        self.hass.data.setdefault('miya_hrv', {})
+        self.hass.data.setdefault(DOMAIN, {})
+        self.entry = entry
         
         # 获取设备地址
-        device_addr = entry.data.get('device_addr', '01')
+        device_addr = entry.data.get(CONF_DEVICE_ADDR, DEFAULT_DEVICE_ADDR)
+        self.address = int(device_addr, 16)
+        self.connection = tuple(entry.data.get(key) for key in RELOAD_KEYS)
+        self.apply_options(entry.options)
         
         # 计算命令
         if self.calculated_commands is None:
             self.calculate_commands(device_addr)
         
-        # 创建设备实例
-        self.device = TCP_485_Device(
-            host=entry.data[CONF_HOST],
-            port=entry.data.get(CONF_PORT, 38)  
-        )
+        # 同一网关上的设备共用一条连接
+        self.gateway = async_get_gateway(self.hass, entry.data[CONF_HOST], entry.data.get(CONF_PORT, 38))
+        self.device = self.gateway.device
         
         # 创建状态分析器
         self.analyzer = MiyaCommandAnalyzer()
         
-        # 存储到 hass.data
-        self.hass.data['miya_hrv'][self.entry_id] = {
-            'device': self.device,
-            'analyzer': self.analyzer,
-            'commands': self.calculated_commands,
-            'status': self.device_status,
-            'entities': self.entities,
-            'manager': self  # 存储管理器引用
-        }
+        # 恢复上次保存的状态帧
+        await self.restore_status()
+        
+        # 存储到 hass.data，平台和服务通过条目ID取得管理器
+        self.hass.data[DOMAIN][self.entry_id] = self
         
         # 启动设备监听
         await self.start_device_monitoring()
+        self.start_polling()
+        apply_log_level(self.hass)
         
         return True
     
+    def apply_options(self, options) -> None:
+        """应用条目选项；运行中修改时直接作用于管理器、网关和客户端，不断开连接."""
+        self.min_publish_interval = options.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL)
+        self.command_expiry = options.get(CONF_COMMAND_EXPIRY, DEFAULT_COMMAND_EXPIRY)
+        self.baud_rate = options.get(CONF_BAUD_RATE, DEFAULT_BAUD_RATE)
+        self.keepalive_interval = options.get(CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL)
+        self.log_level = options.get(CONF_LOG_LEVEL, DEFAULT_LOG_LEVEL)
+        poll_interval = options.get(CONF_POLL_INTERVAL, DEFAULT_POLL_INTERVAL)
+        if poll_interval != self.poll_interval:
+            self.poll_interval = poll_interval
+            if self._cancel_poll is not None:
+                # 只替换定时器，不影响正在等待的应答
+                self._cancel_poll()
+                self._cancel_poll = async_track_time_interval(
+                    self.hass, self._async_poll, timedelta(seconds=self.poll_interval)
+                )
+        if self.gateway is not None:
+            self.gateway.update_settings()
+    
+    async def async_update_options(self, entry: ConfigEntry) -> None:
+        """选项变更：在运行中生效."""
+        self.apply_options(entry.options)
+        apply_log_level(self.hass)
+        _LOGGER.info(f"⚙️ 设备 {self.address:02X} 选项已更新: {dict(entry.options)}")
+    
     async def start_device_monitoring(self):
-        """启动设备监听和状态更新."""
-        async def connect_and_listen():
-            """连接设备并持续监听数据."""
-            try:
-                # 连接设备
-                if await self.device.connect():
-                    _LOGGER.info(f"✅ 成功连接到设备 {self.device.host}:{self.device.port}")
-                    
-                    # 发送状态查询命令
-                    if self.calculated_commands and 'command_fixed' in self.calculated_commands:
-                        query_cmd = self.calculated_commands['command_fixed'].get('设备状态查询')
-                        if query_cmd:
-                            await self.device.send_command(query_cmd)
-                            _LOGGER.info(f"📡 发送状态查询命令: {query_cmd}")
-                    
-                    # 持续监听数据
-                    async for data in self.device.listen_for_data():
-                        try:
-                            # 解析状态数据
-                            status_data = self.analyzer.get_status_data(data)
-                            
-                            # 更新状态_更新到hass.data中
-                            self.device_status.update(status_data)
-                            
-                            _LOGGER.info(f"状态已更新: {status_data}")
-                            
-                            # 通知所有相关实体更新状态
-                            await self.notify_entities_status_update(status_data)
-                            
-                        except Exception as e:
-                            _LOGGER.error(f"解析数据失败: {e}")
-                            
-                else:
-                    _LOGGER.error(f"无法连接到设备 {self.device.host}:{self.device.port}")
-                    
-            except Exception as e:
-                _LOGGER.error(f"设备监听任务出错: {e}")
+        """挂接到网关连接，由网关负责连接、监听和按地址分发."""
+        await self.gateway.attach(self)
+    
+    async def send_command(self, command_name: str, force: bool = False) -> bool:
+        """发送固定指令.
         
-        # 启动监听任务
-        self.hass.async_create_task(connect_and_listen())
+        设备最近确认的状态已满足命令要写入的字段时跳过发送（force=True 时总是发送）。
+        """
+        commands = self.calculated_commands.get('command_fixed', {}) if self.calculated_commands else {}
+        command = commands.get(command_name)
+        if not command:
+            _LOGGER.error(f"❌ 未找到命令: {command_name}")
+            _LOGGER.debug(f"📋 可用命令: {list(commands.keys())}")
+            return False
+        if not force and self.command_is_redundant(command_name):
+            _LOGGER.debug(f"⏭️ 设备状态已满足，跳过命令: {command_name}")
+            return True
+        return await self._write(DataConverter.hex_to_tcp(command), f"发送命令: {command_name}")
     
-    async def notify_entities_status_update(self, status_data: dict):
-        """通知所有实体状态更新."""
+    async def send_state(self,
+                         power: Optional[bool] = None,
+                         mode: Optional[str] = None,
+                         fan_level: Optional[int] = None,
+                         force: bool = False) -> bool:
+        """把电源、运行模式、风速的目标组合编码为一帧控制帧发送（一次总线写入）.
+        
+        未指定的字段保持不变；设备最近确认的状态已满足时跳过发送（force=True 时总是发送）。
+        """
+        frame = state_frame(self.address, power=power, mode=mode, fan_level=fan_level)
+        if not force and self.fields_are_satisfied(command_fields(frame)):
+            _LOGGER.debug(f"⏭️ 设备状态已满足，跳过写入: power={power} mode={mode} fan_level={fan_level}")
+            return True
+        return await self._write(frame, f"写入状态: power={power} mode={mode} fan_level={fan_level}")
+    
+    async def send_values(self, force: bool = False, **values: str) -> bool:
+        """按字段表把 {状态键: 含义}（如 bypass='on'）编码为一帧控制帧发送.
+        
+        未指定的字段保持不变；设备最近确认的状态已满足时跳过发送（force=True 时总是发送）。
+        """
+        frame = fields_frame(self.address, MIYA_HRV_CODEC.encode(**values))
+        if not force and self.fields_are_satisfied(command_fields(frame)):
+            _LOGGER.debug(f"⏭️ 设备状态已满足，跳过写入: {values}")
+            return True
+        return await self._write(frame, f"写入字段: {values}")
+    
+    async def _write(self, frame: bytes, description: str) -> bool:
+        """写入一帧控制帧；网关断开或写入失败时按字段暂存，重连后合并补发.
+        
+        设备的熔断器已断开时立即报错，不再写入总线。
+        """
+        if not self.breaker.closed:
+            raise HomeAssistantError(f"设备 {self.address:02X} 无响应（熔断中），未发送{description}")
+        fields = command_fields(frame)
+        connected = self.gateway.connected
+        if connected and await self._request(frame, CONTROL_RETRIES):
+            # 已直接写入的字段不再补发旧值
+            for offset, _ in fields:
+                self._pending.pop(offset, None)
+            _LOGGER.info(f"📡 {description} -> {DataConverter.tcp_to_hex(frame)}")
+            return True
+        now = time.monotonic()
+        for offset, value in fields:
+            self._pending[offset] = (value, now)
+        reason = "写入失败" if connected else "网关未连接"
+        _LOGGER.warning(f"⏸️ {reason}，已暂存 {description}（共 {len(self._pending)} 个字段待补发）")
+        # 实体叠加暂存值乐观显示
+        self.async_update_listeners()
+        return True
+    
+    def pending_status(self) -> Dict[str, Any]:
+        """未过期的暂存命令字段按状态键解析的结果，实体叠加在设备状态之上乐观显示；无暂存时为空."""
+        if not self._pending:
+            return {}
+        now = time.monotonic()
+        pending = {offset: value for offset, (value, queued) in self._pending.items()
+                   if now - queued <= self.command_expiry}
+        if not pending:
+            return {}
+        frame = bytearray(self.status.frame) if self.status.valid else bytearray(20)
+        for offset, value in pending.items():
+            frame[offset] = value
+        record = MIYA_HRV_CODEC.decode(frame)
+        return {key: record[key] for key, offsets in PENDING_FIELD_OFFSETS
+                if key in record and not offsets.isdisjoint(pending)}
+    
+    async def flush_pending(self) -> bool:
+        """把暂存的命令字段合并为一帧补发，丢弃超过有效期的字段；返回是否已无待补发字段."""
+        if not self._pending:
+            return True
+        now = time.monotonic()
+        fields = {offset: value for offset, (value, queued) in self._pending.items()
+                  if now - queued <= self.command_expiry}
+        expired = len(self._pending) - len(fields)
+        if expired:
+            _LOGGER.warning(f"⌛ 丢弃 {expired} 个超过 {self.command_expiry}s 有效期的暂存命令字段")
+        if not fields:
+            self._pending.clear()
+            # 撤销实体上过期的乐观显示
+            self.async_update_listeners()
+            return True
+        frame = fields_frame(self.address, fields)
+        if not await self._request(frame, CONTROL_RETRIES):
+            return False
+        # 只清除已补发的值（发送期间被新命令覆盖的字段保留）
+        for offset, value in fields.items():
+            if self._pending.get(offset, (None,))[0] == value:
+                del self._pending[offset]
+        for offset in [offset for offset, (_, queued) in self._pending.items() if now - queued > self.command_expiry]:
+            del self._pending[offset]
+        _LOGGER.info(f"📡 补发暂存命令 {len(fields)} 个字段 -> {DataConverter.tcp_to_hex(frame)}")
+        return True
+    
+    async def on_connected(self):
+        """网关连接建立（或恢复）后：补发暂存命令并查询状态."""
+        self._cancel_outage_timer()
+        await self.flush_pending()
+        if self.breaker.closed:
+            self._last_poll = time.monotonic()
+            await self.query_status()
+    
+    @callback
+    def on_disconnected(self):
+        """网关连接断开：暂存命令有效期内实体保持可用（命令进入暂存队列，重连后补发），
+        超过有效期仍未恢复才不可用；有效期为0时立即不可用."""
+        self._cancel_reply()
+        self._pause_runtime()
+        if not self.available or self._cancel_outage is not None:
+            return
+        if self.command_expiry <= 0:
+            self.set_available(False, "网关连接断开")
+            return
+        _LOGGER.warning(f"⚠️ 网关连接断开，设备 {self.address:02X} 的命令暂存 {self.command_expiry}s 等待重连")
+        self._cancel_outage = async_call_later(self.hass, self.command_expiry, self._outage_expired)
+    
+    @callback
+    def _outage_expired(self, _now) -> None:
+        self._cancel_outage = None
+        if not self.gateway.connected:
+            self.set_available(False, f"网关连接断开超过 {self.command_expiry}s")
+    
+    def _cancel_outage_timer(self):
+        if self._cancel_outage is not None:
+            self._cancel_outage()
+            self._cancel_outage = None
+    
+    @callback
+    def set_available(self, available: bool, reason: str = ""):
+        """切换设备在线状态，本设备的所有实体在一次通知中同时更新."""
+        if self.available == available:
+            return
+        self.available = available
+        if available:
+            _LOGGER.info(f"✅ 设备 {self.address:02X} 恢复在线")
+        else:
+            _LOGGER.warning(f"⚠️ 设备 {self.address:02X} 离线: {reason}")
+            self._pause_runtime()
+        self.async_update_listeners()
+
+    def _pause_runtime(self):
+        """结算到现在并停止计时：离线期间设备状态未知，不按最后一帧的状态累计运行时长."""
+        if self.runtime.pause(time.monotonic()):
+            self._schedule_save(RUNTIME_SAVE_DELAY)
+
+    def start_polling(self):
+        """按轮询间隔定时查询设备状态."""
+        self.stop_polling()
+        self._cancel_poll = async_track_time_interval(
+            self.hass, self._async_poll, timedelta(seconds=self.poll_interval)
+        )
+    
+    def stop_polling(self):
+        """停止轮询及未到期的应答检查."""
+        if self._cancel_poll is not None:
+            self._cancel_poll()
+            self._cancel_poll = None
+        self._cancel_reply()
+    
+    async def _async_poll(self, _now=None):
+        """定时查询一次状态（不短于网关按往返时延和总线预算得出的最小轮询间隔）."""
+        if not self.gateway.connected or self._cancel_reply_check is not None:
+            return
+        now = time.monotonic()
+        if now - self._last_poll < self.gateway.min_poll_interval:
+            return
+        if self.gateway.bus.over_budget(now):
+            # 总线利用率已达目标，推迟到下一次轮询（用户命令不受限制）
+            self.gateway.bus.deferred_polls += 1
+            _LOGGER.debug(f"⏳ 总线利用率已达目标，推迟设备 {self.address:02X} 的轮询")
+            return
+        if not self.breaker.allow_poll(now):
+            return
+        self._last_poll = now
+        if self.breaker.closed:
+            await self.query_status()
+            return
+        # 熔断半开：只发一次探测查询，不重发
+        _LOGGER.debug(f"🔍 探测离线设备 {self.address:02X}")
+        if not await self.query_status(retries=0):
+            self.breaker.record_failure(now)
+    
+    async def _request(self, frame: bytes, retries: int, retransmit: bool = False) -> bool:
+        """发送一帧需要应答的请求，在网关的应答超时 RTO 内等待本设备的帧."""
+        sent = time.monotonic()
+        self.gateway.expect_reply(self.address, retransmit)
+        if not await self.device.send_bytes(frame):
+            self.gateway.cancel_reply(self.address)
+            return False
+        self.gateway.bus.record(len(frame), address=self.address)
+        self._cancel_reply()
+        self._cancel_reply_check = async_call_later(
+            self.hass, self.gateway.rtt.rto, partial(self._check_reply, frame, sent, retries)
+        )
+        return True
+    
+    def _cancel_reply(self):
+        if self._cancel_reply_check is not None:
+            self._cancel_reply_check()
+            self._cancel_reply_check = None
+    
+    @callback
+    def _check_reply(self, frame: bytes, sent: float, retries: int, _now) -> None:
+        """应答超时：RTO 退避后重发；连续无应答达到阈值即熔断，设备判定离线."""
+        self._cancel_reply_check = None
+        if self._last_seen >= sent:
+            return
+        self.gateway.reply_timeout(self.address)
+        breaker = self.breaker
+        if breaker.closed and retries > 0 and self.gateway.connected:
+            _LOGGER.debug(f"🔁 设备 {self.address:02X} 应答超时，{self.gateway.rtt.rto:.2f}s 后重发")
+            self._cancel_reply_check = async_call_later(
+                self.hass, self.gateway.rtt.rto, partial(self._retransmit, frame, retries - 1)
+            )
+            return
+        # 重发用尽仍无应答才记一次失败，一次请求及其重发只计一次
+        if breaker.record_failure(time.monotonic()):
+            self.set_available(False, f"连续 {breaker.failures} 次请求无应答，{breaker.probe_delay:.0f}s 后探测")
+        elif not breaker.closed:
+            _LOGGER.debug(f"🔍 设备 {self.address:02X} 探测无应答，{breaker.probe_delay:.0f}s 后再探测")
+    
+    @callback
+    def _retransmit(self, frame: bytes, retries: int, _now) -> None:
+        self._cancel_reply_check = None
+        if self.gateway.connected:
+            # 重发任务归属配置条目，卸载时由 HA 取消
+            self.entry.async_create_background_task(
+                self.hass, self._request(frame, retries, retransmit=True), f"miya_hrv retransmit {self.address:02X}"
+            )
+    
+    def command_is_redundant(self, command_name: str) -> bool:
+        """命令要写入的字段与最近确认的状态一致时返回True，并计入抑制次数."""
+        return self.fields_are_satisfied(self._command_fields.get(command_name))
+    
+    def fields_are_satisfied(self, fields) -> bool:
+        """要写入的 (字节偏移, 值) 与最近确认的状态一致时返回True，并计入抑制次数."""
+        if not fields or not self.status.valid or self.status_stale:
+            return False
+        if time.monotonic() - self.status_time > self.command_dedup_ttl:
+            return False
+        frame = self.status.frame
+        for offset, value in fields:
+            if frame[offset] != value:
+                return False
+        self.suppressed_writes += 1
+        return True
+    
+    async def query_status(self, retries: int = POLL_RETRIES) -> bool:
+        """发送本设备的状态查询，超时未应答时按 RTO 退避重发."""
+        frame = status_query_frame(self.address)
+        if not await self._request(frame, retries):
+            return False
+        _LOGGER.debug(f"📡 发送状态查询: {DataConverter.tcp_to_hex(frame)}")
+        return True
+    
+    async def restore_status(self):
+        """从存储中读取上次的原始状态帧写入状态缓冲区，标记为过期状态."""
         try:
-            # 直接调用实体的 update_status 方法
-            for entity_name, entity in self.entities.items():
-                try:
-                    if hasattr(entity, 'update_status'):
-                        # 检查实体是否已经完全初始化
-                        if hasattr(entity, 'hass') and entity.hass is not None:
-                            entity.update_status(status_data)
-                            _LOGGER.debug(f"📡 直接更新实体: {entity_name}")
-                        else:
-                            _LOGGER.debug(f"📡 实体 {entity_name} 尚未完全初始化，跳过更新")
-                except Exception as e:
-                    _LOGGER.error(f"❌ 更新实体 {entity_name} 失败: {e}")
-                    
+            stored = await self._store.async_load()
+            if stored:
+                self.runtime.restore(stored.get('runtime'))
+            frame = stored.get('last_status_frame') if stored else None
+            if not frame:
+                return
+            data = DataConverter.hex_to_tcp(frame)
+            if self.analyzer._determine_command_type(data) in STATUS_FRAME_TYPES:
+                self.status.update(data)
+                self.status_stale = True
+                _LOGGER.info(f"已恢复上次保存的设备状态: {self.status.as_dict()}")
         except Exception as e:
-            _LOGGER.error(f"❌ 通知实体状态更新失败: {e}")
+            _LOGGER.error(f"恢复设备状态失败: {e}")
     
-    def get_status(self) -> dict:
-        """获取设备状态."""
-        return self.device_status.copy()
+    def _data_to_save(self) -> dict:
+        """生成需要持久化的数据（只在落盘时才转换为十六进制）."""
+        self._save_pending = False
+        self.runtime.settle(time.monotonic())
+        frame = DataConverter.tcp_to_hex(bytes(self.status.frame)) if self.status.valid else None
+        return {'last_status_frame': frame, 'runtime': self.runtime.as_dict()}
+    
+    def _schedule_save(self, delay: float):
+        """防抖写入存储；已有待写入时不再推迟（运行时长随每帧累计，避免一直被重新计时）."""
+        if self._save_pending and delay >= RUNTIME_SAVE_DELAY:
+            return
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, delay)
+    
+    async def handle_frame(self, data):
+        """处理一帧设备数据（实时监听和抓包回放共用，接受bytes或十六进制字符串）."""
+        try:
+            if isinstance(data, str):
+                data = DataConverter.hex_to_tcp(data)
+            
+            # 收到本地址的任意帧即说明设备在线
+            now = time.monotonic()
+            self._last_seen = now
+            self.breaker.record_success()
+            revived = not self.available
+            if revived:
+                self.available = True
+                _LOGGER.info(f"✅ 设备 {self.address:02X} 恢复在线")
+            
+            if self.analyzer._determine_command_type(data) not in STATUS_FRAME_TYPES:
+                _LOGGER.debug(f"忽略非状态帧: {DataConverter.tcp_to_hex(data)}")
+                if revived:
+                    self.async_update_listeners()
+                return
+            
+            # 写入共享状态缓冲区，累计上一状态的运行时长
+            changed = self.status.update(data)
+            self.status_time = now
+            if self.runtime.observe(data, now) and not changed:
+                self._schedule_save(RUNTIME_SAVE_DELAY)
+            confirmed = self.status_stale or revived
+            self.status_stale = False
+            if not changed:
+                if confirmed:
+                    # 恢复的状态被设备确认或设备重新上线，刷新实体的 assumed_state/available
+                    self.async_update_listeners()
+                return
+            
+            # 状态变化时防抖写入存储
+            self._schedule_save(STATUS_SAVE_DELAY)
+            
+            if _LOGGER.isEnabledFor(logging.INFO):
+                _LOGGER.info(f"状态已更新: {self.status.as_dict()}")
+            
+            # 每次变化只通知一次
+            self.async_update_listeners()
+            
+        except Exception as e:
+            _LOGGER.error(f"解析数据失败: {e}")
+    
+    @callback
+    def async_add_listener(self, update_callback: Callable[[], None]) -> Callable[[], None]:
+        """订阅状态变化，返回取消订阅函数."""
+        token = object()
+        self._listeners[token] = update_callback
+        
+        @callback
+        def remove_listener() -> None:
+            self._listeners.pop(token, None)
+        
+        return remove_listener
+    
+    @callback
+    def async_update_listeners(self) -> None:
+        """通知所有监听器状态已变化."""
+        for update_callback in list(self._listeners.values()):
+            try:
+                update_callback()
+            except Exception as e:
+                _LOGGER.error(f"❌ 状态监听器执行失败: {e}")
     
-    def register_entity(self, entity_id: str, entity):
-        """注册实体."""
-        self.entities[entity_id] = entity
+    def reset_runtime(self, key: str):
+        """清零一个运行时长累计项（如更换滤网后清零滤网时长）."""
+        self.runtime.reset(key, time.monotonic())
+        self._schedule_save(STATUS_SAVE_DELAY)
+        self.async_update_listeners()
     
-    def unregister_entity(self, entity_id: str):
-        """注销实体."""
-        if entity_id in self.entities:
-            del self.entities[entity_id]
+    async def async_remove_store(self):
+        """删除持久化的状态数据（配置条目被删除时调用）."""
+        await self._store.async_remove()
     
     async def cleanup(self):
         """清理资源."""
-        if self.device:
-            await self.device.disconnect()
-        self.entities.clear()
-        self.device_status.clear() 
\ No newline at end of file
+        # 卸载前立即落盘，避免丢失防抖期内的最新状态和运行时长
+        await self._store.async_save(self._data_to_save())
+        self.stop_polling()
+        self._cancel_outage_timer()
+        self.runtime.pause(time.monotonic())
+        if self.gateway:
+            await self.gateway.detach(self)
+        self._listeners.clear()
+        self.status.clear()
+        apply_log_level(self.hass)
@@ -0,0 +1,226 @@
+'''
+事件循环占用分析
+在指定时间内临时包装集成自身的热点函数（接收分帧、分发、状态解析、通知实体、发送），
+统计每台设备/每个网关在事件循环上消耗的时间，或用 cProfile 采集调用栈。
+
+协程只统计其实际在事件循环上运行的片段，await 挂起等待的时间不计入。
+
+'''
+import cProfile
+import functools
+import inspect
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .tcp_485_lib import Tcp485Client, FrameDecoder
+from .gateway import MiyaGateway, gateway_key
+from .ha_utils import MiyaHRVManager
+
+PROFILE_MODES = ("timing", "cprofile")
+
+# 被包装的函数: (类, 方法名, 统计项, 归属)
+# 归属: client/gateway 按网关统计，manager 按设备统计，framing 为全部连接合计
+PROFILE_TARGETS: List[Tuple[type, str, str, str]] = [
+    (FrameDecoder, "feed", "framing", "framing"),
+    (Tcp485Client, "_dispatch_frame", "receive", "client"),
+    (Tcp485Client, "send_many", "write", "client"),
+    (MiyaGateway, "dispatch", "route", "gateway"),
+    (MiyaHRVManager, "handle_frame", "decode", "manager"),
+    (MiyaHRVManager, "async_update_listeners", "notify", "manager"),
+    (MiyaHRVManager, "send_command", "command", "manager"),
+    (MiyaHRVManager, "send_state", "command", "manager"),
+    (MiyaHRVManager, "send_values", "command", "manager"),
+    (MiyaHRVManager, "query_status", "command", "manager"),
+    # 写入/暂存嵌套在上面的命令中，单独列出不计入设备占用；补发在重连时独立运行
+    (MiyaHRVManager, "_write", "command_write", "manager"),
+    (MiyaHRVManager, "flush_pending", "flush", "manager"),
+]
+
+
+class _Stat:
+    """一个统计项: 调用次数、累计和最长单次运行时间（秒）"""
+
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'calls': self.calls,
+            'total_ms': round(self.total * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class LoopProfiler:
+    """集成热点函数的事件循环占用统计（同一时间只允许一个实例运行）"""
+
+    active: Optional["LoopProfiler"] = None
+
+    def __init__(self, mode: str = "timing"):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知的分析模式: {mode}")
+        self.mode = mode
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        # (归属标签, 统计项) -> 统计
+        self.stats: Dict[Tuple[str, str], _Stat] = {}
+        # 未嵌套在其它被包装函数中的运行时间，即集成占用事件循环的总时间
+        self.loop_time = 0.0
+        self._depth = 0
+        self._originals: List[Tuple[type, str, Callable]] = []
+        self._started = 0.0
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _label(owner: str, obj) -> str:
+        """统计归属: 网关为 host:port，设备为 host:port#地址"""
+        if owner == "client":
+            return gateway_key(obj.host, obj.port)
+        if owner == "gateway":
+            return gateway_key(obj.host, obj.port)
+        if owner == "manager":
+            gateway = obj.gateway
+            prefix = gateway_key(gateway.host, gateway.port) if gateway else obj.entry_id
+            return f"{prefix}#{obj.address:02X}"
+        return "*"
+
+    def _enter(self) -> float:
+        self._depth += 1
+        return time.perf_counter()
+
+    def _exit(self, started: float, stat: _Stat) -> float:
+        duration = time.perf_counter() - started
+        self._depth -= 1
+        if self._depth == 0:
+            self.loop_time += duration
+        stat.total += duration
+        return duration
+
+    def _stat(self, owner: str, name: str, obj) -> _Stat:
+        key = (self._label(owner, obj), name)
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = _Stat()
+        return stat
+
+    def _wrap(self, function: Callable, name: str, owner: str) -> Callable:
+        profiler = self
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed_coroutine(obj, *args, **kwargs):
+                stat = profiler._stat(owner, name, obj)
+                stat.calls += 1
+                longest = 0.0
+                coro = function(obj, *args, **kwargs)
+                value, error = None, None
+                try:
+                    while True:
+                        # 只计协程在事件循环上实际运行的片段
+                        started = profiler._enter()
+                        try:
+                            if error is None:
+                                future = coro.send(value)
+                            else:
+                                future = coro.throw(error)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            longest = max(longest, profiler._exit(started, stat))
+                        try:
+                            value, error = await _Yield(future), None
+                        except BaseException as exc:
+                            value, error = None, exc
+                finally:
+                    stat.max = max(stat.max, longest)
+                    coro.close()
+            return timed_coroutine
+
+        @functools.wraps(function)
+        def timed_call(obj, *args, **kwargs):
+            stat = profiler._stat(owner, name, obj)
+            stat.calls += 1
+            started = profiler._enter()
+            try:
+                return function(obj, *args, **kwargs)
+            finally:
+                stat.max = max(stat.max, profiler._exit(started, stat))
+        return timed_call
+
+    def start(self):
+        """包装热点函数，开始统计
+
+        cProfile 在整个分析期间只启用一次（调用栈包含同期事件循环上的其它代码），
+        不在热点函数内逐次启用：其它分析器（如 HA 的 profiler 集成）已在运行时启用会抛出异常，
+        在这里拒绝本次分析，不影响收发路径。
+        """
+        if LoopProfiler.active is not None:
+            raise RuntimeError("已有分析正在运行")
+        if self.profile is not None:
+            try:
+                self.profile.enable()
+            except ValueError as e:
+                raise RuntimeError(f"无法启用 cProfile（已有其它分析器在运行）: {e}") from e
+        LoopProfiler.active = self
+        for cls, attr, name, owner in PROFILE_TARGETS:
+            original = cls.__dict__[attr]
+            self._originals.append((cls, attr, original))
+            setattr(cls, attr, self._wrap(original, name, owner))
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """恢复原函数，结束统计"""
+        for cls, attr, original in reversed(self._originals):
+            setattr(cls, attr, original)
+        self._originals.clear()
+        self.elapsed = time.perf_counter() - self._started
+        if self.profile is not None:
+            self.profile.disable()
+        if LoopProfiler.active is self:
+            LoopProfiler.active = None
+
+    def summary(self) -> Dict[str, Any]:
+        """按网关/设备汇总的事件循环占用"""
+        groups: Dict[str, Dict[str, Any]] = {}
+        for (label, name), stat in sorted(self.stats.items()):
+            group = "devices" if "#" in label else "gateways" if label != "*" else "all"
+            groups.setdefault(group, {}).setdefault(label, {})[name] = stat.as_dict()
+        for label, functions in groups.get("devices", {}).items():
+            # 设备占用 = 解析（含通知实体）+ 命令 + 补发
+            loop_ms = sum(functions.get(name, {}).get('total_ms', 0) for name in ("decode", "command", "flush"))
+            functions['loop_ms'] = round(loop_ms, 3)
+        elapsed = self.elapsed or (time.perf_counter() - self._started)
+        return {
+            'mode': self.mode,
+            'duration_s': round(elapsed, 3),
+            'loop_ms': round(self.loop_time * 1000, 3),
+            'loop_share': round(self.loop_time / elapsed, 6) if elapsed else 0.0,
+            **groups,
+        }
+
+    def write(self, path: str) -> str:
+        """写入统计文件（阻塞IO，在执行器中调用）: cProfile 为 .prof，否则为 .json"""
+        if self.profile is not None:
+            path = f"{path}.prof"
+            self.profile.dump_stats(path)
+        else:
+            path = f"{path}.json"
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(self.summary(), file, ensure_ascii=False, indent=2)
+        return path
+
+
+class _Yield:
+    """把被包装协程挂起时产出的 future 原样交给事件循环"""
+
+    __slots__ = ('future',)
+
+    def __init__(self, future):
+        self.future = future
+
+    def __await__(self):
+        return (yield self.future)
@@ -3,7 +3,9 @@
 封装设备协议细节，生成和解析原始命令数据。
 
 '''
-from typing import Dict
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
 
 try:
     from .config_input import command_set_dict as input_dict
@@ -16,11 +18,41 @@ except ImportError:
 
 try:
     from .tcp_485_lib import hex_to_bytes,bytes_to_hex,DataConverter
+    from .fields import MIYA_HRV_CODEC
 except ImportError:
     from tcp_485_lib import hex_to_bytes,bytes_to_hex,DataConverter
+    from fields import MIYA_HRV_CODEC
 
 device_addr="01"
 
+# 帧长表: 包头字节 -> 完整帧长度（供帧解析层切分TCP字节流）
+FRAME_LENGTHS = {
+    0xC7: 20,  # 状态查询/控制帧
+    0xAA: 7,   # 设备地址响应
+}
+
+# 携带完整设备状态的帧类型（查询应答和控制应答）
+STATUS_FRAME_TYPES = ("设备状态查询指令", "设备状态设置(控制)指令")
+
+# 状态解析缓存容量（进程内所有设备共用，按最近使用淘汰）
+STATUS_DECODE_CACHE_SIZE = 256
+
+# 状态帧字节偏移（与字段表 MIYA_HRV_FIELDS 一致，供抓包分析按列输出）
+STATUS_BYTE_OFFSETS = {
+    'device_address': 2,
+    'function_type': 3,
+    'power_status': 5,
+    'in_speed': 6,
+    'out_speed': 7,
+    'negative_ion': 8,
+    'sleep_mode': 9,
+    'auto_manual': 10,
+    'UV_sterilization': 11,
+    'inner_cycle': 12,
+    'auxiliary_heat': 13,
+    'bypass': 14,
+}
+
 # 生成原始命令数据
 
 def cmd_calculate(input_dict, device_addr):
@@ -57,6 +89,117 @@ def cmd_calculate(input_dict, device_addr):
     
     return out_dict
 
+def build_frame(template: str, address: int) -> bytes:
+    """
+    按十六进制模板生成指定地址的20字节帧（填入地址并计算CRC），地址0为广播
+    """
+    frame = bytearray(hex_to_bytes(template)[0:18])
+    frame[2] = address
+    frame[4] = address
+    crc = crc16_ccitt(frame[0:18])
+    frame.append((crc >> 8) & 0xFF)
+    frame.append(crc & 0xFF)
+    return bytes(frame)
+
+
+def control_frame(command_name: str, address: int) -> bytes:
+    """
+    生成指定地址的固定指令帧（命令名见 command_set_dict["command_fixed"]）
+    """
+    return build_frame(input_dict["command_fixed"][command_name], address)
+
+
+def status_query_frame(address: int) -> bytes:
+    """
+    生成指定地址的状态查询帧（含CRC），供地址扫描等批量查询使用
+    """
+    return control_frame("设备状态查询", address)
+
+
+def address_query_frame() -> bytes:
+    """
+    生成广播地址查询帧，模板中的 XX 填 00
+    """
+    template = input_dict["command_broadcast"]["broadcast"]
+    return hex_to_bytes(template.replace("XX", "00"))
+
+
+def command_fields(frame: bytes) -> tuple:
+    """
+    控制帧要写入的状态字段: ((字节偏移, 值), ...)，值为00的字段表示保持不变
+    查询帧返回空元组
+    """
+    if len(frame) < 16 or frame[3] != 0x02:
+        return ()
+    return tuple((offset, frame[offset]) for offset in range(5, 16) if frame[offset])
+
+
+# 风速档位: 进风/排风字节写入的值即档位号（与字段表 fan_mode 一致）
+FAN_LEVELS = (1, 2, 3, 4, 5)
+
+
+def state_frame(address: int,
+                power: Optional[bool] = None,
+                mode: Optional[str] = None,
+                fan_level: Optional[int] = None) -> bytes:
+    """
+    把目标状态编码为一帧控制帧: 电源(第5字节)、运行模式(第10字节)、风速(第6/7字节)，
+    未指定的字段写00保持不变，任意组合一次总线写入即可到达
+
+    Args:
+        address: 设备地址，0为广播
+        power: True开机 / False关机
+        mode: 'auto' 或 'manual'
+        fan_level: 风速档位 1~5
+    """
+    values = {}
+    if power is not None:
+        values['power'] = 'on' if power else 'off'
+    if mode is not None:
+        values['mode'] = mode
+    if fan_level is not None:
+        if fan_level not in FAN_LEVELS:
+            raise ValueError(f"无效的风速档位: {fan_level}")
+        values['fan_mode'] = f"level_{fan_level}"
+    return fields_frame(address, MIYA_HRV_CODEC.encode(**values))
+
+
+def fields_frame(address: int, fields: Dict[int, int]) -> bytes:
+    """
+    把 {字节偏移: 值} 编码为一帧控制帧（含CRC），未给出的字段写00保持不变
+    """
+    frame = bytearray(18)
+    frame[0] = 0xC7
+    frame[1] = 0x12
+    frame[3] = 0x02
+    for offset, value in fields.items():
+        frame[offset] = value
+    return build_frame(bytes_to_hex(bytes(frame)), address)
+
+
+def status_collapse_key(data: bytes):
+    """
+    接收队列合并键：状态查询应答按设备地址合并（新状态覆盖未处理的旧状态），
+    控制应答和地址响应不合并，保证应答不丢失
+    """
+    if len(data) == 20 and data[0] == 0xC7 and data[3] == 0x01:
+        return data[2]
+    return None
+
+
+def parse_address_response(data: bytes):
+    """
+    从设备应答中取出设备地址：地址响应帧(AA)取第3字节，状态帧(C7)取第2字节，
+    无法识别时返回None
+    """
+    if len(data) == 7 and data[0] == 0xAA:
+        return data[3]
+    if len(data) == 20 and data[0] == 0xC7:
+        crc = crc16_ccitt(data[0:18])
+        if data[18] == (crc >> 8) & 0xFF and data[19] == crc & 0xFF:
+            return data[2]
+    return None
+
 # 解析原始命令数据
 
 class MiyaCommandAnalyzer:
@@ -66,41 +209,25 @@ class MiyaCommandAnalyzer:
 
         self.status_meanings = status_meanings_dict
         
-    def get_status_data(self, hex_string: str) -> Dict:
+    def get_status_data(self, hex_string) -> Dict:
         """
-        为hass提供状态数据
+        为hass提供状态数据（接受十六进制字符串或原始bytes）
         """
-        data = DataConverter.hex_to_tcp(hex_string)
-        data_len = len(data)
+        if isinstance(hex_string, (bytes, bytearray)):
+            data = hex_string
+        else:
+            data = DataConverter.hex_to_tcp(hex_string)
         # 判断数据的类型
         command_type = self._determine_command_type(data)
-        if command_type == "设备状态查询指令":
-            
-            info_table = self._generate_hass_status_table(data)
-            fan_speed_status = self._fan_speed_status(data)
-            if fan_speed_status:  # 检查是否为None
-                info_table.update(fan_speed_status)
-            mode_status = self._mode_status(data)
-            if mode_status:  # 检查是否为None
-                info_table.update(mode_status)
-            return info_table
-                  
+        if command_type in STATUS_FRAME_TYPES:
+            # 查询应答和控制应答都携带完整状态，由字段表生成的解码函数解析
+            return MIYA_HRV_CODEC.decode(data)
         elif command_type == "设备地址响应":
             # 解析出设备地址
             pass
-        elif command_type == "设备状态设置(控制)指令":
-            # 控制指令的响应，通常包含当前状态
-            info_table = self._generate_hass_status_table(data)
-            fan_speed_status = self._fan_speed_status(data)
-            if fan_speed_status:  # 检查是否为None
-                info_table.update(fan_speed_status)
-            mode_status = self._mode_status(data)
-            if mode_status:  # 检查是否为None
-                info_table.update(mode_status)
-            return info_table
         else:
             return {'error': '未知指令类型'}
-   
+
         return data
  
     def _determine_command_type(self, data: bytes) -> str:
@@ -128,33 +255,6 @@ class MiyaCommandAnalyzer:
         else:
             return f"未知长度指令({len(data)}字节)"
     
-    def _generate_hass_status_table(self, data: bytes) -> Dict:
-        """
-        为hass生成状态表
-        """
-        return {
-            # 'header': f"0x{data[0]:02X} ({self.status_meanings['header'].get(data[0], 'Unknown Header')})",
-            # 'data_length': f"0x{data[1]:02X} ({self.status_meanings['data_length'].get(data[1], f'{data[1]} bytes')})",
-            # 'device_address': f"0x{data[2]:02X} (Device {data[2]})",
-            # 'function_type': f"0x{data[3]:02X} ({self.status_meanings['function_type'].get(data[3], 'Unknown Function')})",
-            # 'device_address(repeat)': f"0x{data[4]:02X} (Device {data[4]})",
-            # 'power_status': self.status_meanings['power_status'].get(data[5], 'Unknown Status'),
-            # 'in_speed': self.status_meanings['fan_speed'].get(data[6], f'Speed {data[6]}'),
-            # 'out_speed': self.status_meanings['fan_speed'].get(data[7], f'Speed {data[7]}'),
-            'negative_ion': self.status_meanings['negative_ion'].get(data[8], 'Unknown Status'),
-            'sleep_mode': self.status_meanings['sleep_mode'].get(data[9], 'Unknown Status'),
-            # 'auto_manual': self.status_meanings['auto_manual'].get(data[10], 'Unknown Mode'),
-            'UV_sterilization': self.status_meanings['UV_sterilization'].get(data[11], 'Unknown Status'),
-            'inner_cycle': self.status_meanings['inner_cycle'].get(data[12], 'Unknown Mode'),
-            'auxiliary_heat': self.status_meanings['auxiliary_heat'].get(data[13], 'Unknown Status'),
-            'bypass': self.status_meanings['bypass'].get(data[14], 'Unknown Status'),
-            # 'timer': f"0x{data[15]:02X} ({self.status_meanings['timer'].get(data[15], 'Unknown Status')})",
-            # 'reserved_field1': f"0x{data[16]:02X}",
-            # 'reserved_field2': f"0x{data[17]:02X}",
-            # 'CRC16_high': f"0x{data[18]:02X}",
-            # 'CRC16_low': f"0x{data[19]:02X}"
-        }
-    
     def _analyze_address_command(self, data: bytes) -> Dict:
         """分析地址管理指令"""
         if data[0] == 0xAA and len(data) == 7:
@@ -170,32 +270,106 @@ class MiyaCommandAnalyzer:
                     '查询参数': data[3]
                 }
         return {'类型': '未知地址指令'}
-    
-    def _fan_speed_status(self, data: bytes) -> Dict:
-        """判断进风和排风的风速"""
-        if data[6] == 0x01 and data[7] == 0x01:
-            return {'fan_mode': 'level_1'}
-        elif data[6] == 0x02 and data[7] == 0x02:
-            return {'fan_mode': 'level_2'}
-        elif data[6] == 0x03 and data[7] == 0x03:
-            return {'fan_mode': 'level_3'}
-        elif data[6] == 0x04 and data[7] == 0x04:
-            return {'fan_mode': 'level_4'}
-        elif data[6] == 0x05 and data[7] == 0x05:
-            return {'fan_mode': 'level_5'}
-        else:
-            # 如果进风和排风速度不匹配，返回默认值
-            return {'fan_mode': 'unknown'}
-
-    def _mode_status(self, data: bytes) -> Dict:
-        """判断模式状态"""
-        if data[5] == 0x02 and data[10] == 0x01:
-            return {'mode': 'auto'}
-        elif data[5] == 0x01:
-            return {'mode': 'off'}
-        elif data[5] == 0x02 and data[10] == 0x02:
-            return {'mode': 'manual'}
-  
+
+
+class StatusDecodeCache:
+    """
+    状态帧解析结果的LRU缓存（进程内所有设备共用）
+    同型号设备大多处于少数几种相同状态，相同状态只需一次哈希查找；
+    键为第5~17字节（去掉地址和功能字节），值为字段表解码函数解析出的只读状态记录
+    """
+
+    __slots__ = ('maxsize', 'hits', 'misses', '_records', '_decode')
+
+    def __init__(self, maxsize: int = STATUS_DECODE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._records: "OrderedDict[bytes, Mapping[str, Any]]" = OrderedDict()
+        self._decode = MIYA_HRV_CODEC.decode
+
+    def decode(self, data: bytes) -> Mapping[str, Any]:
+        """返回状态帧的只读解析记录"""
+        # 地址（第2、4字节）不参与，不同地址的相同状态共用一条记录；
+        # 功能字节（第3字节）只区分查询应答和控制应答，解析结果相同，同样不参与
+        key = bytes(data[5:18])
+        records = self._records
+        record = records.get(key)
+        if record is not None:
+            self.hits += 1
+            records.move_to_end(key)
+            return record
+        self.misses += 1
+        record = records[key] = MappingProxyType(self._decode(data))
+        if len(records) > self.maxsize:
+            records.popitem(last=False)
+        return record
+
+    def clear(self):
+        """清空缓存和统计"""
+        self._records.clear()
+        self.hits = self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """缓存统计，用于诊断信息"""
+        return {
+            'size': len(self._records),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate, 4),
+        }
+
+
+# 进程内共用的状态解析缓存
+status_decode_cache = StatusDecodeCache()
+
+
+class DeviceStatus:
+    """
+    单台设备共享的20字节状态缓冲区
+    状态变化时从共用缓存取得只读解析记录，实体直接按键读取，不再各自保存状态字典副本
+    """
+
+    __slots__ = ('frame', 'valid', 'record')
+
+    def __init__(self):
+        self.frame = bytearray(20)
+        self.valid = False
+        self.record: Mapping[str, Any] = MappingProxyType({})
+
+    def update(self, data: bytes) -> bool:
+        """写入一帧状态数据，返回状态是否有变化"""
+        changed = not self.valid or self.frame[5:16] != data[5:16]
+        self.frame[:] = data[:20]
+        if changed:
+            self.record = status_decode_cache.decode(data)
+        self.valid = True
+        return changed
+
+    def clear(self):
+        """清空状态"""
+        self.valid = False
+
+    def get(self, key: str, default=None):
+        """按状态键读取解析后的值，与 MiyaCommandAnalyzer.get_status_data 的键一致"""
+        if not self.valid:
+            return default
+        return self.record.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def as_dict(self) -> Dict:
+        """生成状态字典（仅诊断和日志使用）"""
+        if not self.valid:
+            return {}
+        return dict(self.record)
 
 
 if __name__ == "__main__":
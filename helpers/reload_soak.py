@@ -0,0 +1,196 @@
+'''
+重新加载浸泡测试
+在真实的 Home Assistant 实例中对同一配置条目反复执行 设置 -> 连接并收到状态 -> 卸载，
+走完整的条目设置/卸载流程（管理器、climate/switch/sensor 平台、集成服务和条目后台任务），
+用 tracemalloc 和事件循环任务数检查多次重新加载后内存和后台任务是否保持平稳（不随次数增长）。
+
+每次卸载后同时检查：集成服务已移除、网关注册表已清空、没有遗留的管理器。
+
+用法（需在 custom_components 的上级目录运行，且已安装 homeassistant）:
+    python -m custom_components.miya_hrv.helpers.reload_soak --cycles 1000
+
+'''
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import MappingProxyType
+from typing import Any, Dict
+
+from homeassistant import config_entries, loader
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import (
+    area_registry, device_registry, entity, entity_registry, issue_registry, restore_state, template, translation,
+)
+from homeassistant.helpers.entity_platform import DATA_ENTITY_PLATFORM
+
+from ..const import DOMAIN, DATA_GATEWAYS
+from ..services import SERVICE_GROUP_CONTROL, SERVICE_RESET_FILTER, SERVICE_PROFILE
+from .scale_harness import start_simulator
+
+# 判定为平稳的阈值：预热后每次重新加载的Python对象分配增长(字节)
+GROWTH_PER_CYCLE_LIMIT = 256
+SERVICES = (SERVICE_GROUP_CONTROL, SERVICE_RESET_FILTER, SERVICE_PROFILE)
+
+
+async def start_hass(config_dir: str) -> HomeAssistant:
+    """启动一个只加载本集成所需部分的 Home Assistant 实例（不读取 configuration.yaml）."""
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    # 各版本的辅助模块初始化接口不同，存在时才调用
+    for module in (translation, entity, template):
+        setup = getattr(module, "async_setup", None)
+        if setup is not None:
+            setup(hass)
+    await asyncio.gather(*(
+        registry.async_load(hass)
+        for registry in (area_registry, device_registry, entity_registry, issue_registry, restore_state)
+    ))
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await hass.async_start()
+    return hass
+
+
+def make_entry(port: int) -> config_entries.ConfigEntry:
+    """模拟网关上地址01设备的配置条目（只传入当前版本 ConfigEntry 接受的参数）."""
+    kwargs = {
+        'version': 2,
+        'minor_version': 1,
+        'domain': DOMAIN,
+        'title': "MIYA HRV soak",
+        'data': {"host": "127.0.0.1", "port": port, "device_addr": "01"},
+        'source': config_entries.SOURCE_USER,
+        'options': {},
+        'unique_id': f"127.0.0.1:{port}:01",
+        'discovery_keys': MappingProxyType({}),
+        'subentries_data': None,
+    }
+    accepted = inspect.signature(config_entries.ConfigEntry).parameters
+    return config_entries.ConfigEntry(**{key: value for key, value in kwargs.items() if key in accepted})
+
+
+def prune_stale_platforms(hass: HomeAssistant, entry_id: str) -> int:
+    """移除 HA 卸载条目后仍登记着的实体平台，返回移除的数量.
+
+    较旧的 HA 版本卸载条目时只重置、不注销实体平台（上游已修复），每次重新加载留下一个平台，
+    并经平台上的实体持有本集成的管理器；不移除会把 HA 自身的增长计入本集成的结果。
+    """
+    platforms = hass.data.get(DATA_ENTITY_PLATFORM, {}).get(DOMAIN, [])
+    stale = [platform for platform in platforms
+             if platform.config_entry is not None and platform.config_entry.entry_id == entry_id]
+    for platform in stale:
+        platforms.remove(platform)
+    return len(stale)
+
+
+async def reload_once(hass: HomeAssistant, entry_id: str, ready_timeout: float) -> Dict[str, Any]:
+    """设置条目，等待收到设备状态后卸载；返回本次是否就绪、卸载是否干净."""
+    await hass.config_entries.async_setup(entry_id)
+    deadline = time.monotonic() + ready_timeout
+    ready = False
+    while time.monotonic() < deadline:
+        manager = hass.data.get(DOMAIN, {}).get(entry_id)
+        if manager is not None and manager.status.valid and not manager.status_stale:
+            ready = all(hass.services.has_service(DOMAIN, service) for service in SERVICES)
+            break
+        await asyncio.sleep(0.005)
+    await hass.config_entries.async_unload(entry_id)
+    stale_platforms = prune_stale_platforms(hass, entry_id)
+    clean = (
+        not hass.data.get(DOMAIN)
+        and not hass.data.get(DATA_GATEWAYS)
+        and not any(hass.services.has_service(DOMAIN, service) for service in SERVICES)
+    )
+    return {'ready': ready, 'clean': clean, 'stale_platforms': stale_platforms}
+
+
+def measure() -> Dict[str, int]:
+    """回收垃圾后的当前分配量和任务数."""
+    gc.collect()
+    return {
+        'traced_bytes': tracemalloc.get_traced_memory()[0],
+        'tasks': len(asyncio.all_tasks()),
+    }
+
+
+async def run(cycles: int, warmup: int, ready_timeout: float, top: int) -> Dict[str, Any]:
+    process, ports = await start_simulator(1, 1.0)
+    config_dir = tempfile.mkdtemp(prefix="miya_soak_")
+    hass = await start_hass(config_dir)
+    try:
+        # 添加条目即完成首次设置，随后卸载，之后每次循环重新设置/卸载
+        entry = make_entry(ports[0])
+        await hass.config_entries.async_add(entry)
+        await hass.config_entries.async_unload(entry.entry_id)
+        prune_stale_platforms(hass, entry.entry_id)
+
+        # 预热：导入、缓存、实体注册和首次分配不计入。
+        # 预热前开始跟踪：跟踪开始后才分配的对象替换跟踪前的旧对象（如恢复状态、实体状态）时，
+        # 若在预热后才开始跟踪会被误计为增长
+        tracemalloc.start(10)
+        for _ in range(warmup):
+            await reload_once(hass, entry.entry_id, ready_timeout)
+
+        before = measure()
+        snapshot_before = tracemalloc.take_snapshot()
+        not_ready = unclean = stale_platforms = 0
+        started = time.monotonic()
+        for cycle in range(cycles):
+            result = await reload_once(hass, entry.entry_id, ready_timeout)
+            not_ready += not result['ready']
+            unclean += not result['clean']
+            stale_platforms += result['stale_platforms']
+        elapsed = time.monotonic() - started
+        after = measure()
+        snapshot_after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        growth = after['traced_bytes'] - before['traced_bytes']
+        top_growth = [
+            {'where': str(stat.traceback[0]), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+            for stat in snapshot_after.compare_to(snapshot_before, "lineno")[:top]
+            if stat.size_diff > 0
+        ]
+        return {
+            'cycles': cycles,
+            'not_ready': not_ready,
+            'unclean_unloads': unclean,
+            'ha_stale_platforms_pruned': stale_platforms,
+            'seconds_per_cycle': round(elapsed / cycles, 4),
+            'tasks_before': before['tasks'],
+            'tasks_after': after['tasks'],
+            'traced_growth_bytes': growth,
+            'traced_growth_per_cycle': round(growth / cycles, 1),
+            'flat': (not unclean and after['tasks'] <= before['tasks']
+                     and growth / cycles <= GROWTH_PER_CYCLE_LIMIT),
+            'top_growth': top_growth,
+        }
+    finally:
+        await hass.async_stop(force=True)
+        process.stdin.close()
+        await asyncio.wait_for(process.wait(), timeout=10)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MIYA HRV 重新加载浸泡测试")
+    parser.add_argument("--cycles", type=int, default=1000, help="重新加载次数")
+    parser.add_argument("--warmup", type=int, default=20, help="预热次数（不计入统计）")
+    parser.add_argument("--ready-timeout", type=float, default=2.0, help="每次等待设备状态的超时(秒)")
+    parser.add_argument("--top", type=int, default=10, help="输出分配增长最多的代码行数")
+    args = parser.parse_args()
+
+    # 每次加载/卸载的信息日志会淹没结果
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args.cycles, args.warmup, args.ready_timeout, args.top))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(0 if result['flat'] else 1)
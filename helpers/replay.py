@@ -0,0 +1,54 @@
+'''
+抓包回放
+将现场录制的总线抓包回放到 帧解析 -> 状态解析 -> 管理器 流水线，
+用于复现现场问题和测量流水线吞吐。
+
+'''
+import argparse
+import asyncio
+from typing import Any, Dict, Optional
+
+try:
+    from .protocal import MiyaCommandAnalyzer, FRAME_LENGTHS
+    from .tcp_485_lib import replay_capture
+except ImportError:
+    from protocal import MiyaCommandAnalyzer, FRAME_LENGTHS
+    from tcp_485_lib import replay_capture
+
+
+async def replay_to_manager(path: str, manager, speed: Optional[float] = 1.0) -> Dict[str, Any]:
+    """
+    将抓包回放到 MiyaHRVManager，与实时监听走同一条处理路径
+    """
+    return await replay_capture(path, manager.handle_frame, FRAME_LENGTHS, speed=speed)
+
+
+async def replay_decode(path: str, speed: Optional[float] = None) -> Dict[str, Any]:
+    """
+    只经过帧解析和状态解析回放抓包（不需要Home Assistant），返回统计信息
+    """
+    analyzer = MiyaCommandAnalyzer()
+    decoded = {'status': 0, 'other': 0}
+
+    def on_frame(data: str):
+        status = analyzer.get_status_data(data)
+        if isinstance(status, dict) and 'error' not in status:
+            decoded['status'] += 1
+        else:
+            decoded['other'] += 1
+
+    result = await replay_capture(path, on_frame, FRAME_LENGTHS, speed=speed)
+    result['decoded_status'] = decoded['status']
+    result['decoded_other'] = decoded['other']
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MIYA HRV 抓包回放")
+    parser.add_argument("path", help="抓包文件路径")
+    parser.add_argument("--speed", type=float, default=0.0, help="回放倍速，0表示尽可能快 (默认0)")
+    args = parser.parse_args()
+
+    stats = asyncio.run(replay_decode(args.path, args.speed or None))
+    for key, value in stats.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,67 @@
+'''
+往返时延估计
+按 TCP 重传超时（RFC 6298）的方法，为每条网关连接估计 查询->应答、控制->确认 的往返时延，
+得出应答超时 RTO，用于等待应答、重发间隔和最小轮询间隔。
+
+- 平滑往返时延 SRTT 与时延偏差 RTTVAR 按指数加权更新，RTO = SRTT + 4·RTTVAR
+- 超时未应答时 RTO 加倍退避，收到新的有效样本后重新计算
+- 重发过的请求收到应答时无法判断对应哪一次发送，不作为样本（Karn 算法）
+
+'''
+from typing import Dict, Optional
+
+# 尚无样本时的应答超时(秒)
+RTO_INITIAL = 2.0
+# 应答超时上下限(秒)：下限避免总线抖动造成误判超时，上限避免退避后过久不重发
+RTO_MIN = 0.2
+RTO_MAX = 10.0
+# 平滑系数和偏差倍数（RFC 6298 推荐值）
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+RTT_K = 4
+# 时钟粒度(秒)，RTO 至少比 SRTT 大这么多
+RTT_GRANULARITY = 0.01
+
+
+class RttEstimator:
+    """一条网关连接的往返时延和应答超时估计"""
+
+    __slots__ = ('srtt', 'rttvar', 'rto', 'samples', 'timeouts', 'last_rtt')
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.rto = RTO_INITIAL
+        self.last_rtt: Optional[float] = None
+        self.samples = 0
+        self.timeouts = 0
+
+    def sample(self, rtt: float):
+        """加入一个往返时延样本(秒)，重新计算 RTO（同时清除超时退避）"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        self.rto = min(RTO_MAX, max(RTO_MIN, self.srtt + max(RTT_GRANULARITY, RTT_K * self.rttvar)))
+        self.last_rtt = rtt
+        self.samples += 1
+
+    def backoff(self):
+        """等待应答超时：RTO 加倍退避"""
+        self.rto = min(RTO_MAX, self.rto * 2)
+        self.timeouts += 1
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        """当前估计值（毫秒），用于诊断信息"""
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+        return {
+            'srtt_ms': ms(self.srtt),
+            'rttvar_ms': ms(self.rttvar),
+            'rto_ms': ms(self.rto),
+            'last_rtt_ms': ms(self.last_rtt),
+            'samples': self.samples,
+            'timeouts': self.timeouts,
+        }
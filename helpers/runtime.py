@@ -0,0 +1,96 @@
+'''
+运行时长累计
+按设备状态帧增量累计各档风速、辅热、UV杀菌的运行时长和滤网使用时长，
+每帧 O(1) 更新，随状态存储一起防抖落盘，不依赖 recorder 历史查询。
+
+'''
+from typing import Dict, Optional
+
+try:
+    from .protocal import FAN_LEVELS
+except ImportError:
+    from protocal import FAN_LEVELS
+
+# 两帧之间超过此间隔(秒)只计入此间隔，避免断线或HA停机期间按旧状态计时
+RUNTIME_MAX_GAP = 3600
+
+# 累计项: 风速各档、辅热、UV杀菌、滤网（开机即计）
+RUNTIME_KEYS = tuple(f"fan_level_{level}" for level in FAN_LEVELS) + ("auxiliary_heat", "UV_sterilization", "filter")
+
+
+class RuntimeCounters:
+    """单台设备的运行时长累计器（秒）"""
+
+    __slots__ = ('seconds', '_active', '_since')
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = dict.fromkeys(RUNTIME_KEYS, 0.0)
+        # 当前状态下正在计时的累计项及其起点 (time.monotonic)
+        self._active: tuple = ()
+        self._since: Optional[float] = None
+
+    @staticmethod
+    def _active_keys(frame) -> tuple:
+        """根据状态帧（第5~14字节）得出正在计时的累计项"""
+        if frame[5] != 0x02:
+            return ()
+        keys = ["filter"]
+        if frame[6] == frame[7] and frame[6] in FAN_LEVELS:
+            keys.append(f"fan_level_{frame[6]}")
+        if frame[13] == 0x02:
+            keys.append("auxiliary_heat")
+        if frame[11] == 0x02:
+            keys.append("UV_sterilization")
+        return tuple(keys)
+
+    def _elapsed(self, now: float) -> float:
+        if self._since is None:
+            return 0.0
+        return min(max(0.0, now - self._since), RUNTIME_MAX_GAP)
+
+    def observe(self, frame, now: float) -> bool:
+        """收到一帧设备状态：把上一帧以来的时长计入上一状态的累计项，返回是否有累计"""
+        accrued = bool(self._active and self._elapsed(now))
+        self.settle(now)
+        self._active = self._active_keys(frame)
+        self._since = now
+        return accrued
+
+    def pause(self, now: float) -> bool:
+        """结算后停止计时（断线、离线、卸载时），下一帧只作为新的起点；返回是否有累计"""
+        accrued = bool(self._active and self._elapsed(now))
+        self.settle(now)
+        self._active = ()
+        self._since = None
+        return accrued
+
+    def value(self, key: str, now: float) -> float:
+        """读取累计时长（秒），包含当前尚未结算的计时"""
+        seconds = self.seconds[key]
+        if key in self._active:
+            seconds += self._elapsed(now)
+        return seconds
+
+    def settle(self, now: float):
+        """把当前尚未结算的计时计入累计项（落盘前调用），计时从现在继续"""
+        if self._since is None:
+            return
+        elapsed = self._elapsed(now)
+        for key in self._active:
+            self.seconds[key] += elapsed
+        self._since = now
+
+    def reset(self, key: str, now: float):
+        """清零一个累计项（如更换滤网），当前计时从现在重新开始"""
+        self.settle(now)
+        self.seconds[key] = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        """持久化数据（已结算部分）"""
+        return {key: round(value, 1) for key, value in self.seconds.items()}
+
+    def restore(self, data: Optional[Dict[str, float]]):
+        """从持久化数据恢复，未知键忽略"""
+        for key, value in (data or {}).items():
+            if key in self.seconds:
+                self.seconds[key] = float(value)
@@ -0,0 +1,229 @@
+'''
+规模压测
+在一个事件循环上用最小化的 hass 替身建立 N 个配置条目，连接到本地模拟网关，
+测量事件循环延迟、每设备内存、每设备任务数和每帧CPU时间。
+启用 --tracemalloc 时额外统计每设备的Python对象分配（比RSS更精确，但会拖慢运行）。
+
+用法（需在 custom_components 的上级目录运行）:
+    python -m custom_components.miya_hrv.helpers.scale_harness --sizes 10 100 500
+
+'''
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from homeassistant.core import CoreState
+
+from .ha_utils import MiyaHRVManager
+
+SIMULATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py")
+
+
+class HarnessHass:
+    """最小化的 hass 替身，只提供管理器和存储用到的接口."""
+
+    def __init__(self, config_dir: str):
+        self.loop = asyncio.get_running_loop()
+        self.data: Dict[str, Any] = {}
+        self.state = CoreState.running
+        self.config = SimpleNamespace(
+            path=lambda *parts: os.path.join(config_dir, *parts),
+            components=set(),
+            config_dir=config_dir,
+        )
+        self.bus = SimpleNamespace(async_listen_once=lambda *args, **kwargs: (lambda: None))
+        self.tasks = set()
+
+    def async_create_task(self, target, name=None, eager_start=False):
+        """创建并跟踪任务."""
+        task = self.loop.create_task(target)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def async_create_background_task(self, target, name=None, eager_start=False):
+        """创建后台任务."""
+        return self.async_create_task(target, name)
+
+    def async_add_executor_job(self, target, *args):
+        """在执行器中运行阻塞函数."""
+        return self.loop.run_in_executor(None, target, *args)
+
+
+class HarnessEntry:
+    """配置条目替身：数据、选项、卸载回调和条目后台任务."""
+
+    def __init__(self, index: int, port: int):
+        self.entry_id = f"harness{index:05d}"
+        self.title = self.entry_id
+        self.data = {"host": "127.0.0.1", "port": port, "device_addr": "01"}
+        self.options: Dict[str, Any] = {}
+        self.unloads: List[Any] = []
+        self.background_tasks = set()
+
+    def async_on_unload(self, func):
+        """登记卸载回调."""
+        self.unloads.append(func)
+
+    def async_create_background_task(self, hass, target, name, eager_start=False):
+        """创建归属本条目的后台任务，卸载时取消."""
+        task = hass.async_create_background_task(target, name)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def async_unload_tasks(self):
+        """与 HA 卸载条目时相同：运行卸载回调，取消并等待条目后台任务."""
+        while self.unloads:
+            self.unloads.pop()()
+        tasks = list(self.background_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=10)
+
+
+def make_entry(index: int, port: int) -> HarnessEntry:
+    """生成一个配置条目替身."""
+    return HarnessEntry(index, port)
+
+
+def rss_bytes() -> int:
+    """当前进程常驻内存(字节)."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # 非Linux平台退化为峰值内存
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def frames_received(managers: List[MiyaHRVManager]) -> int:
+    """所有连接已接收的帧数."""
+    return sum(
+        manager.device.client.messages_received
+        for manager in managers if manager.device and manager.device.client
+    )
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.05) -> List[float]:
+    """周期性睡眠，记录实际唤醒相对预期的延迟(秒)."""
+    loop = asyncio.get_running_loop()
+    lags = []
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+    return lags
+
+
+async def start_simulator(count: int, push_interval: float):
+    """在子进程中启动模拟网关，避免模拟器开销计入测量结果."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, SIMULATOR_PATH, "--port", "0", "--gateways", str(count),
+        "--push", str(push_interval),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    ports = json.loads(await process.stdout.readline())
+    return process, ports
+
+
+async def run_size(count: int, window: float, push_interval: float, settle: float,
+                   trace_memory: bool = False) -> Dict[str, Any]:
+    """测量N个配置条目的开销."""
+    process, ports = await start_simulator(count, push_interval)
+    config_dir = tempfile.mkdtemp(prefix="miya_harness_")
+    hass = HarnessHass(config_dir)
+    managers = []
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        rss_before = rss_bytes()
+        tasks_before = len(asyncio.all_tasks())
+
+        for index, port in enumerate(ports):
+            manager = MiyaHRVManager(hass, f"harness{index:05d}")
+            await manager.setup(make_entry(index, port))
+            managers.append(manager)
+        await asyncio.sleep(settle)
+
+        rss_after = rss_bytes()
+        tasks_after = len(asyncio.all_tasks())
+        traced_after = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        if trace_memory:
+            tracemalloc.stop()
+        connected = sum(1 for m in managers if m.device.client and m.device.client.connected)
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+        frames_start = frames_received(managers)
+        cpu_start = time.process_time()
+        await asyncio.sleep(window)
+        cpu_used = time.process_time() - cpu_start
+        frames = frames_received(managers) - frames_start
+        stop.set()
+        lags = await lag_task
+
+        return {
+            'devices': count,
+            'connected': connected,
+            'loop_lag_p50_ms': statistics.median(lags) * 1000 if lags else 0.0,
+            'loop_lag_max_ms': max(lags) * 1000 if lags else 0.0,
+            'rss_per_device_kb': (rss_after - rss_before) / count / 1024,
+            'traced_per_device_kb': (traced_after - traced_before) / count / 1024,
+            'tasks_per_device': (tasks_after - tasks_before) / count,
+            'frames': frames,
+            'cpu_per_frame_us': cpu_used / frames * 1e6 if frames else 0.0,
+            'cpu_share': cpu_used / window,
+        }
+    finally:
+        for manager in managers:
+            await manager.cleanup()
+        process.stdin.close()
+        await asyncio.wait_for(process.wait(), timeout=10)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+def raise_fd_limit():
+    """提高文件描述符上限，以便建立数百个连接."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MIYA HRV 规模压测")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="配置条目数量")
+    parser.add_argument("--window", type=float, default=10.0, help="测量窗口(秒)")
+    parser.add_argument("--push", type=float, default=1.0, help="模拟网关上报间隔(秒)")
+    parser.add_argument("--settle", type=float, default=2.0, help="建立连接后的等待时间(秒)")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计每设备的Python对象分配")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+
+    async def main():
+        results = []
+        for size in args.sizes:
+            result = await run_size(size, args.window, args.push, args.settle, args.tracemalloc)
+            print(json.dumps(result), flush=True)
+            results.append(result)
+        print()
+        print(f"{'N':>5} {'lag p50 ms':>11} {'lag max ms':>11} {'RSS/dev KB':>11} {'tasks/dev':>10} {'CPU/frame us':>13} {'traced/dev KB':>14}")
+        for r in results:
+            print(f"{r['devices']:>5} {r['loop_lag_p50_ms']:>11.2f} {r['loop_lag_max_ms']:>11.2f} "
+                  f"{r['rss_per_device_kb']:>11.1f} {r['tasks_per_device']:>10.1f} {r['cpu_per_frame_us']:>13.1f} {r['traced_per_device_kb']:>14.1f}")
+
+    asyncio.run(main())
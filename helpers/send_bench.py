@@ -0,0 +1,135 @@
+'''
+发送性能测试
+对子进程中的模拟网关测量单帧往返延迟和突发吞吐，
+比较 TCP_NODELAY 开/关，以及逐帧 send_data 与批量 send_many。
+
+用法:
+    python send_bench.py --count 500 --burst 200
+
+'''
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict
+
+try:
+    from .tcp_485_lib import create_client
+    from .protocal import FRAME_LENGTHS, status_query_frame
+except ImportError:
+    from tcp_485_lib import create_client
+    from protocal import FRAME_LENGTHS, status_query_frame
+
+SIMULATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py")
+
+
+async def start_simulator(units: int):
+    """在子进程中启动一个模拟网关，返回 (进程, 端口)."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, SIMULATOR_PATH, "--port", "0", "--units", str(units),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    ports = json.loads(await process.stdout.readline())
+    return process, ports[0]
+
+
+async def open_client(port: int, tcp_nodelay: bool):
+    """连接模拟网关，返回 (客户端, 应答等待函数)."""
+    client = create_client("127.0.0.1", port, "bytes", tcp_keepalive=False,
+                           frame_lengths=FRAME_LENGTHS, tcp_nodelay=tcp_nodelay)
+    client.enable_iterator(False)
+    loop = asyncio.get_running_loop()
+    state = {'expected': 0, 'received': 0, 'future': None}
+
+    async def on_frame(frame: bytes):
+        state['received'] += 1
+        future = state['future']
+        if future is not None and not future.done() and state['received'] >= state['expected']:
+            future.set_result(None)
+
+    client.set_data_callback(on_frame)
+
+    def expect(count: int) -> asyncio.Future:
+        state['received'] = 0
+        state['expected'] = count
+        state['future'] = loop.create_future()
+        return state['future']
+
+    if not await client.connect():
+        raise ConnectionError(f"无法连接模拟网关 127.0.0.1:{port}")
+    return client, expect
+
+
+async def measure_latency(port: int, count: int, tcp_nodelay: bool) -> Dict[str, float]:
+    """单帧查询 -> 应答 的往返延迟."""
+    client, expect = await open_client(port, tcp_nodelay)
+    loop = asyncio.get_running_loop()
+    frame = status_query_frame(1)
+    samples = []
+    try:
+        for _ in range(count):
+            done = expect(1)
+            started = loop.time()
+            await client.send_bytes(frame)
+            await asyncio.wait_for(done, timeout=5)
+            samples.append(loop.time() - started)
+    finally:
+        await client.disconnect()
+    samples.sort()
+    return {
+        'p50_us': statistics.median(samples) * 1e6,
+        'p99_us': samples[int(len(samples) * 0.99) - 1] * 1e6,
+    }
+
+
+async def measure_burst(port: int, burst: int, units: int, batched: bool) -> Dict[str, float]:
+    """突发发送 burst 帧直到全部应答的吞吐."""
+    client, expect = await open_client(port, True)
+    loop = asyncio.get_running_loop()
+    frames = [status_query_frame(1 + i % units) for i in range(burst)]
+    try:
+        done = expect(burst)
+        started = loop.time()
+        if batched:
+            await client.send_many(frames)
+        else:
+            for frame in frames:
+                await client.send_bytes(frame)
+        send_time = loop.time() - started
+        await asyncio.wait_for(done, timeout=30)
+        elapsed = loop.time() - started
+    finally:
+        await client.disconnect()
+    return {
+        'send_ms': send_time * 1000,
+        'total_ms': elapsed * 1000,
+        'frames_per_second': burst / elapsed,
+    }
+
+
+async def run(count: int, burst: int, units: int) -> Dict[str, Any]:
+    """运行全部测量."""
+    process, port = await start_simulator(units)
+    try:
+        return {
+            'latency_nodelay': await measure_latency(port, count, True),
+            'latency_nagle': await measure_latency(port, count, False),
+            'burst_per_frame': await measure_burst(port, burst, units, False),
+            'burst_send_many': await measure_burst(port, burst, units, True),
+        }
+    finally:
+        process.stdin.close()
+        await asyncio.wait_for(process.wait(), timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MIYA HRV 发送性能测试")
+    parser.add_argument("--count", type=int, default=500, help="往返延迟采样次数")
+    parser.add_argument("--burst", type=int, default=200, help="突发帧数")
+    parser.add_argument("--units", type=int, default=16, help="模拟设备数量")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.count, args.burst, args.units)), indent=2))
@@ -0,0 +1,207 @@
+'''
+网关模拟器
+在本地模拟 485-TCP 网关及其总线上的 MIYA HRV 设备，
+用于压测、回归和在没有真实设备时调试集成。
+
+'''
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from .crc_miya import crc16_ccitt
+    from .tcp_485_lib import FrameDecoder
+except ImportError:
+    from crc_miya import crc16_ccitt
+    from tcp_485_lib import FrameDecoder
+
+_LOGGER = logging.getLogger(__name__)
+
+# 网关收到的帧: 状态查询/控制帧和广播地址查询帧
+GATEWAY_FRAME_LENGTHS = {0xC7: 20, 0xAD: 7}
+
+# 状态帧中可被控制帧修改的字节范围（电源 ~ 定时）
+CONTROL_FIELDS = range(5, 16)
+
+
+class SimulatedUnit:
+    """模拟的单台新风设备，保存一帧20字节状态."""
+
+    def __init__(self, address: int):
+        self.address = address
+        # 默认: 开机、自动、2档风速、其余功能关闭
+        self.state = bytearray([0xC7, 0x12, address, 0x01, address,
+                                0x02, 0x03, 0x03, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01,
+                                0x00, 0x00, 0x00, 0x00])
+
+    def apply_control(self, frame: bytes):
+        """应用控制帧，字段为0表示保持不变."""
+        for offset in CONTROL_FIELDS:
+            if frame[offset]:
+                self.state[offset] = frame[offset]
+
+    def status_frame(self, function_type: int = 0x01) -> bytes:
+        """生成带CRC的状态帧."""
+        frame = self.state
+        frame[3] = function_type
+        crc = crc16_ccitt(frame[0:18])
+        frame[18] = (crc >> 8) & 0xFF
+        frame[19] = crc & 0xFF
+        return bytes(frame)
+
+    def address_frame(self) -> bytes:
+        """生成广播地址查询的应答帧."""
+        return bytes([0xAA, 0x07, 0xAA, self.address, 0x00, 0x00, 0x00])
+
+
+class SimulatedGateway:
+    """模拟的485-TCP网关，一个TCP端口后挂若干台设备."""
+
+    def __init__(self,
+                 addresses: Iterable[int] = (1,),
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 push_interval: Optional[float] = None,
+                 response_delay: float = 0.0):
+        """
+        Args:
+            addresses: 总线上的设备地址
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            push_interval: 主动上报全部设备状态的间隔(秒)，None表示只应答
+            response_delay: 每帧应答前的延迟(秒)，模拟总线往返时间
+        """
+        self.units: Dict[int, SimulatedUnit] = {addr: SimulatedUnit(addr) for addr in addresses}
+        self.host = host
+        self.port = port
+        self.push_interval = push_interval
+        self.response_delay = response_delay
+        self.silent_addresses = set()
+        self.frames_received = 0
+        self.frames_sent = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: List[asyncio.StreamWriter] = []
+        self._push_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> int:
+        """启动网关，返回实际监听端口."""
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.push_interval:
+            self._push_task = asyncio.create_task(self._push_loop())
+        return self.port
+
+    async def stop(self):
+        """停止网关并断开所有客户端."""
+        if self._push_task:
+            self._push_task.cancel()
+            try:
+                await self._push_task
+            except asyncio.CancelledError:
+                pass
+            self._push_task = None
+        for writer in list(self._writers):
+            writer.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _respond(self, frame: bytes) -> List[bytes]:
+        """根据收到的帧生成应答帧."""
+        if frame[0] == 0xAD:
+            return [unit.address_frame() for addr, unit in self.units.items()
+                    if addr not in self.silent_addresses]
+
+        address = frame[2]
+        function_type = frame[3]
+        if address == 0x00 and function_type == 0x02:
+            # 广播控制: 所有设备执行，不应答
+            for unit in self.units.values():
+                unit.apply_control(frame)
+            return []
+
+        unit = self.units.get(address)
+        if unit is None or address in self.silent_addresses:
+            return []
+        if function_type == 0x02:
+            unit.apply_control(frame)
+        return [unit.status_frame(function_type)]
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个客户端连接."""
+        self._writers.append(writer)
+        decoder = FrameDecoder(GATEWAY_FRAME_LENGTHS)
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    self.frames_received += 1
+                    replies = self._respond(frame)
+                    if not replies:
+                        continue
+                    if self.response_delay:
+                        await asyncio.sleep(self.response_delay)
+                    writer.writelines(replies)
+                    self.frames_sent += len(replies)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if writer in self._writers:
+                self._writers.remove(writer)
+            writer.close()
+
+    async def _push_loop(self):
+        """定期向所有客户端上报全部设备状态."""
+        while True:
+            await asyncio.sleep(self.push_interval)
+            frames = [unit.status_frame() for addr, unit in self.units.items()
+                      if addr not in self.silent_addresses]
+            for writer in list(self._writers):
+                try:
+                    writer.writelines(frames)
+                    self.frames_sent += len(frames)
+                except Exception:
+                    pass
+
+
+async def serve_gateways(count: int,
+                         addresses: Iterable[int] = (1,),
+                         push_interval: Optional[float] = None,
+                         response_delay: float = 0.0) -> List[SimulatedGateway]:
+    """启动多个模拟网关."""
+    gateways = [SimulatedGateway(addresses, push_interval=push_interval, response_delay=response_delay)
+                for _ in range(count)]
+    await asyncio.gather(*(gateway.start() for gateway in gateways))
+    return gateways
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MIYA HRV 网关模拟器")
+    parser.add_argument("--port", type=int, default=38, help="监听端口 (默认38)")
+    parser.add_argument("--units", type=int, default=1, help="总线上的设备数量，地址从1开始")
+    parser.add_argument("--push", type=float, default=None, help="主动上报间隔(秒)")
+    parser.add_argument("--delay", type=float, default=0.0, help="应答延迟(秒)")
+    parser.add_argument("--gateways", type=int, default=1, help="模拟网关数量，大于1或端口为0时自动分配并输出端口列表")
+    args = parser.parse_args()
+
+    async def main():
+        addresses = range(1, args.units + 1)
+        if args.gateways > 1 or args.port == 0:
+            gateways = await serve_gateways(args.gateways, addresses, args.push, args.delay)
+            # 第一行输出端口列表，供压测脚本读取
+            print(json.dumps([gateway.port for gateway in gateways]), flush=True)
+        else:
+            gateway = SimulatedGateway(addresses, "0.0.0.0", args.port, args.push, args.delay)
+            port = await gateway.start()
+            print(f"模拟网关已启动: 端口 {port}, 设备 {args.units} 台", flush=True)
+        # 标准输入关闭时退出（父进程结束）
+        await asyncio.get_running_loop().run_in_executor(None, sys.stdin.read)
+
+    asyncio.run(main())
@@ -12,6 +12,10 @@ TCP 485通信库
 - 支持hex和bytes两种数据模式
 - 简洁的异步迭代器API
 - TCP保活功能（保持连接稳定）
+- 按包头切分完整帧
+- 二进制抓包与回放
+- 接收队列按键合并状态帧，丢弃/合并计数
+- 本地转发代理，多个客户端共用一条网关连接
 
 最简用法:
     >>> from tcp_485_lib import create_client
@@ -30,6 +34,16 @@ from .tcp_client_lib import (
     Tcp485Client,
     create_client
 )
+from .framing import FrameDecoder
+from .inbound import InboundQueue
+from .proxy import Tcp485Proxy
+from .capture import (
+    CaptureWriter,
+    CaptureReader,
+    replay_capture,
+    DIRECTION_RX,
+    DIRECTION_TX
+)
 from .tool import (
     DataConverter,
     hex_to_bytes,
@@ -46,6 +60,14 @@ __description__ = "简洁的TCP 485通信库 - 异步迭代器 + TCP保活"
 __all__ = [
     "Tcp485Client",
     "DataConverter", 
+    "FrameDecoder",
+    "InboundQueue",
+    "Tcp485Proxy",
+    "CaptureWriter",
+    "CaptureReader",
+    "replay_capture",
+    "DIRECTION_RX",
+    "DIRECTION_TX",
     "create_client",
     "hex_to_bytes",
     "bytes_to_hex",
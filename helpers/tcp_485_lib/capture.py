@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""总线抓包与回放 - 紧凑二进制抓包格式
+
+文件格式:
+    文件头(16字节): 魔数(8字节) + 版本(uint16) + 记录长度(uint16) + 保留(4字节)
+    记录(32字节):   时间戳(float64, 秒) + 方向(uint8) + 长度(uint8) + 帧数据(22字节, 不足补零)
+
+客户端启用帧解析时每帧写一条记录；超过22字节的数据块会被拆成多条连续记录，
+回放时经帧解析层重新拼帧。
+"""
+
+import asyncio
+import inspect
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Callable, Iterator, Optional, Tuple, Dict, Any
+
+from .framing import FrameDecoder
+from .tool import DataConverter
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b"T485CAP\x00"
+CAPTURE_VERSION = 1
+
+HEADER_STRUCT = struct.Struct("<8sHH4x")
+RECORD_STRUCT = struct.Struct("<dBB22s")
+HEADER_SIZE = HEADER_STRUCT.size
+RECORD_SIZE = RECORD_STRUCT.size
+MAX_RECORD_DATA = 22
+
+# 数据方向
+DIRECTION_RX = 0
+DIRECTION_TX = 1
+
+
+def pack_records(timestamp: float, direction: int, data: bytes) -> bytes:
+    """将一段数据打包为一条或多条定长记录
+
+    Args:
+        timestamp: 时间戳(秒)
+        direction: 方向 DIRECTION_RX / DIRECTION_TX
+        data: 原始字节数据
+
+    Returns:
+        打包后的记录字节
+    """
+    if len(data) <= MAX_RECORD_DATA:
+        return RECORD_STRUCT.pack(timestamp, direction, len(data), data)
+    return b"".join(
+        RECORD_STRUCT.pack(timestamp, direction, len(chunk), chunk)
+        for chunk in (data[i:i + MAX_RECORD_DATA] for i in range(0, len(data), MAX_RECORD_DATA))
+    )
+
+
+class CaptureWriter:
+    """后台抓包写入器 - 写文件在独立线程中进行，不阻塞事件循环"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        """初始化抓包写入器
+
+        Args:
+            path: 抓包文件路径（已存在时追加）
+            flush_interval: 刷新到磁盘的间隔(秒)
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records_written = 0
+        self._queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def start(self):
+        """打开文件并启动写入线程（同步打开文件，事件循环中请使用 async_start）"""
+        if self._thread is not None:
+            return
+        self._start_thread(self._open())
+
+    async def async_start(self):
+        """在执行器中打开文件并校验文件头后启动写入线程，不阻塞事件循环"""
+        if self._thread is not None:
+            return
+        handle = await asyncio.get_running_loop().run_in_executor(None, self._open)
+        self._start_thread(handle)
+
+    def _open(self):
+        """打开抓包文件（新文件写入文件头，已有文件校验文件头后追加）"""
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if not new_file:
+            _validate_header(self.path)
+        handle = open(self.path, "ab")
+        if new_file:
+            handle.write(HEADER_STRUCT.pack(CAPTURE_MAGIC, CAPTURE_VERSION, RECORD_SIZE))
+        return handle
+
+    def _start_thread(self, handle):
+        if self._thread is not None:
+            # 并发启动时已由另一次调用启动
+            handle.close()
+            return
+        self._thread = threading.Thread(
+            target=self._run, args=(handle,), name="tcp485-capture", daemon=True
+        )
+        self._thread.start()
+        _LOGGER.info(f"开始抓包: {self.path}")
+
+    def write(self, direction: int, data: bytes, timestamp: Optional[float] = None):
+        """记录一段数据（仅入队，立即返回）
+
+        Args:
+            direction: 方向 DIRECTION_RX / DIRECTION_TX
+            data: 原始字节数据
+            timestamp: 时间戳(秒)，默认当前时间
+        """
+        if self._closed or not data:
+            return
+        self._queue.put(pack_records(time.time() if timestamp is None else timestamp, direction, data))
+
+    def close(self):
+        """停止写入线程并关闭文件（阻塞直到队列写完）"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        _LOGGER.info(f"抓包已停止: {self.path}，共 {self.records_written} 条记录")
+
+    def _run(self, handle):
+        """写入线程主循环 - 批量取出队列中的记录后一次写入"""
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = b""
+
+                batch = []
+                stop = item is None
+                if item:
+                    batch.append(item)
+                while not stop:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                    else:
+                        batch.append(item)
+
+                if batch:
+                    chunk = b"".join(batch)
+                    handle.write(chunk)
+                    self.records_written += len(chunk) // RECORD_SIZE
+
+                now = time.monotonic()
+                if stop or now - last_flush >= self.flush_interval:
+                    handle.flush()
+                    last_flush = now
+                if stop:
+                    break
+        except Exception as e:
+            _LOGGER.error(f"抓包写入失败: {e}")
+        finally:
+            handle.close()
+
+
+def _validate_header(path: str):
+    """校验抓包文件头"""
+    with open(path, "rb") as handle:
+        header = handle.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"抓包文件头不完整: {path}")
+    magic, version, record_size = HEADER_STRUCT.unpack(header)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"不是有效的抓包文件: {path}")
+    if version != CAPTURE_VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"不支持的抓包版本: v{version}, 记录长度 {record_size}")
+
+
+class CaptureReader:
+    """抓包读取器 - 通过mmap按需读取记录，不将整个文件载入内存"""
+
+    def __init__(self, path: str):
+        """打开抓包文件
+
+        Args:
+            path: 抓包文件路径
+        """
+        _validate_header(path)
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._count = (size - HEADER_SIZE) // RECORD_SIZE
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._count else None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Tuple[float, int, bytes]:
+        """读取第index条记录，返回 (时间戳, 方向, 数据)"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("抓包记录索引越界")
+        timestamp, direction, length, data = RECORD_STRUCT.unpack_from(
+            self._mmap, HEADER_SIZE + index * RECORD_SIZE
+        )
+        return timestamp, direction, data[:length]
+
+    def __iter__(self) -> Iterator[Tuple[float, int, bytes]]:
+        unpack_from = RECORD_STRUCT.unpack_from
+        buffer = self._mmap
+        for offset in range(HEADER_SIZE, HEADER_SIZE + self._count * RECORD_SIZE, RECORD_SIZE):
+            timestamp, direction, length, data = unpack_from(buffer, offset)
+            yield timestamp, direction, data[:length]
+
+    @property
+    def buffer(self) -> Optional[mmap.mmap]:
+        """底层只读mmap（供列式分析零拷贝使用）"""
+        return self._mmap
+
+    def close(self):
+        """关闭文件"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def replay_capture(path: str,
+                         handler: Callable,
+                         frame_lengths: Optional[Dict[int, int]] = None,
+                         speed: Optional[float] = 1.0,
+                         direction: int = DIRECTION_RX,
+                         data_mode: str = "hex") -> Dict[str, Any]:
+    """将抓包文件回放到处理函数
+
+    Args:
+        path: 抓包文件路径
+        handler: 帧处理函数（普通函数或协程函数），参数为一帧数据
+        frame_lengths: 帧长表，提供时先经帧解析层拼帧；为None时按记录原样回放
+        speed: 回放倍速，1.0为原速，None或0表示尽可能快
+        direction: 回放的方向，默认只回放接收方向
+        data_mode: "hex" 传入十六进制字符串，"bytes" 传入字节数据
+
+    Returns:
+        回放统计信息
+    """
+    decoder = FrameDecoder(frame_lengths) if frame_lengths else None
+    is_coroutine = inspect.iscoroutinefunction(handler)
+    hex_mode = data_mode == "hex"
+    realtime = bool(speed)
+    frames = 0
+    records = 0
+    first_ts = None
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    with CaptureReader(path) as reader:
+        for timestamp, record_direction, data in reader:
+            if record_direction != direction:
+                continue
+            records += 1
+
+            if realtime:
+                if first_ts is None:
+                    first_ts = timestamp
+                delay = (timestamp - first_ts) / speed - (loop.time() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif records % 1000 == 0:
+                # 全速回放时定期让出事件循环
+                await asyncio.sleep(0)
+
+            for frame in (decoder.feed(data) if decoder else (data,)):
+                frames += 1
+                payload = DataConverter.tcp_to_hex(frame) if hex_mode else frame
+                if is_coroutine:
+                    await handler(payload)
+                else:
+                    handler(payload)
+
+    elapsed = loop.time() - started
+    return {
+        'records': records,
+        'frames': frames,
+        'elapsed': elapsed,
+        'frames_per_second': frames / elapsed if elapsed > 0 else 0.0,
+        'bytes_dropped': decoder.bytes_dropped if decoder else 0,
+    }
+
+
+__all__ = [
+    'CaptureWriter',
+    'CaptureReader',
+    'replay_capture',
+    'pack_records',
+    'DIRECTION_RX',
+    'DIRECTION_TX',
+    'HEADER_SIZE',
+    'RECORD_SIZE',
+    'MAX_RECORD_DATA'
+]
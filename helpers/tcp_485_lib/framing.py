@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""帧解析层 - 从TCP字节流中切分完整帧"""
+
+import logging
+from typing import Dict, List, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FrameDecoder:
+    """流式帧解析器 - 按包头字节和固定帧长切分字节流
+
+    TCP读取到的数据块可能包含半帧或多帧，解析器缓存残余字节，
+    只输出完整帧。遇到未知包头时逐字节丢弃直到重新同步。
+    """
+
+    __slots__ = ('frame_lengths', 'max_buffer', '_buffer', 'frames_decoded', 'bytes_dropped')
+
+    def __init__(self, frame_lengths: Dict[int, int], max_buffer: int = 1024):
+        """初始化帧解析器
+
+        Args:
+            frame_lengths: 包头字节到完整帧长度的映射，如 {0xC7: 20, 0xAA: 7}
+            max_buffer: 缓冲区上限(字节)，超过时丢弃缓存防止内存增长
+        """
+        self.frame_lengths = dict(frame_lengths)
+        self.max_buffer = max_buffer
+        self._buffer = bytearray()
+        self.frames_decoded = 0
+        self.bytes_dropped = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """输入一段字节数据，返回其中所有完整帧
+
+        Args:
+            data: 新接收的字节数据
+
+        Returns:
+            完整帧列表（可能为空）
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = 0
+        end = len(buffer)
+        lengths = self.frame_lengths
+
+        while start < end:
+            frame_len = lengths.get(buffer[start])
+            if frame_len is None:
+                # 未知包头，丢弃一个字节重新同步
+                start += 1
+                self.bytes_dropped += 1
+                continue
+            if end - start < frame_len:
+                break
+            frames.append(bytes(buffer[start:start + frame_len]))
+            start += frame_len
+
+        if start:
+            del buffer[:start]
+
+        if len(buffer) > self.max_buffer:
+            _LOGGER.warning(f"帧缓冲区超过上限 {self.max_buffer} 字节，已清空")
+            self.bytes_dropped += len(buffer)
+            buffer.clear()
+
+        self.frames_decoded += len(frames)
+        return frames
+
+    def reset(self):
+        """清空缓冲区（连接重建时调用）"""
+        self._buffer.clear()
+
+    @property
+    def pending(self) -> int:
+        """缓冲区中尚未组成完整帧的字节数"""
+        return len(self._buffer)
+
+
+def create_decoder(frame_lengths: Optional[Dict[int, int]]) -> Optional[FrameDecoder]:
+    """根据帧长表创建解析器，未配置时返回None（保持原始数据块模式）"""
+    if not frame_lengths:
+        return None
+    return FrameDecoder(frame_lengths)
+
+
+__all__ = [
+    'FrameDecoder',
+    'create_decoder'
+]
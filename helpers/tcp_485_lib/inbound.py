@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""接收队列 - 状态帧按键合并，其余帧有界先进先出"""
+
+import asyncio
+from collections import deque
+from typing import Callable, Hashable, Optional
+
+# 返回帧的合并键（如设备地址）；返回None表示该帧不可合并（如应答帧）
+CollapseKey = Callable[[bytes], Optional[Hashable]]
+
+
+class InboundQueue:
+    """接收队列
+
+    - 可合并帧（collapse_key 返回非None）: 同一键只保留最新一帧，
+      队列中已有该键的帧时直接替换，保持原排队位置，记入 collapsed
+    - 不可合并帧: 有界先进先出，满时丢弃最旧一帧，记入 dropped
+
+    处理方跟不上时，状态帧不会积压成延迟，应答帧也不会被状态帧挤掉。
+    """
+
+    __slots__ = ('maxsize', 'collapse_key', '_fifo', '_latest', '_seq', '_waiter', 'dropped', 'collapsed')
+
+    def __init__(self, maxsize: int = 100, collapse_key: Optional[CollapseKey] = None):
+        """初始化接收队列
+
+        Args:
+            maxsize: 先进先出部分和合并部分各自的上限
+            collapse_key: 合并键函数，None表示全部按先进先出处理
+        """
+        self.maxsize = maxsize
+        self.collapse_key = collapse_key
+        self._fifo: deque = deque()
+        # 合并键 -> [首次入队序号, 最新帧]，字典顺序即排队顺序
+        self._latest: dict = {}
+        self._seq = 0
+        self._waiter: Optional[asyncio.Future] = None
+        self.dropped = 0
+        self.collapsed = 0
+
+    def put_nowait(self, frame: bytes):
+        """放入一帧（不阻塞）"""
+        key = self.collapse_key(frame) if self.collapse_key else None
+        if key is not None:
+            entry = self._latest.get(key)
+            if entry is not None:
+                entry[1] = frame
+                self.collapsed += 1
+                return
+            if len(self._latest) >= self.maxsize:
+                del self._latest[next(iter(self._latest))]
+                self.dropped += 1
+            self._latest[key] = [self._seq, frame]
+        else:
+            if len(self._fifo) >= self.maxsize:
+                self._fifo.popleft()
+                self.dropped += 1
+            self._fifo.append((self._seq, frame))
+        self._seq += 1
+
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def get_nowait(self) -> bytes:
+        """按到达顺序取出一帧，队列为空时抛出 asyncio.QueueEmpty"""
+        fifo = self._fifo
+        latest = self._latest
+        if latest:
+            key = next(iter(latest))
+            if not fifo or latest[key][0] < fifo[0][0]:
+                return latest.pop(key)[1]
+        if fifo:
+            return fifo.popleft()[1]
+        raise asyncio.QueueEmpty
+
+    async def get(self) -> bytes:
+        """取出一帧，队列为空时等待"""
+        while not self._fifo and not self._latest:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiter = waiter
+            try:
+                await waiter
+            finally:
+                if self._waiter is waiter:
+                    self._waiter = None
+        return self.get_nowait()
+
+    def qsize(self) -> int:
+        return len(self._fifo) + len(self._latest)
+
+    def empty(self) -> bool:
+        return not self._fifo and not self._latest
+
+    def clear(self):
+        """清空队列（不计入丢弃）"""
+        self._fifo.clear()
+        self._latest.clear()
+
+
+__all__ = [
+    'InboundQueue',
+    'CollapseKey'
+]
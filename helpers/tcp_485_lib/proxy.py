@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""本地转发代理 - 多个客户端共用一条网关连接
+
+网关通常只接受一个TCP客户端。代理持有唯一的上游连接（Tcp485Client），
+在本地端口接受任意数量的下游客户端：
+
+- 上游收到的每一帧原样广播给所有下游客户端，同一个 bytes 对象直接交给各连接的
+  transport，不为每个客户端复制；只有对方来不及接收时 transport 才缓存剩余数据
+- 每个下游连接的发送缓冲有上限，超过即断开该客户端（慢客户端被丢弃，不拖慢其它客户端和总线）
+- 下游写入按完整帧切分后排队，由单一写任务整帧批量写到上游，不同客户端的帧不会交错
+
+用法:
+    python -m tcp_485_lib.proxy --upstream 192.168.1.5:38 --listen 0.0.0.0:8899 \\
+        --frame C7:20 --frame AA:7 --down-frame C7:20 --down-frame AD:7
+"""
+
+import argparse
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional, Set
+
+from .tcp_client_lib import Tcp485Client
+from .framing import FrameDecoder
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _DownstreamProtocol(asyncio.Protocol):
+    """一个下游客户端连接"""
+
+    __slots__ = ('proxy', 'transport', 'peer', '_decoder')
+
+    def __init__(self, proxy: "Tcp485Proxy"):
+        self.proxy = proxy
+        self.transport: Optional[asyncio.Transport] = None
+        self.peer = None
+        self._decoder = FrameDecoder(proxy.downstream_frame_lengths) if proxy.downstream_frame_lengths else None
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername')
+        # 发送缓冲超过上限时触发 pause_writing，即判定为慢客户端
+        transport.set_write_buffer_limits(high=self.proxy.client_buffer)
+        self.proxy._clients.add(self)
+        _LOGGER.info(f"下游客户端接入: {self.peer}，当前 {len(self.proxy._clients)} 个")
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.proxy._clients.discard(self)
+        _LOGGER.info(f"下游客户端断开: {self.peer}，当前 {len(self.proxy._clients)} 个")
+
+    def pause_writing(self):
+        """发送缓冲已满：丢弃该客户端而不是等待"""
+        self.proxy.clients_dropped += 1
+        _LOGGER.warning(f"下游客户端 {self.peer} 接收过慢（缓冲超过 {self.proxy.client_buffer} 字节），已断开")
+        self.proxy._clients.discard(self)
+        self.transport.abort()
+
+    def data_received(self, data: bytes):
+        frames = self._decoder.feed(data) if self._decoder else (data,)
+        if frames:
+            self.proxy._enqueue_upstream(frames)
+
+
+class Tcp485Proxy:
+    """485-TCP 转发代理"""
+
+    def __init__(self,
+                 upstream_host: str,
+                 upstream_port: int,
+                 listen_host: str = "0.0.0.0",
+                 listen_port: int = 8899,
+                 frame_lengths: Optional[Dict[int, int]] = None,
+                 downstream_frame_lengths: Optional[Dict[int, int]] = None,
+                 client_buffer: int = 64 * 1024,
+                 upstream_queue: int = 1000):
+        """初始化代理
+
+        Args:
+            upstream_host: 网关地址
+            upstream_port: 网关端口
+            listen_host: 本地监听地址
+            listen_port: 本地监听端口（0为自动分配）
+            frame_lengths: 上游（网关发出）帧长表，按完整帧广播；None 时按原始数据块转发
+            downstream_frame_lengths: 下游（客户端发出）帧长表，按完整帧写入总线；None 时按原始数据块
+            client_buffer: 每个下游客户端的发送缓冲上限(字节)，超过即断开
+            upstream_queue: 待写入上游的帧数上限，超过时丢弃最旧的帧
+        """
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.downstream_frame_lengths = downstream_frame_lengths
+        self.client_buffer = client_buffer
+        self.upstream = Tcp485Client(upstream_host, upstream_port, "bytes",
+                                     tcp_keepalive=False, frame_lengths=frame_lengths)
+        self.upstream.enable_iterator(False)
+        self.upstream.set_data_callback(self._broadcast)
+
+        self._clients: Set[_DownstreamProtocol] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._pending: deque = deque(maxlen=upstream_queue)
+        self._pending_event = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.frames_broadcast = 0
+        self.frames_forwarded = 0
+        self.frames_dropped = 0
+        self.clients_dropped = 0
+
+    async def start(self) -> int:
+        """连接网关并开始监听，返回实际监听端口"""
+        if not await self.upstream.connect():
+            raise ConnectionError(f"无法连接网关 {self.upstream.host}:{self.upstream.port}")
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: _DownstreamProtocol(self),
+                                                self.listen_host, self.listen_port)
+        self.listen_port = self._server.sockets[0].getsockname()[1]
+        self._writer_task = asyncio.create_task(self._write_upstream())
+        _LOGGER.info(f"代理已启动: {self.listen_host}:{self.listen_port} -> "
+                     f"{self.upstream.host}:{self.upstream.port}")
+        return self.listen_port
+
+    async def stop(self):
+        """停止监听、断开所有客户端和上游连接"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for client in list(self._clients):
+            client.transport.close()
+        self._clients.clear()
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        await self.upstream.disconnect()
+
+    async def _broadcast(self, frame: bytes):
+        """上游一帧广播给所有下游客户端（同一对象，不逐客户端复制）"""
+        self.frames_broadcast += 1
+        for client in tuple(self._clients):
+            client.transport.write(frame)
+
+    def _enqueue_upstream(self, frames):
+        """下游完整帧排队等待写入上游"""
+        pending = self._pending
+        for frame in frames:
+            if len(pending) == pending.maxlen:
+                self.frames_dropped += 1
+            pending.append(frame)
+        self._pending_event.set()
+
+    async def _write_upstream(self):
+        """单一写任务：把排队的完整帧批量写入上游，保证帧不交错"""
+        pending = self._pending
+        while True:
+            await self._pending_event.wait()
+            self._pending_event.clear()
+            while pending:
+                frames = list(pending)
+                pending.clear()
+                if await self.upstream.send_many(frames):
+                    self.frames_forwarded += len(frames)
+                else:
+                    self.frames_dropped += len(frames)
+
+    @property
+    def stats(self):
+        """代理统计"""
+        return {
+            'clients': len(self._clients),
+            'clients_dropped': self.clients_dropped,
+            'frames_broadcast': self.frames_broadcast,
+            'frames_forwarded': self.frames_forwarded,
+            'frames_dropped': self.frames_dropped,
+            'upstream_connected': self.upstream.connected,
+        }
+
+
+def _parse_frame_lengths(values) -> Optional[Dict[int, int]]:
+    """解析 --frame C7:20 形式的帧长参数"""
+    if not values:
+        return None
+    lengths = {}
+    for value in values:
+        header, length = value.split(":")
+        lengths[int(header, 16)] = int(length)
+    return lengths
+
+
+def _parse_address(value: str, default_host: str):
+    host, _, port = value.rpartition(":")
+    return host or default_host, int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="485-TCP 本地转发代理")
+    parser.add_argument("--upstream", required=True, help="网关地址 host:port")
+    parser.add_argument("--listen", default="0.0.0.0:8899", help="本地监听地址 host:port")
+    parser.add_argument("--frame", action="append", help="上游帧长，如 C7:20（可重复）")
+    parser.add_argument("--down-frame", action="append", help="下游帧长，如 AD:7（可重复）")
+    parser.add_argument("--client-buffer", type=int, default=64 * 1024, help="每个客户端发送缓冲上限(字节)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        upstream_host, upstream_port = _parse_address(args.upstream, "127.0.0.1")
+        listen_host, listen_port = _parse_address(args.listen, "0.0.0.0")
+        proxy = Tcp485Proxy(upstream_host, upstream_port, listen_host, listen_port,
+                            frame_lengths=_parse_frame_lengths(args.frame),
+                            downstream_frame_lengths=_parse_frame_lengths(args.down_frame),
+                            client_buffer=args.client_buffer)
+        await proxy.start()
+        try:
+            while True:
+                await asyncio.sleep(60)
+                _LOGGER.info(f"代理统计: {proxy.stats}")
+        finally:
+            await proxy.stop()
+
+    asyncio.run(main())
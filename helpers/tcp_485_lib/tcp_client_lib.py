@@ -3,23 +3,47 @@
 
 import asyncio
 import logging
-from typing import Optional, Callable, Union, Dict, Any, AsyncGenerator, Tuple
-from asyncio import StreamReader, StreamWriter, Queue
-from datetime import datetime
+import socket
+import time
+from typing import Optional, Callable, Coroutine, Union, Dict, Any, AsyncGenerator, Iterable, Set, Tuple
+from asyncio import StreamReader, StreamWriter
 from .tool import DataConverter
+from .framing import create_decoder
+from .capture import CaptureWriter, DIRECTION_RX, DIRECTION_TX
+from .inbound import InboundQueue, CollapseKey
 
 _LOGGER = logging.getLogger(__name__)
 
+# 后台任务工厂: (协程, 任务名) -> Task
+TaskFactory = Callable[[Coroutine[Any, Any, Any], str], asyncio.Task]
+
 
 class Tcp485Client:
     """485-TCP通信客户端库"""
     
+    # 固定属性集合，大量连接时减少每个实例的内存占用
+    __slots__ = (
+        'host', 'port', 'data_mode', 'tcp_keepalive', 'keepalive_interval', '_keepalive_task',
+        'tcp_nodelay', 'write_high_water', 'write_low_water',
+        'reader', 'writer', 'connected', 'lock', 'data_callback', 'reconnect_task', 'receive_task',
+        'data_queue', '_enable_iterator', '_frame_decoder', '_capture', 'arrival_callback',
+        'messages_sent', 'messages_received', 'bytes_sent', 'bytes_received', 'keepalive_pings',
+        'connection_time', 'last_activity', '_task_factory', '_tasks', '_closing',
+    )
+    
     def __init__(self, 
                  host: str, 
                  port: int = 80, 
                  data_mode: str = "hex",
                  tcp_keepalive: bool = True,
-                 keepalive_interval: float = 30.0):
+                 keepalive_interval: float = 30.0,
+                 frame_lengths: Optional[Dict[int, int]] = None,
+                 queue_size: int = 100,
+                 collapse_key: Optional[CollapseKey] = None,
+                 tcp_nodelay: bool = True,
+                 write_high_water: Optional[int] = None,
+                 write_low_water: Optional[int] = None,
+                 task_factory: Optional[TaskFactory] = None):
         """初始化485-TCP客户端
         
         Args:
@@ -28,6 +52,13 @@ class Tcp485Client:
             data_mode: 数据模式 "hex" 或 "bytes" (默认hex)
             tcp_keepalive: 是否启用TCP保活 (默认True)
             keepalive_interval: TCP保活间隔(秒) (默认30秒)
+            frame_lengths: 帧长表 {包头字节: 帧长}，提供时按完整帧输出 (默认按原始数据块)
+            queue_size: 接收队列上限 (默认100)
+            collapse_key: 接收队列合并键函数，同一键只保留最新一帧 (默认不合并，全部先进先出)
+            tcp_nodelay: 是否关闭Nagle算法，小帧立即发出 (默认True)
+            write_high_water: 发送缓冲高水位(字节)，超过时 drain() 等待 (默认使用asyncio默认值)
+            write_low_water: 发送缓冲低水位(字节)，降到此值以下时 drain() 返回
+            task_factory: 创建后台任务的函数 (协程, 任务名) -> Task，由宿主管理任务归属 (默认 asyncio.create_task)
         """
         self.host = host
         self.port = port
@@ -38,6 +69,11 @@ class Tcp485Client:
         self.keepalive_interval = keepalive_interval
         self._keepalive_task: Optional[asyncio.Task] = None
         
+        # 发送调优
+        self.tcp_nodelay = tcp_nodelay
+        self.write_high_water = write_high_water
+        self.write_low_water = write_low_water
+        
         # TCP连接相关
         self.reader: Optional[StreamReader] = None
         self.writer: Optional[StreamWriter] = None
@@ -48,21 +84,30 @@ class Tcp485Client:
         self.data_callback: Optional[Callable] = None
         self.reconnect_task: Optional[asyncio.Task] = None
         self.receive_task: Optional[asyncio.Task] = None
+        # 本客户端创建的所有后台任务（接收、保活、重连），断开时统一取消并等待结束
+        self._task_factory = task_factory
+        self._tasks: Set[asyncio.Task] = set()
+        # 正在或已经主动断开，不再自动重连
+        self._closing = False
         
-        # 异步迭代器支持
-        self.data_queue: Queue = Queue(maxsize=100)
+        # 异步迭代器支持（队列中只存放原始帧bytes，十六进制在取出时按需转换）
+        self.data_queue = InboundQueue(queue_size, collapse_key)
         self._enable_iterator = True
         
-        # 统计信息
-        self.stats = {
-            'messages_sent': 0,
-            'messages_received': 0,
-            'bytes_sent': 0,
-            'bytes_received': 0,
-            'keepalive_pings': 0,
-            'connection_time': None,
-            'last_activity': None
-        }
+        # 帧解析和抓包
+        self._frame_decoder = create_decoder(frame_lengths)
+        self._capture: Optional[CaptureWriter] = None
+        # 每帧到达时（进入队列前）同步调用 (帧, loop.time() 到达时间)，用于不含排队和处理耗时的时延测量
+        self.arrival_callback: Optional[Callable[[bytes, float], None]] = None
+        
+        # 统计信息（整数计数器，时间为 time.monotonic() 秒数）
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.keepalive_pings = 0
+        self.connection_time: Optional[float] = None
+        self.last_activity: Optional[float] = None
         
         _LOGGER.info(f"初始化TCP客户端: {host}:{port}, 数据模式: {data_mode}, TCP保活: {tcp_keepalive}")
     
@@ -76,19 +121,22 @@ class Tcp485Client:
                 timeout=timeout
             )
             
+            self._tune_transport()
+            self._closing = False
             self.connected = True
-            self.stats['connection_time'] = datetime.now()
-            self.stats['last_activity'] = datetime.now()
+            if self._frame_decoder:
+                self._frame_decoder.reset()
+            self.connection_time = self.last_activity = time.monotonic()
             
             _LOGGER.info(f"成功连接到 {self.host}:{self.port}")
             
             # 启动数据接收任务
             if self.receive_task is None or self.receive_task.done():
-                self.receive_task = asyncio.create_task(self._receive_data())
+                self.receive_task = self._spawn(self._receive_data(), "receive")
             
             # 启动TCP保活任务
             if self.tcp_keepalive and (self._keepalive_task is None or self._keepalive_task.done()):
-                self._keepalive_task = asyncio.create_task(self._tcp_keepalive_loop())
+                self._keepalive_task = self._spawn(self._tcp_keepalive_loop(), "keepalive")
             
             return True
             
@@ -97,33 +145,40 @@ class Tcp485Client:
             self.connected = False
             return False
     
+    def _tune_transport(self):
+        """设置 TCP_NODELAY 和发送缓冲水位"""
+        sock = self.writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if self.tcp_nodelay else 0)
+            except OSError as e:
+                _LOGGER.debug(f"设置TCP_NODELAY失败: {e}")
+        if self.write_high_water is not None or self.write_low_water is not None:
+            self.writer.transport.set_write_buffer_limits(high=self.write_high_water, low=self.write_low_water)
+    
+    def _spawn(self, coro, name: str) -> asyncio.Task:
+        """创建并登记一个后台任务"""
+        name = f"tcp485 {name} {self.host}:{self.port}"
+        if self._task_factory is not None:
+            task = self._task_factory(coro, name)
+        else:
+            task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+    
     async def disconnect(self):
-        """断开连接"""
+        """断开连接：取消并等待本客户端的全部后台任务，不再自动重连"""
+        self._closing = True
         self.connected = False
         
-        # 取消TCP保活任务
-        if self._keepalive_task and not self._keepalive_task.done():
-            self._keepalive_task.cancel()
-            try:
-                await self._keepalive_task
-            except asyncio.CancelledError:
-                pass
-        
-        # 取消接收任务
-        if self.receive_task and not self.receive_task.done():
-            self.receive_task.cancel()
-            try:
-                await self.receive_task
-            except asyncio.CancelledError:
-                pass
-        
-        # 取消重连任务
-        if self.reconnect_task and not self.reconnect_task.done():
-            self.reconnect_task.cancel()
-            try:
-                await self.reconnect_task
-            except asyncio.CancelledError:
-                pass
+        # 取消接收、保活和重连任务（断开可能由其中的任务发起，跳过当前任务）
+        current = asyncio.current_task()
+        tasks = [task for task in self._tasks if task is not current and not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
         
         # 关闭连接
         if self.writer:
@@ -136,43 +191,90 @@ class Tcp485Client:
                 self.writer = None
                 self.reader = None
         
+        await self.stop_capture()
+        
         _LOGGER.info("已断开TCP连接")
     
     async def send_data(self, data: Union[str, bytes]) -> bool:
         """发送数据 - 支持hex字符串或bytes"""
+        return await self.send_many((data,))
+    
+    async def send_many(self, frames: Iterable[Union[str, bytes]]) -> bool:
+        """批量发送多帧 - 一次 writelines 写入，只等待一次 drain
+        
+        Args:
+            frames: hex字符串或bytes组成的帧序列
+        """
+        # 在锁外完成格式转换
+        tcp_frames = [DataConverter.hex_to_tcp(frame) if isinstance(frame, str) else frame for frame in frames]
+        if not tcp_frames:
+            return True
+        
         async with self.lock:
             if not self.connected or not self.writer:
                 _LOGGER.error("TCP连接未建立，无法发送数据")
                 return False
             
             try:
-                # 根据数据类型转换数据
-                if isinstance(data, str):
-                    tcp_data = DataConverter.hex_to_tcp(data)
-                else:
-                    tcp_data = data
-                
-                self.writer.write(tcp_data)
+                self.writer.writelines(tcp_frames)
                 await self.writer.drain()
                 
+                if self._capture:
+                    for frame in tcp_frames:
+                        self._capture.write(DIRECTION_TX, frame)
+                
                 # 更新统计
-                self.stats['messages_sent'] += 1
-                self.stats['bytes_sent'] += len(tcp_data)
-                self.stats['last_activity'] = datetime.now()
+                self.messages_sent += len(tcp_frames)
+                self.bytes_sent += sum(len(frame) for frame in tcp_frames)
+                self.last_activity = time.monotonic()
                 
-                if self.data_mode == "hex":
-                    _LOGGER.debug(f"发送数据: {DataConverter.tcp_to_hex(tcp_data)}")
-                else:
-                    _LOGGER.debug(f"发送数据: {tcp_data}")
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    for frame in tcp_frames:
+                        _LOGGER.debug(f"发送数据: {DataConverter.tcp_to_hex(frame)}")
                 
                 return True
                 
             except Exception as e:
                 _LOGGER.error(f"发送数据失败: {e}")
                 self.connected = False
-                asyncio.create_task(self._reconnect())
+                self._reconnect()
                 return False
     
+    async def start_capture(self, path: str, flush_interval: float = 1.0):
+        """开始将收发数据写入抓包文件（打开文件和写入均不阻塞事件循环）
+        
+        抓包随本客户端断开而停止；需要跨重连持续抓包时由调用方持有写入器并用 attach_capture 挂接。
+        
+        Args:
+            path: 抓包文件路径（已存在时追加）
+            flush_interval: 刷新到磁盘的间隔(秒)
+        """
+        if self._capture:
+            _LOGGER.warning(f"抓包已在进行中: {self._capture.path}")
+            return
+        capture = CaptureWriter(path, flush_interval)
+        await capture.async_start()
+        self._capture = capture
+    
+    def attach_capture(self, capture: Optional[CaptureWriter]) -> Optional[CaptureWriter]:
+        """挂接（None 为摘除）由调用方持有的抓包写入器，返回原来的写入器
+        
+        摘除的写入器不会被关闭，可挂接到重连后新建的客户端上继续写入同一文件。
+        """
+        previous, self._capture = self._capture, capture
+        return previous
+    
+    async def stop_capture(self):
+        """停止抓包，在执行器中等待剩余记录写完"""
+        capture, self._capture = self._capture, None
+        if capture:
+            await asyncio.get_running_loop().run_in_executor(None, capture.close)
+    
+    @property
+    def capturing(self) -> bool:
+        """是否正在抓包"""
+        return self._capture is not None
+    
     async def send_hex(self, hex_string: str) -> bool:
         """发送十六进制字符串"""
         return await self.send_data(hex_string)
@@ -196,13 +298,13 @@ class Tcp485Client:
                         # 发送一个空字节来保持TCP连接活跃
                         self.writer.write(b'')
                         await self.writer.drain()
-                        self.stats['keepalive_pings'] += 1
-                        _LOGGER.debug(f"TCP保活包已发送 #{self.stats['keepalive_pings']}")
+                        self.keepalive_pings += 1
+                        _LOGGER.debug(f"TCP保活包已发送 #{self.keepalive_pings}")
                 except Exception as e:
                     _LOGGER.warning(f"TCP保活包发送失败: {e}")
                     # 保活失败可能表示连接已断开
                     self.connected = False
-                    asyncio.create_task(self._reconnect())
+                    self._reconnect()
                     break
                 
             except asyncio.CancelledError:
@@ -212,22 +314,28 @@ class Tcp485Client:
                 break
     
     def enable_tcp_keepalive(self, enabled: bool = True):
-        """启用或禁用TCP保活
+        """启用或禁用TCP保活（已连接时立即启动或停止保活循环）
         
         Args:
             enabled: True启用TCP保活，False禁用
         """
         self.tcp_keepalive = enabled
-        if not enabled and self._keepalive_task and not self._keepalive_task.done():
-            self._keepalive_task.cancel()
+        if not enabled:
+            if self._keepalive_task and not self._keepalive_task.done():
+                self._keepalive_task.cancel()
+        elif self.connected and (self._keepalive_task is None or self._keepalive_task.done()):
+            self._keepalive_task = self._spawn(self._tcp_keepalive_loop(), "keepalive")
     
     def set_keepalive_interval(self, interval: float):
-        """设置TCP保活间隔
+        """设置TCP保活间隔（保活循环正在等待时按新间隔重新开始）
         
         Args:
             interval: 保活间隔(秒)
         """
         self.keepalive_interval = interval
+        if self._keepalive_task and not self._keepalive_task.done():
+            self._keepalive_task.cancel()
+            self._keepalive_task = self._spawn(self._tcp_keepalive_loop(), "keepalive")
         _LOGGER.info(f"TCP保活间隔已更新: {interval}s")
     
     async def listen(self) -> AsyncGenerator[Union[str, bytes], None]:
@@ -242,12 +350,12 @@ class Tcp485Client:
             try:
                 if self._enable_iterator:
                     # 从队列获取数据
-                    hex_data, raw_data = await asyncio.wait_for(
+                    raw_data = await asyncio.wait_for(
                         self.data_queue.get(), timeout=1.0
                     )
                     
                     if self.data_mode == "hex":
-                        yield hex_data
+                        yield DataConverter.tcp_to_hex(raw_data)
                     else:
                         yield raw_data
                 else:
@@ -270,14 +378,11 @@ class Tcp485Client:
         self._enable_iterator = enabled
         if not enabled:
             # 清空队列
-            while not self.data_queue.empty():
-                try:
-                    self.data_queue.get_nowait()
-                except:
-                    break
+            self.data_queue.clear()
     
     async def _receive_data(self):
         """持续接收数据的任务"""
+        loop = asyncio.get_running_loop()
         while self.connected and self.reader:
             try:
                 data = await self.reader.read(1024)
@@ -285,40 +390,18 @@ class Tcp485Client:
                     _LOGGER.warning("接收到空数据，连接可能已断开")
                     self.connected = False
                     break
+                arrived = loop.time()
                 
-                # 更新统计
-                self.stats['messages_received'] += 1
-                self.stats['bytes_received'] += len(data)
-                self.stats['last_activity'] = datetime.now()
-                
-                hex_data = DataConverter.tcp_to_hex(data)
+                # 按帧拆分（未配置帧长表时整块作为一条消息）
+                frames = self._frame_decoder.feed(data) if self._frame_decoder else (data,)
                 
-                if self.data_mode == "hex":
-                    _LOGGER.debug(f"接收数据: {hex_data}")
-                else:
-                    _LOGGER.debug(f"接收数据: {data}")
-                
-                # 如果启用迭代器，添加到队列中
-                if self._enable_iterator:
-                    try:
-                        self.data_queue.put_nowait((hex_data, data))
-                    except asyncio.QueueFull:
-                        # 队列满时，移除最旧的数据
-                        try:
-                            self.data_queue.get_nowait()
-                            self.data_queue.put_nowait((hex_data, data))
-                        except:
-                            pass
-                
-                # 调用数据回调（向后兼容）
-                if self.data_callback:
-                    try:
-                        if self.data_mode == "hex":
-                            await self.data_callback(hex_data, data)
-                        else:
-                            await self.data_callback(data)
-                    except Exception as e:
-                        _LOGGER.error(f"数据回调处理失败: {e}")
+                for frame in frames:
+                    # 每帧一条抓包记录，便于离线按列分析
+                    if self._capture:
+                        self._capture.write(DIRECTION_RX, frame)
+                    if self.arrival_callback:
+                        self.arrival_callback(frame, arrived)
+                    await self._dispatch_frame(frame)
                         
             except asyncio.CancelledError:
                 break
@@ -329,14 +412,38 @@ class Tcp485Client:
         
         # 连接断开时尝试重连
         if not self.connected:
-            asyncio.create_task(self._reconnect())
+            self._reconnect()
+    
+    async def _dispatch_frame(self, frame: bytes):
+        """将一帧数据放入迭代器队列并调用回调"""
+        # 更新统计
+        self.messages_received += 1
+        self.bytes_received += len(frame)
+        self.last_activity = time.monotonic()
+        
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"接收数据: {DataConverter.tcp_to_hex(frame)}")
+        
+        # 如果启用迭代器，添加到队列中（状态帧按键合并，其余帧满时丢弃最旧，均有计数）
+        if self._enable_iterator:
+            self.data_queue.put_nowait(frame)
+        
+        # 调用数据回调（向后兼容）
+        if self.data_callback:
+            try:
+                if self.data_mode == "hex":
+                    await self.data_callback(DataConverter.tcp_to_hex(frame), frame)
+                else:
+                    await self.data_callback(frame)
+            except Exception as e:
+                _LOGGER.error(f"数据回调处理失败: {e}")
     
-    async def _reconnect(self):
-        """自动重连"""
-        if self.reconnect_task and not self.reconnect_task.done():
+    def _reconnect(self):
+        """自动重连（主动断开后不再重连）"""
+        if self._closing or (self.reconnect_task and not self.reconnect_task.done()):
             return
         
-        self.reconnect_task = asyncio.create_task(self._do_reconnect())
+        self.reconnect_task = self._spawn(self._do_reconnect(), "reconnect")
     
     async def _do_reconnect(self):
         """执行重连逻辑"""
@@ -370,10 +477,28 @@ class Tcp485Client:
             'port': self.port,
             'data_mode': self.data_mode,
             'connected': self.connected,
+            'tcp_nodelay': self.tcp_nodelay,
+            'write_buffer_size': self.writer.transport.get_write_buffer_size() if self.writer else 0,
             'tcp_keepalive': self.tcp_keepalive,
             'keepalive_interval': self.keepalive_interval,
-            'keepalive_pings': self.stats['keepalive_pings'],
-            'stats': self.stats.copy()
+            'keepalive_pings': self.keepalive_pings,
+            'stats': self.stats
+        }
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """统计信息快照（按需生成）"""
+        return {
+            'messages_sent': self.messages_sent,
+            'messages_received': self.messages_received,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'keepalive_pings': self.keepalive_pings,
+            'frames_dropped': self.data_queue.dropped,
+            'frames_collapsed': self.data_queue.collapsed,
+            'queue_depth': self.data_queue.qsize(),
+            'connection_time': self.connection_time,
+            'last_activity': self.last_activity
         }
     
     @property
@@ -392,7 +517,14 @@ def create_client(host: str,
                  port: int = 80, 
                  data_mode: str = "hex",
                  tcp_keepalive: bool = True,
-                 keepalive_interval: float = 30.0) -> Tcp485Client:
+                 keepalive_interval: float = 30.0,
+                 frame_lengths: Optional[Dict[int, int]] = None,
+                 queue_size: int = 100,
+                 collapse_key: Optional[CollapseKey] = None,
+                 tcp_nodelay: bool = True,
+                 write_high_water: Optional[int] = None,
+                 write_low_water: Optional[int] = None,
+                 task_factory: Optional[TaskFactory] = None) -> Tcp485Client:
     """创建TCP客户端的便捷函数
     
     Args:
@@ -401,5 +533,14 @@ def create_client(host: str,
         data_mode: 数据模式 "hex" 或 "bytes" (默认hex)
         tcp_keepalive: 是否启用TCP保活 (默认True)
         keepalive_interval: TCP保活间隔(秒) (默认30秒)
+        frame_lengths: 帧长表 {包头字节: 帧长}，提供时按完整帧输出
+        queue_size: 接收队列上限
+        collapse_key: 接收队列合并键函数，同一键只保留最新一帧
+        tcp_nodelay: 是否关闭Nagle算法
+        write_high_water: 发送缓冲高水位(字节)
+        write_low_water: 发送缓冲低水位(字节)
+        task_factory: 创建后台任务的函数 (协程, 任务名) -> Task
     """
-    return Tcp485Client(host, port, data_mode, tcp_keepalive, keepalive_interval) 
\ No newline at end of file
+    return Tcp485Client(host, port, data_mode, tcp_keepalive, keepalive_interval, frame_lengths,
+                        queue_size, collapse_key, tcp_nodelay, write_high_water, write_low_water,
+                        task_factory) 
\ No newline at end of file
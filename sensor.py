@@ -0,0 +1,163 @@
+"""MIYA HRV Sensor 平台."""
+from datetime import timedelta
+
+from .helpers.common_imports import (
+    time, Any, Optional,
+    SensorEntity, SensorDeviceClass, SensorStateClass, EntityCategory,
+    ConfigEntry, PERCENTAGE, UnitOfTime,
+    HomeAssistant, AddEntitiesCallback,
+    _LOGGER
+)
+
+from .const import (
+    DOMAIN,
+    ENTITY_TYPE_SENSOR,
+    FILTER_LIFE_HOURS,
+)
+
+# 导入辅助函数
+from .helpers.ha_utils import MiyaHRVManager, generate_entity_id
+from .entity import MiyaHRVEntity
+from .helpers.protocal import FAN_LEVELS
+
+# 运行时长读取内存中的累计器（O(1)），按分钟刷新显示当前尚未结算的计时
+SCAN_INTERVAL = timedelta(minutes=1)
+
+# 运行时长传感器: (累计项, 图标)
+RUNTIME_SENSORS = [
+    *((f"fan_level_{level}", "mdi:fan-clock") for level in FAN_LEVELS),
+    ("auxiliary_heat", "mdi:fire"),
+    ("UV_sterilization", "mdi:lightbulb"),
+]
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """设置MIYA HRV Sensor平台."""
+    manager: MiyaHRVManager = hass.data[DOMAIN][config_entry.entry_id]
+
+    sensors = [
+        MiyaHRVRuntimeSensor(
+            manager=manager,
+            runtime_key=runtime_key,
+            unique_id=generate_entity_id(config_entry.entry_id, ENTITY_TYPE_SENSOR, f"{runtime_key.lower()}_hours"),
+            icon=icon,
+        )
+        for runtime_key, icon in RUNTIME_SENSORS
+    ]
+    sensors.append(
+        MiyaHRVFilterLifeSensor(
+            manager=manager,
+            unique_id=generate_entity_id(config_entry.entry_id, ENTITY_TYPE_SENSOR, "filter_life"),
+        )
+    )
+    sensors.append(
+        MiyaHRVBusUtilisationSensor(
+            manager=manager,
+            unique_id=generate_entity_id(config_entry.entry_id, ENTITY_TYPE_SENSOR, "bus_utilisation"),
+        )
+    )
+
+    async_add_entities(sensors)
+
+
+class MiyaHRVSensorBase(MiyaHRVEntity, SensorEntity):
+    """MIYA HRV 统计类传感器基类（按 SCAN_INTERVAL 定时刷新）."""
+
+    _attr_should_poll = True
+
+    def __init__(self, manager: MiyaHRVManager, unique_id: str):
+        """初始化Sensor实体."""
+        super().__init__(manager)
+        self._attr_unique_id = unique_id
+
+    def _hours(self, runtime_key: str) -> float:
+        """累计项的小时数（含当前尚未结算的计时）."""
+        return self._manager.runtime.value(runtime_key, time.monotonic()) / 3600
+
+
+class MiyaHRVRuntimeSensor(MiyaHRVSensorBase):
+    """某档风速/辅热/UV杀菌的累计运行小时数."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_unit_of_measurement = UnitOfTime.HOURS
+    _attr_suggested_display_precision = 1
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, manager: MiyaHRVManager, runtime_key: str, unique_id: str, icon: str):
+        """初始化运行时长传感器."""
+        super().__init__(manager, unique_id)
+        self._runtime_key = runtime_key
+        self._attr_icon = icon
+        self._attr_name = f"MIYA HRV {runtime_key.replace('_', ' ').title()} Hours"
+
+    @property
+    def native_value(self) -> float:
+        """返回累计运行小时数（0.1小时分辨率，运行中约每6分钟产生一条记录）."""
+        return round(self._hours(self._runtime_key), 1)
+
+
+class MiyaHRVFilterLifeSensor(MiyaHRVSensorBase):
+    """滤网剩余寿命（按开机小时数估算）."""
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_icon = "mdi:air-filter"
+    _unrecorded_attributes = frozenset({"filter_life_hours"})
+
+    def __init__(self, manager: MiyaHRVManager, unique_id: str):
+        """初始化滤网寿命传感器."""
+        super().__init__(manager, unique_id)
+        self._attr_name = "MIYA HRV Filter Life"
+
+    @property
+    def native_value(self) -> int:
+        """返回滤网剩余寿命百分比."""
+        used = self._hours("filter") / FILTER_LIFE_HOURS
+        return max(0, round(100 * (1 - used)))
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """返回滤网已用小时数和额定小时数."""
+        return {
+            "filter_hours": int(self._hours("filter")),
+            "filter_life_hours": FILTER_LIFE_HOURS,
+        }
+
+
+class MiyaHRVBusUtilisationSensor(MiyaHRVSensorBase):
+    """本设备占用所在485总线的份额（与本设备收发的字节按波特率折算）.
+
+    同一网关上各设备的份额之和为总线利用率，整条总线的利用率作为属性给出.
+    """
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_suggested_display_precision = 1
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:gauge"
+    _unrecorded_attributes = frozenset({"baud_rate", "target", "bus_utilisation"})
+
+    def __init__(self, manager: MiyaHRVManager, unique_id: str):
+        """初始化总线利用率传感器."""
+        super().__init__(manager, unique_id)
+        self._attr_name = "MIYA HRV Bus Utilisation"
+
+    @property
+    def native_value(self) -> float:
+        """返回最近约一分钟本设备占用总线的百分比."""
+        return round(self._manager.gateway.bus.unit_utilisation(self._manager.address) * 100, 1)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """返回波特率、整条总线的利用率和轮询的目标利用率."""
+        bus = self._manager.gateway.bus
+        return {
+            "baud_rate": bus.baud_rate,
+            "bus_utilisation": round(bus.utilisation() * 100, 1),
+            "target": round(bus.target * 100),
+        }
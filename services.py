@@ -0,0 +1,197 @@
+"""MIYA HRV 服务."""
+import time
+
+import voluptuous as vol
+
+import homeassistant.helpers.config_validation as cv
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import entity_registry as er
+
+from .helpers.common_imports import (
+    asyncio, Dict, List,
+    HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse,
+    _LOGGER
+)
+from .helpers.config_input import command_set_dict
+from .helpers.gateway import gateway_key
+from .helpers.profiler import PROFILE_MODES, LoopProfiler
+from .helpers.protocal import control_frame
+from .const import DOMAIN
+
+SERVICE_GROUP_CONTROL = "group_control"
+SERVICE_RESET_FILTER = "reset_filter"
+SERVICE_PROFILE = "profile"
+
+ATTR_COMMAND = "command"
+ATTR_BROADCAST = "broadcast"
+ATTR_WINDOW = "window"
+ATTR_TIMEOUT = "timeout"
+ATTR_FORCE = "force"
+ATTR_DURATION = "duration"
+ATTR_MODE = "mode"
+
+# 可批量下发的控制命令（状态查询除外）
+GROUP_COMMANDS = [name for name in command_set_dict["command_fixed"] if name != "设备状态查询"]
+
+GROUP_CONTROL_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_COMMAND): vol.In(GROUP_COMMANDS),
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(ATTR_BROADCAST, default=True): cv.boolean,
+        vol.Optional(ATTR_WINDOW, default=1): vol.All(vol.Coerce(int), vol.Range(min=1, max=16)),
+        vol.Optional(ATTR_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=30)),
+        vol.Optional(ATTR_FORCE, default=False): cv.boolean,
+    }
+)
+
+
+def _resolve_managers(hass: HomeAssistant, entity_ids) -> List:
+    """根据实体ID找到对应设备的管理器，未指定实体时返回全部设备."""
+    domain_data = hass.data.get(DOMAIN, {})
+    if not entity_ids:
+        entry_ids = list(domain_data)
+    else:
+        registry = er.async_get(hass)
+        entry_ids = []
+        for entity_id in entity_ids:
+            entry = registry.async_get(entity_id)
+            if entry and entry.platform == DOMAIN and entry.config_entry_id not in entry_ids:
+                entry_ids.append(entry.config_entry_id)
+            elif not entry or entry.platform != DOMAIN:
+                _LOGGER.warning(f"忽略非MIYA HRV实体: {entity_id}")
+    return [domain_data[entry_id] for entry_id in entry_ids if entry_id in domain_data]
+
+# 清零不可撤销，必须指定设备（不提供"全部设备"的默认值）
+RESET_FILTER_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): vol.All(cv.entity_ids, vol.Length(min=1)),
+    }
+)
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=30): vol.All(vol.Coerce(float), vol.Range(min=1, max=600)),
+        vol.Optional(ATTR_MODE, default="timing"): vol.In(PROFILE_MODES),
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """注册集成服务（多个配置条目共用，只注册一次）."""
+    if hass.services.has_service(DOMAIN, SERVICE_GROUP_CONTROL):
+        return
+
+    async def async_group_control(call: ServiceCall) -> ServiceResponse:
+        """批量控制：按网关分组，各网关并行下发."""
+        command = call.data[ATTR_COMMAND]
+        window = call.data[ATTR_WINDOW]
+        timeout = call.data.get(ATTR_TIMEOUT)
+
+        # 已确认处于目标状态的设备跳过（force 时全部发送）
+        groups: Dict = {}
+        suppressed = 0
+        # 熔断中的设备不占用总线等待应答，按网关记录（仍可包含在地址0广播中）
+        tripped: Dict = {}
+        for manager in _resolve_managers(hass, call.data.get(ATTR_ENTITY_ID)):
+            if not call.data[ATTR_FORCE] and manager.command_is_redundant(command):
+                suppressed += 1
+                continue
+            if not manager.breaker.closed:
+                tripped.setdefault(manager.gateway, []).append(manager.address)
+                continue
+            groups.setdefault(manager.gateway, []).append(manager.address)
+
+        async def drive(gateway, addresses):
+            # 网关上所有已配置设备都是目标时使用地址0广播，否则逐地址连续发送
+            targets = set(addresses).union(tripped.get(gateway, ()))
+            if call.data[ATTR_BROADCAST] and targets == set(gateway.managers):
+                return gateway, True, await gateway.broadcast(
+                    control_frame(command, 0), addresses, window, timeout
+                )
+            frames = {address: control_frame(command, address) for address in addresses}
+            return gateway, False, await gateway.send_group(frames, window, timeout)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(*(drive(gateway, addresses) for gateway, addresses in groups.items()))
+        elapsed = loop.time() - started
+
+        acked = sum(ok for _, _, acks in results for ok in acks.values())
+        total = sum(len(acks) for _, _, acks in results)
+        _LOGGER.info(f"📡 批量控制 {command}: {len(groups)} 个网关, {acked}/{total} 台设备应答, "
+                     f"{suppressed} 台已是目标状态, {sum(map(len, tripped.values()))} 台熔断中, 用时 {elapsed:.2f}s")
+
+        if not call.return_response:
+            return None
+        return {
+            "command": command,
+            "elapsed": round(elapsed, 3),
+            "acked": acked,
+            "total": total,
+            "suppressed": suppressed,
+            "tripped": sum(map(len, tripped.values())),
+            "gateways": {
+                gateway_key(gateway.host, gateway.port): {
+                    "broadcast": broadcast,
+                    "units": {f"{address:02X}": ok for address, ok in acks.items()},
+                }
+                for gateway, broadcast, acks in results
+            },
+        }
+
+    async def async_reset_filter(call: ServiceCall) -> None:
+        """更换滤网后清零指定设备的滤网使用时长."""
+        for manager in _resolve_managers(hass, call.data[ATTR_ENTITY_ID]):
+            manager.reset_runtime("filter")
+            _LOGGER.info(f"🧹 已清零滤网使用时长: 设备 {manager.address:02X}")
+
+    async def async_profile(call: ServiceCall) -> ServiceResponse:
+        """统计集成在事件循环上的占用，写入统计文件并返回按网关/设备的汇总."""
+        profiler = LoopProfiler(call.data[ATTR_MODE])
+        try:
+            profiler.start()
+        except RuntimeError as e:
+            raise HomeAssistantError(str(e)) from e
+        _LOGGER.info(f"⏱️ 开始分析事件循环占用: {call.data[ATTR_MODE]}, {call.data[ATTR_DURATION]:.0f}s")
+        try:
+            await asyncio.sleep(call.data[ATTR_DURATION])
+        finally:
+            profiler.stop()
+
+        path = hass.config.path(f"{DOMAIN}_profile_{time.strftime('%Y%m%d_%H%M%S')}")
+        path = await hass.async_add_executor_job(profiler.write, path)
+        summary = profiler.summary()
+        _LOGGER.info(f"⏱️ 事件循环占用 {summary['loop_ms']:.1f}ms / {summary['duration_s']:.0f}s "
+                     f"({summary['loop_share']:.4%})，统计文件: {path}")
+        if not call.return_response:
+            return None
+        return {'file': path, **summary}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GROUP_CONTROL,
+        async_group_control,
+        schema=GROUP_CONTROL_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RESET_FILTER,
+        async_reset_filter,
+        schema=RESET_FILTER_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        async_profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """最后一个配置条目卸载时移除服务."""
+    hass.services.async_remove(DOMAIN, SERVICE_GROUP_CONTROL)
+    hass.services.async_remove(DOMAIN, SERVICE_RESET_FILTER)
+    hass.services.async_remove(DOMAIN, SERVICE_PROFILE)
@@ -1,8 +1,8 @@
 """MIYA HRV Switch 平台."""
 from .helpers.common_imports import (
     logging, Any, List,
-    SwitchEntity, HVACMode, ConfigEntry, CONF_NAME,
-    HomeAssistant, AddEntitiesCallback, ConfigType, DiscoveryInfoType,
+    SwitchEntity, RestoreEntity, HVACMode, ConfigEntry, CONF_NAME,
+    HomeAssistant, callback, AddEntitiesCallback, ConfigType, DiscoveryInfoType,
     _LOGGER
 )
 
@@ -13,7 +13,8 @@ from .const import (
 )
 
 # 导入辅助函数
-from .helpers.ha_utils import get_device_status, send_device_command, get_commands, generate_entity_id
+from .helpers.ha_utils import MiyaHRVManager, generate_entity_id
+from .entity import MiyaHRVEntity
 
 # 支持的开关功能
 SWITCH_FUNCTIONS = [
@@ -25,6 +26,16 @@ SWITCH_FUNCTIONS = [
     ("sleep_mode", "mdi:bed"),
 ]
 
+# 开关功能对应的状态字典键名
+STATUS_KEYS = {
+    "negative_ion": "negative_ion",
+    "uv_sterilization": "UV_sterilization",
+    "sleep_mode": "sleep_mode",
+    "inner_cycle": "inner_cycle",
+    "auxiliary_heat": "auxiliary_heat",
+    "bypass": "bypass",
+}
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -32,52 +43,36 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """设置MIYA HRV Switch平台."""
-    device_data = hass.data[DOMAIN][config_entry.entry_id]
-    device = device_data['device']
+    manager: MiyaHRVManager = hass.data[DOMAIN][config_entry.entry_id]
     
     # 创建Switch实体
     switches = []
     for function_id, icon in SWITCH_FUNCTIONS:
         switch_entity = MiyaHRVSwitch(
-            device=device,
+            manager=manager,
             function_id=function_id,
             name=DEVICE_NAME,
             unique_id=generate_entity_id(config_entry.entry_id, ENTITY_TYPE_SWITCH, function_id),
             icon=icon,
-            hass=hass,
-            entry_id=config_entry.entry_id,
         )
         switches.append(switch_entity)
     
-    # 注册实体到管理器
-    device_data = hass.data[DOMAIN][config_entry.entry_id]
-    for entity in switches:
-        if 'manager' in device_data:
-            device_data['manager'].register_entity(entity.unique_id, entity)
-        else:
-            # 兼容旧版本
-            device_data['entities'][entity.unique_id] = entity
-    
     async_add_entities(switches)
 
 
-class MiyaHRVSwitch(SwitchEntity):
+class MiyaHRVSwitch(MiyaHRVEntity, SwitchEntity, RestoreEntity):
     """MIYA HRV Switch实体."""
 
-    def __init__(self, device, function_id: str, name: str, unique_id: str, icon: str, hass=None, entry_id=None):
+    def __init__(self, manager: MiyaHRVManager, function_id: str, name: str, unique_id: str, icon: str):
         """初始化Switch实体."""
-        self._device = device
+        super().__init__(manager)
         self._function_id = function_id
         self._name = name
         self._unique_id = unique_id
         self._icon = icon
-        self._hass = hass
-        self._entry_id = entry_id
         self._is_on = False
-        self._current_status = {}  # 存储当前状态数据
-        
-        # 移除旧的监听器方式，使用新的状态管理系统
-        # self._device.add_listener(self._handle_device_data)
+        # 管理器的共享状态缓冲区（只读引用，不复制）
+        self._status = manager.status
 
     @property
     def name(self) -> str:
@@ -97,84 +92,29 @@ class MiyaHRVSwitch(SwitchEntity):
     @property
     def is_on(self) -> bool:
         """返回开关状态."""
-        # 优先使用本地状态数据，如果没有则从全局获取
-        status = self._current_status if self._current_status else get_device_status(self._hass, self._entry_id)
-        
-        # 直接使用状态字典中的键名
-        if self._function_id == "negative_ion":
-            return status.get('negative_ion') == 'on'
-        elif self._function_id == "uv_sterilization":
-            return status.get('UV_sterilization') == 'on'
-        elif self._function_id == "sleep_mode":
-            return status.get('sleep_mode') == 'on'
-        elif self._function_id == "inner_cycle":
-            return status.get('inner_cycle') == 'on'
-        elif self._function_id == "auxiliary_heat":
-            return status.get('auxiliary_heat') == 'on'
-        elif self._function_id == "bypass":
-            return status.get('bypass') == 'on'
-
+        key = STATUS_KEYS.get(self._function_id)
+        # 暂存待补发的命令优先（乐观显示），其次为设备状态
+        value = self._manager.pending_status().get(key) or self._status.get(key)
+        if value is not None:
+            return value == 'on'
         
-        return self._is_on  # 回退到旧的状态
+        return self._is_on  # 尚无设备状态时使用恢复的状态
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """打开开关."""
-        # 直接使用英文命令键
-        command_map = {
-            "negative_ion": "negative_ion_on",
-            "uv_sterilization": "uv_sterilization_on",
-            "sleep_mode": "sleep_mode_on",
-            "inner_cycle": "inner_cycle_on",
-            "auxiliary_heat": "auxiliary_heat_on",
-            "bypass": "bypass_on"
-        }
-        
-        command_name = command_map.get(self._function_id)
-        if command_name:
-            success = await send_device_command(self._hass, self._entry_id, command_name)
-            if success:
-                self._is_on = True
-                self.async_write_ha_state()
-        else:
-            _LOGGER.error(f"未找到功能 {self._function_id} 对应的开启命令")
+        if await self._manager.send_values(**{STATUS_KEYS[self._function_id]: 'on'}):
+            self._is_on = True
+            self.async_write_ha_state()
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """关闭开关."""
-        # 直接使用英文命令键
-        command_map = {
-            "negative_ion": "negative_ion_off",
-            "uv_sterilization": "uv_sterilization_off",
-            "sleep_mode": "sleep_mode_off",
-            "inner_cycle": "inner_cycle_off",
-            "auxiliary_heat": "auxiliary_heat_off",
-            "bypass": "bypass_off"
-        }
-        
-        command_name = command_map.get(self._function_id)
-        if command_name:
-            success = await send_device_command(self._hass, self._entry_id, command_name)
-            if success:
-                self._is_on = False
-                self.async_write_ha_state()
-        else:
-            _LOGGER.error(f"未找到功能 {self._function_id} 对应的关闭命令")
-
-    def update_status(self, status_data: dict):
-        """更新实体状态数据."""
-        self._current_status = status_data
-        # 检查实体是否已经完全初始化
-        if hasattr(self, 'hass') and self.hass is not None:
+        if await self._manager.send_values(**{STATUS_KEYS[self._function_id]: 'off'}):
+            self._is_on = False
             self.async_write_ha_state()
-            _LOGGER.debug(f"📊 Switch {self._function_id} 状态已更新: {status_data}")
-        else:
-            _LOGGER.debug(f"📊 Switch {self._function_id} 实体尚未完全初始化，仅更新本地状态")
-
-    # 移除旧的设备数据处理方法，现在使用新的状态管理系统
-    # async def _handle_device_data(self, hex_data: str) -> None:
-    #     """处理设备数据更新."""
-    #     # 这个方法不再需要，因为状态现在通过 helpers 获取
-
-    async def async_will_remove_from_hass(self) -> None:
-        """实体从Home Assistant移除时调用."""
-        # 移除旧的监听器调用，现在使用新的状态管理系统
-        # self._device.remove_listener(self._handle_device_data) 
\ No newline at end of file
+
+    async def async_added_to_hass(self) -> None:
+        """实体添加到Home Assistant时恢复上次状态（存储中没有状态帧时的兜底）."""
+        await super().async_added_to_hass()
+        last_state = await self.async_get_last_state()
+        if last_state is not None:
+            self._is_on = last_state.state == "on"